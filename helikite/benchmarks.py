@@ -0,0 +1,378 @@
+''' Scaling benchmarks of the processing pipeline
+
+Each stage of the pipeline is timed on synthetic campaigns (see synthetic.py)
+of increasing length: reading, time indexing and data corrections of every
+instrument, the merge, the pyramid, the CSV export and each plot builder. A
+stage is run a number of times to give the median and interquartile range of
+its wall time, then once more with tracemalloc to measure its peak memory.
+
+The results are written as JSON so that runs on different commits can be
+compared (see compare_benchmarks.py).
+'''
+
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Tuple
+from constants import constants
+from processing import sorting
+from processing.export import write_csv_chunked
+from processing.merge import MergedFrame
+from processing.profiles import vertical_profile
+from processing.pyramid import Pyramid
+from processing.resample import circular_columns
+from processing.segments import flight_segments
+from processing.timeindex import validate_time_index
+from synthetic import SyntheticCampaign, write_campaign
+import instruments
+import plots
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+# Campaign lengths to benchmark, in seconds
+SIZES = {
+    '1h': 3600,
+    '6h': 6 * 3600,
+    '1d': 24 * 3600,
+    '3d': 3 * 24 * 3600,
+}
+
+
+def measure(
+    func: Callable[..., Any],
+    setup: Callable[[], Tuple[Any, ...]] | None = None,
+    repeats: int = constants.BENCHMARK_REPEATS,
+) -> Dict[str, Any]:
+    ''' Time func over repeated runs, then measure its peak memory
+
+    Parameters
+    ----------
+    func : Callable[..., Any]
+        Function to benchmark
+    setup : Callable[[], Tuple[Any, ...]] | None
+        Called before each run (and not timed) to create the arguments of
+        func, for functions that alter their input in place
+    repeats : int
+        Number of timed runs
+
+    Returns
+    -------
+    Dict[str, Any]
+        The wall time of each run, their median and interquartile range, and
+        the peak memory allocated by func (in MB)
+    '''
+
+    seconds = []
+    for _ in range(repeats):
+        args = setup() if setup is not None else ()
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        seconds.append(time.perf_counter() - start)
+
+    # Measure memory in a separate run, tracemalloc slows down the function
+    args = setup() if setup is not None else ()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    q1, median, q3 = np.percentile(seconds, [25, 50, 75])
+
+    return {
+        'seconds': seconds,
+        'median_seconds': median,
+        'iqr_seconds': q3 - q1,
+        'peak_memory_mb': peak / 1e6,
+    }
+
+
+def git_commit() -> str | None:
+    ''' The commit of the checked out code, if it is a git repository '''
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkSuite:
+    ''' Runs the pipeline stage benchmarks on campaigns of each size
+
+    Parameters
+    ----------
+    sizes : Dict[str, int]
+        Campaign lengths in seconds, by the label used in the results
+    repeats : int
+        Number of timed runs of each stage
+    data_folder : str | None
+        Folder to generate the synthetic campaigns in. A temporary folder
+        that is removed afterwards if None
+    '''
+
+    def __init__(
+        self,
+        sizes: Dict[str, int] = SIZES,
+        repeats: int = constants.BENCHMARK_REPEATS,
+        data_folder: str | None = None,
+    ) -> None:
+        self.sizes = sizes
+        self.repeats = repeats
+        self.data_folder = data_folder
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self) -> Dict[str, Any]:
+        ''' Run all benchmarks and return the results with their metadata '''
+
+        started = datetime.datetime.utcnow()
+        with tempfile.TemporaryDirectory() as temp_folder:
+            for size, duration_seconds in self.sizes.items():
+                folder = os.path.join(self.data_folder or temp_folder, size)
+                logger.info(f"Benchmarking a campaign of {size} in {folder}")
+                self.run_size(size, duration_seconds, folder)
+
+        return {
+            'metadata': {
+                'started': started.isoformat(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'repeats': self.repeats,
+                'sizes': self.sizes,
+            },
+            'results': self.results,
+        }
+
+    def _record(
+        self,
+        size: str,
+        name: str,
+        rows: int,
+        func: Callable[..., Any],
+        setup: Callable[[], Tuple[Any, ...]] | None = None,
+    ) -> None:
+        result = measure(func, setup, self.repeats)
+        logger.info(f"{size:>4} {name:50.50} {result['median_seconds']:8.3f} s"
+                    f" (IQR {result['iqr_seconds']:.3f} s, peak "
+                    f"{result['peak_memory_mb']:.1f} MB)")
+
+        self.results.append({
+            'size': size,
+            'name': name,
+            'rows': rows,
+            **result,
+        })
+
+    def run_size(
+        self,
+        size: str,
+        duration_seconds: int,
+        folder: str,
+    ) -> None:
+        ''' Generate a campaign and benchmark each stage on it '''
+
+        config = write_campaign(
+            folder, SyntheticCampaign(duration_seconds=duration_seconds))
+        ground_station = config['ground_station']
+
+        all_export_dfs = []
+        for instrument, props in config['instruments'].items():
+            instrument_obj = getattr(instruments, props['config'])
+            instrument_obj.add_config(props)
+
+            self._record(size, f"{instrument}: read_data", 0,
+                         instrument_obj.read_data)
+            raw_df = instrument_obj.read_data()
+            rows = len(raw_df)
+            self.results[-1]['rows'] = rows
+
+            self._record(size, f"{instrument}: set_time_as_index", rows,
+                         instrument_obj.set_time_as_index,
+                         lambda: (raw_df.copy(),))
+            df = instrument_obj.set_time_as_index(raw_df.copy())
+            df = validate_time_index(df, instrument_obj.name,
+                                     instrument_obj.duplicate_policy)
+            df = instrument_obj.correct_time_from_config(df)
+
+            def data_corrections(df):
+                return instrument_obj.data_corrections(
+                    df,
+                    start_altitude=ground_station['altitude'],
+                    start_pressure=ground_station['pressure'],
+                    start_temperature=ground_station['temperature'],
+                )
+
+            self._record(size, f"{instrument}: data_corrections", rows,
+                         data_corrections, lambda: (df.copy(),))
+
+            # Process the instrument as in main() for the merge and plots
+            df = data_corrections(df.copy())
+            instrument_obj.size_distribution = (
+                instrument_obj.build_size_distribution(df)
+            )
+            df = instrument_obj.add_size_distribution_products(df)
+            df = instrument_obj.set_housekeeping_pressure_offset_variable(
+                df, column_name=constants.HOUSEKEEPING_VAR_PRESSURE
+            )
+            df = instrument_obj.add_device_name_to_columns(df)
+            all_export_dfs.append((df, instrument_obj))
+
+        all_export_dfs.sort(key=sorting.df_column_sort_key)
+        all_instruments = [instrument for df, instrument in all_export_dfs]
+
+        merged = MergedFrame()
+        export_cols = []
+        housekeeping_cols = []
+        for df, instrument in all_export_dfs:
+            merged.add(instrument.name, df)
+            export_cols += instrument.export_columns
+            housekeeping_cols += instrument.housekeeping_columns
+
+        self._record(size, "merge",
+                     sum(len(df) for df in merged.blocks.values()),
+                     merged.to_dense)
+        master_df = merged.to_dense()
+        rows = len(master_df)
+
+        self._record(size, "pyramid", rows,
+                     lambda: Pyramid.build(
+                         merged, columns=export_cols,
+                         circular=circular_columns(all_instruments)))
+
+        self._record(size, "flight segments", rows,
+                     lambda: flight_segments(
+                         master_df[constants.ALTITUDE_SEA_LEVEL_COL]))
+
+        self._record(size, "vertical profile", rows,
+                     lambda: vertical_profile(
+                         merged, columns=export_cols,
+                         circular=circular_columns(all_instruments)))
+
+        export_filename = os.path.join(folder, constants.MASTER_CSV_FILENAME)
+        self._record(size, "export: master csv", rows,
+                     lambda: write_csv_chunked(master_df[export_cols],
+                                               export_filename))
+        os.remove(export_filename)
+
+        self.run_exports(size, merged, export_cols, housekeeping_cols, folder)
+
+        self.run_plots(size, master_df, all_instruments, folder)
+
+    def run_exports(
+        self,
+        size: str,
+        merged: MergedFrame,
+        export_cols: List[str],
+        housekeeping_cols: List[str],
+        folder: str,
+    ) -> None:
+        ''' Benchmark writing the master and housekeeping exports in the
+        dense and blocks merge modes, to compare their peak memory '''
+
+        filenames = [
+            (export_cols,
+             os.path.join(folder, constants.MASTER_CSV_FILENAME)),
+            (housekeeping_cols,
+             os.path.join(folder, constants.HOUSEKEEPING_CSV_FILENAME)),
+        ]
+
+        def export_dense():
+            # The full merge, sliced into each export
+            master_df = merged.to_dense()
+            for columns, filename in filenames:
+                write_csv_chunked(master_df[columns], filename)
+
+        def export_blocks():
+            # Each export densified from the blocks once the last is written
+            for columns, filename in filenames:
+                df = merged.to_dense(columns=columns)
+                write_csv_chunked(df, filename)
+                del df
+
+        rows = len(merged.union_index())
+        self._record(size, "exports: dense", rows, export_dense)
+        self._record(size, "exports: blocks", rows, export_blocks)
+        for columns, filename in filenames:
+            os.remove(filename)
+
+    def run_plots(
+        self,
+        size: str,
+        df: pd.DataFrame,
+        all_instruments: List[instruments.Instrument],
+        folder: str,
+    ) -> None:
+        ''' Benchmark each plot builder on the merged data '''
+
+        rows = len(df)
+        altitude_col = constants.ALTITUDE_SEA_LEVEL_COL
+        pressure_cols = [
+            f"{instrument.name}_{instrument.pressure_variable}"
+            for instrument in all_instruments
+            if instrument.pressure_variable is not None
+        ]
+        inverted = instruments.msems_inverted.size_distribution
+        scan = instruments.msems_scan.size_distribution
+        heatmap_props = {'zmin': None, 'zmax': None, 'zmid': None}
+
+        plot_builders = {
+            'altitude': lambda: plots.generate_altitude_plot(
+                df, at_ground_level=False, altitude_col=altitude_col),
+            'grid': lambda: plots.generate_grid_plot(
+                df, all_instruments, altitude_col=altitude_col),
+            'pressure': lambda: plots.plot_scatter_from_variable_list_by_index(
+                df, "Pressure variables", pressure_cols),
+            'altitude concentration': (
+                lambda: plots.generate_altitude_concentration_plot(
+                    df, [], at_ground_level=False, altitude_col=altitude_col)
+            ),
+            'heatmaps': lambda: plots.generate_particle_heatmap(
+                inverted, scan, heatmap_props, heatmap_props),
+            'averaged': lambda: plots.generate_average_bin_concentration_plot(
+                inverted, "Averaged", inverted.time_index[0],
+                inverted.time_index[-1]),
+        }
+
+        figures = []
+        for name, builder in plot_builders.items():
+            self._record(size, f"plots: {name}", rows, builder)
+            figure = builder()
+            figures += figure if isinstance(figure, list) else [figure]
+
+        html_filename = os.path.join(folder,
+                                     constants.QUICKLOOK_PLOT_FILENAME)
+        self._record(size, "plots: write html", rows,
+                     lambda: plots.write_plots_to_html(figures, html_filename))
+        os.remove(html_filename)
+
+
+def write_results(
+    results: Dict[str, Any],
+    filename: str,
+) -> None:
+    ''' Write the benchmark results to a JSON file '''
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, 'w') as out_file:
+        json.dump(results, out_file, indent=2)
+
+    logger.info(f"Benchmark results written to {filename}")
@@ -0,0 +1,224 @@
+''' Comparison of two benchmark result files (see benchmarks.py)
+
+Each benchmarked stage found in both files is compared on its median wall
+time and its peak memory. A stage has regressed when the current value is
+more than the tolerance (a fraction of the baseline value) above the
+baseline. For the time, the larger interquartile range of the two runs is
+added to the allowed increase, so that a stage whose repeated runs vary a lot
+needs a larger slowdown to be flagged. Stages that take less than a minimum
+time or memory in both runs are never flagged, as their changes are mostly
+noise.
+
+Stages that are only found in one of the files are listed but do not count
+as regressions.
+'''
+
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+from constants import constants
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+# Compared metrics: (result key of the value, result key of its noise, unit,
+# minimum value below which changes are ignored)
+METRICS = {
+    'time': ('median_seconds', 'iqr_seconds', 's',
+             constants.BENCHMARK_MIN_SECONDS),
+    'memory': ('peak_memory_mb', None, 'MB',
+               constants.BENCHMARK_MIN_MEMORY_MB),
+}
+
+REGRESSION = "REGRESSION"
+IMPROVEMENT = "improvement"
+UNCHANGED = "ok"
+ADDED = "new"
+REMOVED = "removed"
+
+
+def read_results(
+    filename: str,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    ''' Read a benchmark results file, keyed by (size, stage name) '''
+
+    with open(filename) as in_file:
+        results = json.load(in_file)
+
+    return {(result['size'], result['name']): result
+            for result in results['results']}
+
+
+def compare_metric(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    metric: str,
+    tolerance: float,
+) -> Dict[str, Any]:
+    ''' Compare one metric of a stage between the baseline and current run
+
+    Parameters
+    ----------
+    baseline : Dict[str, Any]
+        Result of the stage in the baseline run
+    current : Dict[str, Any]
+        Result of the stage in the current run
+    metric : str
+        One of the METRICS
+    tolerance : float
+        Allowed relative increase, as a fraction of the baseline value
+
+    Returns
+    -------
+    Dict[str, Any]
+        The baseline and current values, their ratio, the largest value
+        allowed before the stage is flagged (threshold) and the status
+    '''
+
+    key, noise_key, unit, minimum = METRICS[metric]
+    base_value = baseline[key]
+    current_value = current[key]
+
+    noise = 0
+    if noise_key is not None:
+        noise = max(baseline[noise_key], current[noise_key])
+
+    threshold = base_value * (1 + tolerance) + noise
+    lower_threshold = base_value * (1 - tolerance) - noise
+
+    if max(base_value, current_value) < minimum:
+        status = UNCHANGED
+    elif current_value > threshold:
+        status = REGRESSION
+    elif current_value < lower_threshold:
+        status = IMPROVEMENT
+    else:
+        status = UNCHANGED
+
+    return {
+        'metric': metric,
+        'unit': unit,
+        'baseline': base_value,
+        'current': current_value,
+        'ratio': current_value / base_value if base_value > 0 else None,
+        'threshold': threshold,
+        'status': status,
+    }
+
+
+def compare(
+    baseline: Dict[Tuple[str, str], Dict[str, Any]],
+    current: Dict[Tuple[str, str], Dict[str, Any]],
+    tolerance: float = constants.BENCHMARK_TOLERANCE,
+) -> List[Dict[str, Any]]:
+    ''' Compare the time and memory of all stages of two benchmark runs
+
+    Parameters
+    ----------
+    baseline : Dict[Tuple[str, str], Dict[str, Any]]
+        Results of the baseline run, as given by read_results()
+    current : Dict[Tuple[str, str], Dict[str, Any]]
+        Results of the current run, as given by read_results()
+    tolerance : float
+        Allowed relative increase, as a fraction of the baseline value
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        One row per stage and metric, see compare_metric(). Stages in only
+        one of the runs have a single row with the status 'new' or 'removed'
+    '''
+
+    keys = list(baseline) + [key for key in current if key not in baseline]
+
+    rows = []
+    for key in keys:
+        size, name = key
+        if key not in current or key not in baseline:
+            rows.append({
+                'size': size, 'name': name, 'metric': None, 'unit': None,
+                'baseline': None, 'current': None, 'ratio': None,
+                'threshold': None,
+                'status': REMOVED if key not in current else ADDED,
+            })
+            continue
+
+        for metric in METRICS:
+            rows.append({
+                'size': size, 'name': name,
+                **compare_metric(baseline[key], current[key], metric,
+                                 tolerance),
+            })
+
+    return rows
+
+
+def format_table(
+    rows: List[Dict[str, Any]],
+) -> str:
+    ''' Format the compared rows as a plain text table '''
+
+    def value(row, column):
+        if row[column] is None:
+            return "-"
+        return f"{row[column]:.3f} {row['unit']}"
+
+    header = ["Size", "Stage", "Metric", "Baseline", "Current", "Ratio",
+              "Threshold", "Status"]
+    lines = [header] + [[
+        row['size'],
+        row['name'],
+        row['metric'] or "-",
+        value(row, 'baseline'),
+        value(row, 'current'),
+        f"{row['ratio']:.2f}x" if row['ratio'] is not None else "-",
+        value(row, 'threshold'),
+        row['status'],
+    ] for row in rows]
+
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    lines.insert(1, ["-" * width for width in widths])
+
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths))
+        .rstrip()
+        for line in lines
+    )
+
+
+def regressions(
+    rows: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    ''' The compared rows that regressed '''
+
+    return [row for row in rows if row['status'] == REGRESSION]
+
+
+def compare_files(
+    baseline_filename: str,
+    current_filename: str,
+    tolerance: float = constants.BENCHMARK_TOLERANCE,
+) -> bool:
+    ''' Compare two benchmark result files and log the table
+
+    Returns
+    -------
+    bool
+        True if no stage regressed
+    '''
+
+    rows = compare(read_results(baseline_filename),
+                   read_results(current_filename), tolerance)
+    logger.info("Benchmark comparison:\n" + format_table(rows))
+
+    regressed = regressions(rows)
+    if regressed:
+        logger.error(
+            f"{len(regressed)} regression(s) beyond a tolerance of "
+            f"{tolerance:.0%}: " + ", ".join(
+                f"{row['size']} {row['name']} ({row['metric']})"
+                for row in regressed))
+    else:
+        logger.info(f"No regressions beyond a tolerance of {tolerance:.0%}")
+
+    return not regressed
@@ -1,5 +1,6 @@
 from pydantic import BaseSettings
 from pathlib import Path
+from typing import List
 import logging
 
 
@@ -10,12 +11,69 @@ class Constants(BaseSettings):
     CONFIG_FILE: str = "config.yaml"
     MASTER_CSV_FILENAME: str = "helikite-data.csv"
     HOUSEKEEPING_CSV_FILENAME: str = "helikite-housekeeping.csv"
+    MASTER_RESAMPLED_CSV_FILENAME: str = "helikite-data-resampled.csv"
     HOUSEKEEPING_VAR_PRESSURE: str = "housekeeping_pressure"
     LOGFILE_NAME: str = "helikite.log"
+    TIMINGS_FILENAME: str = "timings.json"
+    STAGE_RSS_SAMPLE_SECONDS: float = 0.05  # Memory sampling of the stages
+    PROFILE_SUBFOLDER: str = "profile"
+    PROFILE_TOP_ALLOCATIONS: int = 25
     LOGLEVEL_CONSOLE: str = "INFO"
     LOGLEVEL_FILE: str = "DEBUG"
     QTY_LINES_TO_IDENTIFY_INSTRUMENT: int = 50
 
+    # Exports
+    EXPORT_CHUNK_ROWS: int = 100000  # Rows formatted per write to CSV
+    EXPORT_MAX_QUEUED: int = 4       # Max dataframes waiting to be written
+
+    # Windowed merge (merge_mode: windowed)
+    MEMORY_BUDGET_MB: float = 1024   # Memory for each merged window
+    MERGE_WINDOW_OVERHEAD: float = 4  # Peak memory of a merge / its output
+
+    # Alignment of the instruments onto a reference (global.align_to)
+    ALIGN_TOLERANCE_SECONDS: float = 1  # Furthest row snapped onto a time
+    ALIGN_DIRECTION: str = "nearest"    # backward, forward or nearest
+
+    # Estimation of the offsets by pressure (estimate_offsets command)
+    OFFSET_GRID_SECONDS: float = 1   # Resolution of the estimated offsets
+    OFFSET_MAX_LAG_SECONDS: float | None = None  # Largest change, any if None
+    OFFSET_MIN_OVERLAP: float = 0.5  # Samples of an instrument overlapping
+    OFFSET_MIN_CORRELATION: float = 0.8  # Weaker estimates are not written
+
+    # Pyramid of pre-aggregated levels of the merged data
+    PYRAMID_SUBFOLDER: str = "pyramid"
+    PYRAMID_LEVEL_SECONDS: List[int] = [10, 60, 600]  # Bin lengths
+
+    # Vertical profiles of the merged data (global.vertical_profile)
+    VERTICAL_PROFILE_CSV_FILENAME: str = "helikite-vertical-profile.csv"
+    VERTICAL_PROFILE_PLOT_FILENAME: str = "helikite-vertical-profile.html"
+    VERTICAL_PROFILE_BIN_METRES: float = 10  # Height of the altitude bins
+    VERTICAL_PROFILE_STATISTICS: List[str] = [
+        "count", "mean", "median", "p10", "p90"]
+
+    # Flight phases from the flight computer altitude
+    FLIGHT_SEGMENTS_CSV_FILENAME: str = "helikite-flight-segments.csv"
+    FLIGHT_SMOOTHING_SECONDS: float = 10   # Rolling mean of the altitude
+    FLIGHT_SPEED_WINDOW_SECONDS: float = 30  # Window of the vertical speed
+    FLIGHT_MIN_VERTICAL_SPEED: float = 0.2  # m/s, slower ascents: hovering
+    FLIGHT_GROUND_METRES: float = 5  # Height above the lowest altitude
+    FLIGHT_MIN_SEGMENT_SECONDS: float = 60  # Shorter ones join the previous
+
+    # Watch mode
+    WATCH_INTERVAL_SECONDS: float = 5   # Time between scans of the inputs
+
+    # Quicklook server
+    SERVER_HOST: str = "127.0.0.1"   # Only reachable from this computer
+    SERVER_PORT: int = 8050
+    SERVER_MAX_POINTS: int = 5000    # Points per trace sent to the browser
+
+    # Benchmarks
+    BENCHMARKS_SUBFOLDER: str = "benchmarks"
+    BENCHMARK_REPEATS: int = 5       # Timed runs of each benchmarked stage
+    BENCHMARK_TOLERANCE: float = 0.1    # Allowed slowdown/memory increase
+    BENCHMARK_MIN_SECONDS: float = 0.01  # Faster stages are not compared
+    BENCHMARK_MIN_MEMORY_MB: float = 1   # Smaller peaks are not compared
+
     # Column names
     ALTITUDE_GROUND_LEVEL_COL: str = "flight_computer_Altitude_agl"
     ALTITUDE_SEA_LEVEL_COL: str = "flight_computer_Altitude"
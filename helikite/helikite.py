@@ -1,11 +1,26 @@
 import sys
-from processing import preprocess, sorting
+from processing import offsets, preprocess, sorting
+from processing.export import CSVExporter, datetime_csv_unit
+from processing.merge import MergedFrame, MERGE_MODES
+from processing.pipeline import process_instrument
+from processing.profiles import vertical_profile
+from processing.pyramid import Pyramid
+from processing.resample import circular_columns, resample_merged
+from processing.segments import check_phases, flight_segments, select_phases
+from processing.instrumentation import StageRecorder
+from processing.profiling import Profiler
 from constants import constants
 import instruments
 import pandas as pd
 import os
 import datetime
 import plots
+import synthetic
+import benchmarks
+import compare_benchmarks
+import watch
+import server
+import asyncio
 import logging
 from typing import Dict, Any
 
@@ -23,6 +38,7 @@ logger.setLevel(constants.LOGLEVEL_CONSOLE)
 def main(
     config: Dict[str, Any],
     output_path: str = constants.OUTPUTS_FOLDER,
+    profile: bool = False,
 ) -> None:
     ''' Main function to run the processing and plotting of data
 
@@ -30,6 +46,11 @@ def main(
     ----------
     config : Dict[str, Any]
         Dictionary of the configuration file
+    output_path : str
+        Folder in which the timestamped output folder is created
+    profile : bool
+        If True, write cProfile and tracemalloc dumps of each instrument and
+        plotting phase into the profile subfolder of the outputs
 
     Returns
     -------
@@ -63,6 +84,47 @@ def main(
 
     ground_station = config['ground_station']
     plot_props = config['plots']
+    export_props = config['global'].get('export', {})
+    merge_mode = config['global'].get('merge_mode', 'dense')
+    memory_budget_mb = config['global'].get('memory_budget_mb',
+                                            constants.MEMORY_BUDGET_MB)
+    pyramid_levels = config['global'].get('pyramid_levels',
+                                          constants.PYRAMID_LEVEL_SECONDS)
+    align_to = config['global'].get('align_to')
+    profile_props = config['global'].get('vertical_profile', {})
+    segment_props = config['global'].get('flight_segments', {})
+    phases = segment_props.get('phases')
+
+    if merge_mode not in MERGE_MODES:
+        raise ValueError(f"Unknown merge_mode '{merge_mode}' in config. "
+                         f"Options are: {', '.join(MERGE_MODES)}")
+    if phases is not None:
+        check_phases(phases)
+
+    # The altitude of the plots, the flight segments and the profiles
+    altitude_col = (
+        constants.ALTITUDE_GROUND_LEVEL_COL
+        if plot_props['altitude_ground_level'] is True
+        else constants.ALTITUDE_SEA_LEVEL_COL
+    )
+
+    # Record the time and memory of each stage of the processing
+    recorder = StageRecorder()
+
+    # Profile each instrument and plotting phase, if requested
+    profiler = Profiler(
+        os.path.join(output_path_with_time, constants.PROFILE_SUBFOLDER)
+        if profile else None
+    )
+    profiler.start()
+
+    # Exports are written by a background thread while processing continues
+    exporter = CSVExporter(
+        chunk_rows=export_props.get('chunk_rows', constants.EXPORT_CHUNK_ROWS),
+        float_format=export_props.get('float_format'),
+        compression=export_props.get('compression'),
+        recorder=recorder,
+    )
 
     # Go through each instrument and perform the operations on each instrument
     for instrument, props in config['instruments'].items():
@@ -76,42 +138,37 @@ def main(
         else:
             logger.info(f"Processing {instrument}: {instrument_obj.filename}")
 
-        df = instrument_obj.read_data()
-
-        # Modify the DateTime index based off the configuration offsets
-        df = instrument_obj.set_time_as_index(df)
-
-        # Using the time corrections from configuration, correct time index
-        df = instrument_obj.correct_time_from_config(
-            df, time_trim_start, time_trim_end
-        )
-        if len(df) == 0:
-            logger.warning(f"Skipping {instrument}: No data in time range!")
-            continue
-
-        # Apply any corrections on the data
-        df = instrument_obj.data_corrections(
-            df,
-            start_altitude=ground_station['altitude'],
-            start_pressure=ground_station['pressure'],
-            start_temperature=ground_station['temperature'],
+        with profiler.profile(f"instrument_{instrument}"):
+            df = process_instrument(
+                instrument_obj, ground_station,
+                time_trim_start, time_trim_end, recorder=recorder
+            )
+            if df is None:
+                continue
+
+            # Save dataframe to outputs folder. A shallow copy is queued as
+            # the columns of df are renamed below while the export is written
+            exporter.submit(
+                df.copy(deep=False),
+                os.path.join(output_path_instrument_subfolder,
+                             f"{instrument}.csv")
             )
 
-        # Create housekeeping pressure variable to help align pressure visually
-        df = instrument_obj.set_housekeeping_pressure_offset_variable(
-            df, column_name=constants.HOUSEKEEPING_VAR_PRESSURE
-        )
-
-        # Save dataframe to outputs folder
-        df.to_csv(
-            f"{os.path.join(output_path_instrument_subfolder, instrument)}.csv"
-        )
+            # The dN/dlogDp of each size bin is written to its own file, to
+            # keep the per-bin columns out of the merged data
+            dndlogdp_df = instrument_obj.dndlogdp_dataframe()
+            if dndlogdp_df is not None:
+                exporter.submit(
+                    dndlogdp_df,
+                    os.path.join(output_path_instrument_subfolder,
+                                 f"{instrument}_dNdlogDp.csv")
+                )
 
-        # Prepare df for combining with other instruments
-        df = instrument_obj.add_device_name_to_columns(df)
+            # Prepare df for combining with other instruments
+            df = instrument_obj.add_device_name_to_columns(df)
 
-        # Add tuple of df and export order to df merge list
-        all_export_dfs.append((df, instrument_obj))
+            # Add tuple of df and export order to df merge list
+            all_export_dfs.append((df, instrument_obj))
 
     preprocess.export_yaml_config(
         config,
@@ -124,62 +181,306 @@ def main(
     master_export_cols = []
     master_housekeeping_cols = []
 
-    # Merge all the dataframes together, first df is the master
-    master_df, instrument = all_export_dfs[0]
+    # Hold each instrument's dataframe at its native rate, first is the master
+    merged = MergedFrame()
 
-    # Combine export and housekeeping columns
-    master_export_cols += instrument.export_columns
-    master_housekeeping_cols += instrument.housekeeping_columns
-
-    # Merge the rest
     logger.info("Instruments will be merged together with this column order:")
-    for df, instrument in all_export_dfs[1:]:
+    for df, instrument in all_export_dfs:
         logger.info(f'Merging instrument: {instrument.name:20} '
                     f'(Export order value: {instrument.export_order})')
-        master_df = master_df.merge(
-            df, how="outer", left_index=True, right_index=True)
+        merged.add(instrument.name, df)
+
+        # Combine export and housekeeping columns
         master_export_cols += instrument.export_columns
         master_housekeeping_cols += instrument.housekeeping_columns
 
     all_instruments = [instrument for df, instrument in all_export_dfs]
 
-    # Sort rows by the date index
-    master_df.index = pd.to_datetime(master_df.index)
-    master_df.sort_index(inplace=True)
+    # Snap the instruments onto the times of the reference instrument, so
+    # that near-coincident rows are merged into one
+    if align_to is not None:
+        with profiler.profile("align"), \
+                recorder.stage("align", merged) as stage:
+            rows = len(merged.union_index())
+            merged = merged.align_to(
+                align_to,
+                tolerances={
+                    instrument.name: instrument.align_tolerance
+                    for instrument in all_instruments
+                    if instrument.align_tolerance is not None},
+                directions={
+                    instrument.name: instrument.align_direction
+                    for instrument in all_instruments
+                    if instrument.align_direction is not None},
+            )
+            logger.info(f"Aligned the instruments onto {align_to}: "
+                        f"{rows} merged rows reduced to "
+                        f"{len(merged.union_index())}")
+            stage.output(merged)
+
+    # Segment the flight into its phases by the flight computer altitude
+    segments = None
+    altitude_blocks = [df for df in merged.blocks.values()
+                       if altitude_col in df.columns]
+    if altitude_blocks:
+        with recorder.stage("flight segments", altitude_blocks[0]) as stage:
+            segments = flight_segments(
+                altitude_blocks[0][altitude_col],
+                min_speed=segment_props.get(
+                    'min_vertical_speed', constants.FLIGHT_MIN_VERTICAL_SPEED),
+                ground_metres=segment_props.get(
+                    'ground_metres', constants.FLIGHT_GROUND_METRES),
+                min_segment_seconds=segment_props.get(
+                    'min_segment_seconds',
+                    constants.FLIGHT_MIN_SEGMENT_SECONDS),
+            )
+            stage.output(segments)
+        exporter.submit(
+            segments.set_index('start'),
+            os.path.join(output_path_with_time,
+                         constants.FLIGHT_SEGMENTS_CSV_FILENAME))
+
+        # Only keep the rows of the instruments in the selected phases
+        if phases is not None:
+            with recorder.stage("select phases", merged) as stage:
+                merged = select_phases(merged, segments, phases)
+                logger.info(f"Keeping the {', '.join(phases)} phases: "
+                            f"{len(merged.union_index())} rows")
+                stage.output(merged)
+    else:
+        logger.warning(f"No {altitude_col} to segment the flight by")
+        if phases is not None:
+            raise ValueError("The flight phases to keep cannot be selected "
+                             f"without the altitude {altitude_col}")
+
+    with profiler.profile("merge"), \
+            recorder.stage("merge", merged) as stage:
+        if merge_mode == 'dense':
+            # Outer merge all of the blocks into one dataframe
+            master_df = merged.to_dense()
+            export_df = master_df[master_export_cols]
+            housekeeping_df = master_df[master_housekeeping_cols]
+        else:
+            # Only densify the columns of each export, on demand
+            logger.info(
+                "Keeping instruments at native rate. Block memory: "
+                f"{merged.memory_usage() / 1e6:.1f} MB (dense estimate: "
+                f"{merged.dense_size_estimate() / 1e6:.1f} MB)")
+            master_df = merged
+        stage.output(master_df)
 
     # Export data and housekeeping CSV files
-    master_df[master_export_cols].to_csv(
-        os.path.join(output_path_with_time,
-                     constants.MASTER_CSV_FILENAME))
-
-    master_df[master_housekeeping_cols].to_csv(
-        os.path.join(output_path_with_time,
-                     constants.HOUSEKEEPING_CSV_FILENAME))
-
-    # Create all of the plots
+    if merge_mode == 'blocks':
+        # Densify each export only once the previous one is written, so that
+        # a single dense export is held in memory at a time
+        for columns, filename in [
+            (master_export_cols, constants.MASTER_CSV_FILENAME),
+            (master_housekeeping_cols, constants.HOUSEKEEPING_CSV_FILENAME),
+        ]:
+            with recorder.stage(f"densify: {filename}", merged) as stage:
+                export_df = merged.to_dense(columns=columns)
+                stage.output(export_df)
+            exporter.submit(export_df,
+                            os.path.join(output_path_with_time, filename))
+            del export_df
+            exporter.wait()
+    elif merge_mode == 'windowed':
+        # Merge and write the exports one time window at a time, so that
+        # the dense rows held in memory stay within the budget
+        for columns, filename in [
+            (master_export_cols, constants.MASTER_CSV_FILENAME),
+            (master_housekeeping_cols, constants.HOUSEKEEPING_CSV_FILENAME),
+        ]:
+            window_rows = merged.window_rows(
+                memory_budget_mb * 1e6, columns)
+            logger.info(f"Merging {filename} in windows of {window_rows} "
+                        f"rows for a memory budget of {memory_budget_mb} MB")
+            exporter.write_windows(
+                merged.iter_windows(window_rows, columns),
+                os.path.join(output_path_with_time, filename),
+                date_unit=datetime_csv_unit(merged.union_index()))
+    else:
+        exporter.submit(
+            export_df,
+            os.path.join(output_path_with_time,
+                         constants.MASTER_CSV_FILENAME))
+
+        exporter.submit(
+            housekeeping_df,
+            os.path.join(output_path_with_time,
+                         constants.HOUSEKEEPING_CSV_FILENAME))
+        del export_df, housekeeping_df
+
+    # Bin the exported variables by altitude, for the ascents and descents
+    profile_bin_metres = profile_props.get(
+        'bin_metres', constants.VERTICAL_PROFILE_BIN_METRES)
+    if profile_bin_metres is not None:
+        if segments is None:
+            logger.warning(f"No {altitude_col} to bin the vertical "
+                           "profile by. Skipping")
+        else:
+            with profiler.profile("vertical_profile"), \
+                    recorder.stage("vertical profile", merged) as stage:
+                profile_df = vertical_profile(
+                    merged, altitude_col, profile_bin_metres,
+                    profile_props.get(
+                        'statistics', constants.VERTICAL_PROFILE_STATISTICS),
+                    columns=master_export_cols,
+                    circular=circular_columns(all_instruments),
+                    segments=segments)
+                stage.output(profile_df)
+            exporter.submit(
+                profile_df,
+                os.path.join(output_path_with_time,
+                             constants.VERTICAL_PROFILE_CSV_FILENAME))
+
+            profile_figure = recorder.run(
+                "plots: vertical profile",
+                plots.generate_vertical_profile_plot,
+                profile_df,
+                plot_props.get('vertical_profile', {}).get('variables')
+                or plots.vertical_profile_variables(all_instruments),
+                at_ground_level=plot_props['altitude_ground_level'])
+            plots.write_plots_to_html(
+                [profile_figure],
+                os.path.join(output_path_with_time,
+                             constants.VERTICAL_PROFILE_PLOT_FILENAME))
+            del profile_df
+
+    # Resample each instrument onto a common grid, then merge the grid rows
+    resample_seconds = export_props.get('resample_seconds')
+    if resample_seconds is not None:
+        with recorder.stage("resample", merged) as stage:
+            resampled_df = resample_merged(
+                merged, resample_seconds, master_export_cols,
+                circular=circular_columns(all_instruments)
+            ).to_dense(columns=master_export_cols)
+            stage.output(resampled_df)
+        exporter.submit(
+            resampled_df,
+            os.path.join(output_path_with_time,
+                         constants.MASTER_RESAMPLED_CSV_FILENAME))
+        del resampled_df
+
+    # Pre-aggregate the exported columns at coarser time resolutions
+    pyramid = None
+    if pyramid_levels:
+        with profiler.profile("pyramid"), \
+                recorder.stage("pyramid", merged) as stage:
+            pyramid = Pyramid.build(
+                merged, pyramid_levels, master_export_cols,
+                circular=circular_columns(all_instruments))
+            stage.output(pyramid.levels.get(min(pyramid_levels)))
+        pyramid.write(
+            os.path.join(output_path_with_time, constants.PYRAMID_SUBFOLDER),
+            exporter)
+
+    # Create all of the plots while the exports are written
     plots.campaign_2023(
-        master_df, plot_props, all_instruments, output_path_with_time
+        master_df, plot_props, all_instruments, output_path_with_time,
+        recorder=recorder, profiler=profiler, pyramid=pyramid,
+        segments=segments,
+        memory_budget=(memory_budget_mb * 1e6 if merge_mode == 'windowed'
+                       else None),
     )
 
+    # Wait for the remaining exports to finish writing
+    exporter.close()
+
+    # Write out the timings of all stages
+    recorder.log_summary()
+    recorder.write_json(
+        os.path.join(output_path_with_time, constants.TIMINGS_FILENAME))
+    profiler.stop()
+
 
 if __name__ == '__main__':
+    # Switches can be given with any of the commands
+    profile = '--profile' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--profile']
+
     # If docker arg given, don't run main
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'preprocess':
+    if len(args) > 0:
+        if args[0] == 'preprocess':
             # Run the preprocessing, generate config if it doesn't exist
             preprocess.generate_config(overwrite=False)  # Write conf file
             preprocess.preprocess()
-        elif sys.argv[1] == 'generate_config':
+        elif args[0] == 'generate_config':
             # Generate the config file (overwrite if it exists)
             logger.info("Generating YAML configuration in input folder")
             preprocess.generate_config(overwrite=True)
+        elif args[0] == 'generate_synthetic':
+            # Write a synthetic campaign of the given hours (default 1) and
+            # its config file (overwrite if it exists) into the input folder
+            hours = float(args[1]) if len(args) > 1 else 1
+            logger.info(f"Generating {hours} hours of synthetic data in "
+                        "input folder")
+            synthetic.write_campaign(
+                constants.INPUTS_FOLDER,
+                synthetic.SyntheticCampaign(
+                    duration_seconds=int(hours * 3600)),
+            )
+        elif args[0] == 'benchmark':
+            # Benchmark the pipeline on the given sizes (default: all), and
+            # write the results to the benchmarks folder of the outputs
+            for size in args[1:]:
+                if size not in benchmarks.SIZES:
+                    raise ValueError(
+                        f"Unknown benchmark size '{size}'. Options are: "
+                        f"{', '.join(benchmarks.SIZES)}")
+            sizes = {size: benchmarks.SIZES[size]
+                     for size in (args[1:] or benchmarks.SIZES)}
+            results = benchmarks.BenchmarkSuite(sizes=sizes).run()
+            benchmarks.write_results(results, os.path.join(
+                constants.OUTPUTS_FOLDER, constants.BENCHMARKS_SUBFOLDER,
+                f"{datetime.datetime.utcnow().isoformat()}.json"))
+        elif args[0] == 'watch':
+            # Refresh the plots as the files in the input folder are written
+            config = preprocess.read_yaml_config(
+                os.path.join(constants.INPUTS_FOLDER, constants.CONFIG_FILE)
+            )
+            asyncio.run(watch.Watcher(config).run())
+        elif args[0] == 'serve':
+            # Serve the quicklooks of the input folder on the given port,
+            # resampled to the time range in view
+            config = preprocess.read_yaml_config(
+                os.path.join(constants.INPUTS_FOLDER, constants.CONFIG_FILE)
+            )
+            port = int(args[1]) if len(args) > 1 else constants.SERVER_PORT
+            merged, all_instruments = server.load_campaign(config)
+            server.QuicklookServer(
+                merged, all_instruments, config['plots']
+            ).serve(port=port)
+        elif args[0] == 'estimate_offsets':
+            # Estimate the time and pressure offsets of the instruments by
+            # correlating their pressure with the flight computer's, and
+            # write them into the config file
+            config_path = os.path.join(constants.INPUTS_FOLDER,
+                                       constants.CONFIG_FILE)
+            config = preprocess.read_yaml_config(config_path)
+            offsets.apply_offsets(config, offsets.estimate_offsets(config))
+            preprocess.export_yaml_config(config, config_path)
+        elif args[0] == 'compare_benchmarks':
+            # Compare two benchmark result files, exit with an error code if
+            # any stage regressed beyond the tolerance (default 10%)
+            if len(args) < 3:
+                raise ValueError(
+                    "compare_benchmarks needs a baseline and a current "
+                    "benchmark results file")
+            tolerance = (float(args[3]) if len(args) > 3
+                         else constants.BENCHMARK_TOLERANCE)
+            if not compare_benchmarks.compare_files(args[1], args[2],
+                                                    tolerance):
+                sys.exit(1)
         else:
             logger.error("Unknown argument. Options are: preprocess, "
-                         "generate_config")
+                         "generate_config, generate_synthetic, "
+                         "estimate_offsets, watch, serve, benchmark, "
+                         "compare_benchmarks")
     else:  # If no args, run the main application
         # Get the config from the YAML file in the input directory
         config = preprocess.read_yaml_config(
             os.path.join(constants.INPUTS_FOLDER, constants.CONFIG_FILE)
         )
 
-        main(config)
+        main(config, profile=profile)
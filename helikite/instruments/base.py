@@ -2,9 +2,14 @@ from typing import Dict, Any, List, Tuple
 from pandas import DataFrame
 from plotly.graph_objects import Figure
 from datetime import datetime
+from io import StringIO
+import numpy as np
 import pandas as pd
 import logging
 from constants import constants
+from processing.scans import ScanIndex
+from processing.size_distribution import SizeDistribution
+from processing.timeindex import time_range_positions
 
 logger = logging.getLogger(__name__)
 logger.setLevel(constants.LOGLEVEL_CONSOLE)
@@ -24,7 +29,9 @@ class Instrument:
         cols_export: List[str] = [],          # Columns to export
         cols_housekeeping: List[str] = [],    # Columns to use for housekeeping
         export_order: int | None = None,      # Order hierarchy in export file
-        pressure_variable: str | None = None  # The variable measuring pressure
+        pressure_variable: str | None = None,  # Variable measuring pressure
+        cols_circular: Dict[str, str | None] = {},  # Angles (deg): magnitude
+        duplicate_policy: str = "keep",       # Rows at the same time
     ) -> None:
 
         self.dtype = dtype
@@ -39,14 +46,20 @@ class Instrument:
         self.cols_housekeeping = cols_housekeeping
         self.export_order = export_order
         self.pressure_variable = pressure_variable
+        self.cols_circular = cols_circular
+        self.duplicate_policy = duplicate_policy
 
         # Properties that are not part of standard config, can be added
         self.filename: str | None = None
         self.date: datetime | None = None
         self.pressure_offset_housekeeping: float | None = None
         self.time_offset: Dict[str, int] = {}
+        self.time_drift: Dict[str, Any] | None = None
         self.name: str | None = None
         self.time_range: Tuple[Any, Any] | None = None
+        self.size_distribution: SizeDistribution | None = None
+        self.align_tolerance: float | None = None
+        self.align_direction: str | None = None
 
     def add_config(self, yaml_props: Dict[str, Any]):
         ''' Adds the application's config to the Instrument class
@@ -59,6 +72,17 @@ class Instrument:
         self.time_offset = yaml_props['time_offset']
         self.pressure_offset_housekeeping = yaml_props['pressure_offset']
 
+        # Optional, overrides the instrument's policy for duplicate times
+        if yaml_props.get('duplicate_policy') is not None:
+            self.duplicate_policy = yaml_props['duplicate_policy']
+
+        # Optional drift of the instrument's clock, on top of time_offset
+        self.time_drift = yaml_props.get('time_drift')
+
+        # Optional, for the alignment onto a reference (global.align_to)
+        self.align_tolerance = yaml_props.get('align_tolerance')
+        self.align_direction = yaml_props.get('align_direction')
+
     def data_corrections(self, df, *args, **kwargs):
         ''' Default callback function for data corrections.
 
@@ -67,6 +91,95 @@ class Instrument:
 
         return df
 
+    def corrects_rows_alone(
+        self,
+        ground_station: Dict[str, Any],
+    ) -> bool:
+        ''' Whether the corrections of each row only depend on that row
+
+        If so, the rows appended to a file that is still being written can
+        be corrected on their own and appended to the rows corrected before
+        (see watch.py). Instruments whose corrections use the other rows
+        (a mean over the file, the start of the next scan) return False, as
+        does a clock drift rate, which is measured from the first time.
+        '''
+
+        return not (self.time_drift or {}).get('seconds_per_hour')
+
+    def build_size_distribution(
+        self,
+        df: pd.DataFrame
+    ) -> SizeDistribution | None:
+        ''' Default callback to gather the size bins of an instrument
+
+        Return None, as most instruments do not measure a size distribution.
+        Called from process_instrument() in processing/pipeline.py after the
+        data corrections, the result is kept in self.size_distribution
+        '''
+
+        return None
+
+    def build_scan_index(
+        self,
+        df: pd.DataFrame
+    ) -> ScanIndex | None:
+        ''' Default callback to index the time intervals of the scans
+
+        Return None, as most instruments do not scan. Not called by the
+        pipeline: build it from the corrected data when the data of other
+        instruments are to be attached to or aggregated over the scans (see
+        ScanIndex.attach() and ScanIndex.aggregate())
+        '''
+
+        return None
+
+    def add_size_distribution_products(
+        self,
+        df: pd.DataFrame
+    ) -> pd.DataFrame:
+        ''' Add the derived products of the size distribution to the data
+
+        The total number, surface and volume concentrations are added as
+        columns and to the export columns. The dN/dlogDp of each bin stays on
+        the size distribution (see dndlogdp_dataframe()), so that the per-bin
+        columns are not merged. Nothing is done if there is no size
+        distribution or its bin limits are unknown.
+        '''
+
+        if self.size_distribution is None:
+            return df
+
+        if self.size_distribution.bin_limits is None:
+            logger.warning(f"{self.name}: No bin limits known, skipping the "
+                           "size distribution moments and dN/dlogDp")
+            return df
+
+        moments = self.size_distribution.moments()
+        for col in moments.columns:
+            df[col] = moments[col].to_numpy()
+
+        # Add to the export without altering a list shared with other objects
+        self.cols_export = self.cols_export + [
+            col for col in moments.columns if col not in self.cols_export
+        ]
+
+        return df
+
+    def dndlogdp_dataframe(self) -> pd.DataFrame | None:
+        ''' The dN/dlogDp of each size bin as columns dNdlogDp1 -> dNdlogDpN
+
+        Written to its own file by the main() function in helikite.py. None if
+        there is no size distribution or its bin limits are unknown
+        '''
+
+        if (
+            self.size_distribution is None
+            or self.size_distribution.bin_limits is None
+        ):
+            return None
+
+        return self.size_distribution.to_dataframe("dNdlogDp", dndlogdp=True)
+
     def create_plots(self, df: DataFrame) -> List[Figure | None]:
         ''' Default callback for generated figures from dataframes
 
@@ -131,6 +244,20 @@ class Instrument:
         else:
             return []
 
+    @property
+    def circular_columns(self) -> Dict[str, str | None]:
+        ''' Returns the columns of angles with the columns of their
+        magnitudes (or None), prefixed with the instrument name
+
+        These are averaged as vectors when the data is resampled
+        '''
+
+        return {
+            f"{self.name}_{angle}": (
+                f"{self.name}_{magnitude}" if magnitude is not None else None)
+            for angle, magnitude in self.cols_circular.items()
+        }
+
     def set_time_as_index(
         self,
         df: pd.DataFrame
@@ -143,25 +270,95 @@ class Instrument:
 
         return df
 
+    def time_correction(
+        self,
+        index: pd.DatetimeIndex,
+    ) -> np.ndarray | None:
+        ''' Nanoseconds to add to each time of the index, from the config
+
+        The constant time_offset, plus the drift of the clock if time_drift
+        is given, either as a linear rate:
+
+            time_drift:
+              seconds_per_hour: 1.5  # Added per hour since the first time
+
+        or as the seconds to add at a few times of the instrument's clock,
+        interpolated linearly between them and extrapolated with the slope of
+        the first and last segments:
+
+            time_drift:
+              anchors:
+              - [2022-09-29 10:00:00, 0]
+              - [2022-09-29 12:00:00, -3.2]
+
+        Returns None if there is no correction
+        '''
+
+        offset = pd.Timedelta(
+            hours=self.time_offset.get('hour', 0),
+            minutes=self.time_offset.get('minute', 0),
+            seconds=self.time_offset.get('second', 0)).value
+
+        drift = self.time_drift or {}
+        rate = drift.get('seconds_per_hour')
+        anchors = drift.get('anchors')
+        if rate is not None and anchors is not None:
+            raise ValueError(f"{self.name}: time_drift has both a rate "
+                             "(seconds_per_hour) and anchors, give only one")
+
+        if offset == 0 and not rate and not anchors:
+            return None
+
+        times = index.asi8
+        valid = np.asarray(index.notna())
+        correction = np.full(len(index), offset, dtype='int64')
+
+        if rate and valid.any():
+            elapsed = times[valid] - times[valid].min()
+            correction[valid] += np.round(
+                elapsed * (rate / 3600)).astype('int64')
+        elif anchors:
+            anchor_times = np.array(
+                [pd.Timestamp(time).value for time, seconds in anchors],
+                dtype='int64')
+            anchor_ns = np.array(
+                [seconds * 1e9 for time, seconds in anchors], dtype=float)
+            order = np.argsort(anchor_times, kind='stable')
+            anchor_times, anchor_ns = anchor_times[order], anchor_ns[order]
+
+            # Relative to the first anchor, to keep the precision in float
+            x = (times[valid] - anchor_times[0]).astype(float)
+            xp = (anchor_times - anchor_times[0]).astype(float)
+            drift_ns = np.interp(x, xp, anchor_ns)
+            if len(xp) > 1:
+                before, after = x < xp[0], x > xp[-1]
+                drift_ns[before] += (x[before] - xp[0]) * (
+                    (anchor_ns[1] - anchor_ns[0]) / (xp[1] - xp[0]))
+                drift_ns[after] += (x[after] - xp[-1]) * (
+                    (anchor_ns[-1] - anchor_ns[-2]) / (xp[-1] - xp[-2]))
+            correction[valid] += np.round(drift_ns).astype('int64')
+
+        return correction
+
     def correct_time_from_config(
         self,
         df: pd.DataFrame,
         trim_start: pd.Timestamp | None = None,
         trim_end: pd.Timestamp | None = None
     ) -> pd.DataFrame:
-        ''' Correct the time offset and trim from the configuration '''
+        ''' Correct the time offset and drift, and trim from the configuration
+        '''
 
-        if (
-            self.time_offset['hour'] != 0
-            or self.time_offset['minute'] != 0
-            or self.time_offset['second'] != 0
-        ):
-            logger.info(f"Shifting the time offset by {self.time_offset}")
+        correction = self.time_correction(df.index)
+        if correction is not None:
+            logger.info(f"Shifting the time offset by {self.time_offset}"
+                        + (f" with a drift of {self.time_drift}"
+                           if self.time_drift else ""))
 
-            df.index = df.index + pd.DateOffset(
-                hours=self.time_offset['hour'],
-                minutes=self.time_offset['minute'],
-                seconds=self.time_offset['second'])
+            # Add the nanoseconds to the int64 times, keeping missing times
+            times = df.index.asi8 + correction
+            times[np.asarray(df.index.isna())] = pd.NaT.value
+            df.index = pd.DatetimeIndex(times, name=df.index.name)
 
         # Trim the dataframes to the time range specified in the config
         logger.debug(f"{self.name}: Original start time: {df.iloc[0].name} ")
@@ -169,8 +366,8 @@ class Instrument:
         self.time_range = (df.iloc[0].name, df.iloc[-1].name)
 
         if None not in (trim_start, trim_end):
-            datemask = (df.index > trim_start) & (df.index <= trim_end)
-            df = df[datemask]
+            df = df.iloc[time_range_positions(
+                df.index, trim_start, trim_end, inclusive='right')]
 
         return df
 
@@ -220,3 +417,87 @@ class Instrument:
         )
 
         return df
+
+    def read_chunk(
+        self,
+        text: str,
+        state: Dict[str, Any],
+    ) -> pd.DataFrame:
+        ''' Read complete lines of the file, following on from earlier lines
+
+        Used by processing.tail.TailReader to read a file as it grows. The
+        first chunk (with an empty state) is read as read_data() reads the
+        whole file. The following chunks have no header, so they are read
+        with the column names of the first chunk, and the columns read as
+        strings in the first chunk are kept as strings.
+
+        Parameters
+        ----------
+        text : str
+            Complete lines of the file that follow the previous chunk
+        state : Dict[str, Any]
+            Kept between the chunks of a file, updated for the next chunk
+
+        Returns
+        -------
+        pd.DataFrame
+            The rows of the chunk, as they would be read by read_data()
+        '''
+
+        if 'names' not in state:
+            df = pd.read_csv(
+                StringIO(text),
+                dtype=self.dtype,
+                na_values=self.na_values,
+                header=self.header,
+                delimiter=self.delimiter,
+                lineterminator=self.lineterminator,
+                comment=self.comment,
+                names=self.names,
+                index_col=self.index_col,
+            )
+
+            # All columns of the file in order, including any index column
+            state['names'] = self.names if self.names is not None else list(
+                pd.read_csv(
+                    StringIO(text),
+                    header=self.header,
+                    delimiter=self.delimiter,
+                    lineterminator=self.lineterminator,
+                    comment=self.comment,
+                    nrows=0,
+                ).columns
+            )
+            state['dtype'] = {
+                **{col: "str" for col, dtype in df.dtypes.items()
+                   if dtype == object},
+                **self.dtype,
+            }
+
+            return df
+
+        return pd.read_csv(
+            StringIO(text),
+            dtype=state['dtype'],
+            na_values=self.na_values,
+            header=None,
+            delimiter=self.delimiter,
+            lineterminator=self.lineterminator,
+            comment=self.comment,
+            names=state['names'],
+            index_col=self.index_col,
+        )
+
+    def set_time_as_index_chunk(
+        self,
+        df: pd.DataFrame,
+        state: Dict[str, Any],
+    ) -> pd.DataFrame:
+        ''' Set the time index of a chunk read by read_chunk()
+
+        By default the time of each row only depends on the row, so this is
+        set_time_as_index(). Instruments whose times depend on the earlier
+        rows keep what they need in state (see SmartTether)
+        '''
+
+        return self.set_time_as_index(df)
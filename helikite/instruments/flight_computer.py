@@ -14,6 +14,7 @@ from instruments.base import Instrument
 import pandas as pd
 from processing.conversions import pressure_to_altitude
 from io import StringIO
+from typing import Any, Dict, Iterable, Iterator
 import logging
 from constants import constants
 
@@ -119,6 +120,19 @@ class FlightComputer(Instrument):
 
         return df
 
+    def corrects_rows_alone(
+        self,
+        ground_station: Dict[str, Any],
+    ) -> bool:
+        ''' Unless the ground station pressure or temperature are missing,
+        then the altitude is from the mean of the first seconds of data '''
+
+        return (
+            ground_station.get('pressure') is not None
+            and ground_station.get('temperature') is not None
+            and super().corrects_rows_alone(ground_station)
+        )
+
     def set_time_as_index(
         self,
         df: pd.DataFrame
@@ -143,17 +157,9 @@ class FlightComputer(Instrument):
 
         # Parse the file first removing the duplicate header cols
         cleaned_csv = StringIO()
-        header_counter = 0
 
         with open(self.filename, 'r') as csv_data:
-            for row in csv_data:
-                if row == CSV_HEADER:
-                    if header_counter == 0:
-                        # Only append the first header, ignore all others
-                        cleaned_csv.write(row)
-                    header_counter += 1
-                else:
-                    cleaned_csv.write(row)
+            cleaned_csv.writelines(self.remove_repeated_headers(csv_data, {}))
 
         # Seek back to start of memory object
         cleaned_csv.seek(0)
@@ -172,6 +178,38 @@ class FlightComputer(Instrument):
 
         return df
 
+    def remove_repeated_headers(
+        self,
+        rows: Iterable[str],
+        state: Dict[str, Any],
+    ) -> Iterator[str]:
+        ''' The rows of the file without the headers after the first one
+
+        The header is written again in the file each time the flight computer
+        restarts. The number of headers seen is kept in state, so that the
+        rows can be given in several parts
+        '''
+
+        for row in rows:
+            if row == CSV_HEADER:
+                # Only keep the first header, ignore all others
+                state['header_counter'] = state.get('header_counter', 0) + 1
+                if state['header_counter'] > 1:
+                    continue
+            yield row
+
+    def read_chunk(
+        self,
+        text: str,
+        state: Dict[str, Any],
+    ) -> pd.DataFrame:
+        ''' Read complete lines of the file, removing repeated headers '''
+
+        text = "".join(self.remove_repeated_headers(
+            text.splitlines(keepends=True), state))
+
+        return super().read_chunk(text, state)
+
 
 flight_computer = FlightComputer(
     dtype={
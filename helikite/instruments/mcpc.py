@@ -40,6 +40,9 @@ class MCPC(Instrument):
                                         format='%y/%m/%d %H:%M:%S')
         df.drop(columns=["#YY/MM/DD", "HR:MN:SC"], inplace=True)
 
+        # Define the datetime column as the index
+        df.set_index('DateTime', inplace=True)
+
         return df
 
 
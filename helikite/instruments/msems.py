@@ -26,6 +26,9 @@ Houskeeping file: Look at READINGS (look at msems_err / cpc_err)
 '''
 
 from .base import Instrument
+from processing.scans import ScanIndex
+from processing.size_distribution import SizeDistribution
+from typing import Any, Dict
 import pandas as pd
 import numpy as np
 
@@ -39,8 +42,11 @@ class MSEMSInverted(Instrument):
         super().__init__(*args, **kwargs)
         self.name = 'msems_inverted'
 
+        # Limits of the size bins (n_bins + 1), set in data_corrections()
+        self.bin_limits: np.ndarray | None = None
+
     def data_corrections(self, df, **kwargs):
-        ''' Create new columns to plot bins  '''
+        ''' Calculate the bin limits and the start/end time of each scan '''
         bins = df.groupby('NumBins').all().index.to_list()
         if len(bins) != 1:
             # Check that there is only one single value.
@@ -52,49 +58,30 @@ class MSEMSInverted(Instrument):
         # Form column names of all bins
         bin_diameter_columns = [f"Bin_Dia{i}" for i in range(1, bins+1)]
 
-        # Calculate the mean of the bin diameters
-        bin_diameter_average = df[bin_diameter_columns].mean()
-
-        # Convert the bin diameters to log10
-        bin_diameter_log = np.log10(bin_diameter_average)
+        # Calculate the mean of the bin diameters, in log10
+        bin_diameter_log = np.log10(
+            df[bin_diameter_columns].mean().to_numpy(dtype=float)
+        )
 
-        # Calculate first and last bin limits
-        first_bin_radius = (
-            bin_diameter_log[bin_diameter_columns[1]]
-            - bin_diameter_log[bin_diameter_columns[0]]
-        ) / 2
+        # The limits between bins are the midpoints in log space. The first
+        # and last limits extend the outer bins by half of their neighbour's
+        # width (so there are total n_bins + 1)
         first_bin_min = (
-            bin_diameter_log[bin_diameter_columns[0]] - first_bin_radius
+            bin_diameter_log[0]
+            - (bin_diameter_log[1] - bin_diameter_log[0]) / 2
         )
-
-        last_bin_radius = (
-            bin_diameter_log[bin_diameter_columns[-1]]
-            - bin_diameter_log[bin_diameter_columns[-2]]
-        ) / 2
-
         last_bin_max = (
-            bin_diameter_log[bin_diameter_columns[-1]] + last_bin_radius
+            bin_diameter_log[-1]
+            + (bin_diameter_log[-1] - bin_diameter_log[-2]) / 2
         )
+        bin_limits_log = np.concatenate((
+            [first_bin_min],
+            (bin_diameter_log[:-1] + bin_diameter_log[1:]) / 2,
+            [last_bin_max]
+        ))
 
-        # Create the bin limit columns and add the first limit column
-        # (so there are total n_bins + 1)
-        bin_limit_columns = [f"Bin_Lim{i}" for i in range(1, bins+1)]
-        bin_limit_columns.insert(0, "Bin_Lim0")
-
-        # Add first and last bins
-        df[bin_limit_columns[0]] = first_bin_min
-        df[bin_limit_columns[-1]] = last_bin_max
-
-        # Calculate the bin limits for all but the first and last
-        for i, col in enumerate(bin_limit_columns[1:-1]):
-            df[col] = (
-                bin_diameter_log[i]
-                + (bin_diameter_log[i+1] - bin_diameter_log[i])
-                / 2
-            )
-
-        # Return values to the inverse of log10
-        df[bin_limit_columns] = 10 ** df[bin_limit_columns]
+        # Store the limits once on the instrument, returned from log10
+        self.bin_limits = 10 ** bin_limits_log
 
         # Set the EndTime to the StartTime of the next row
         df['StartTime'] = df.index
@@ -115,6 +102,46 @@ class MSEMSInverted(Instrument):
 
         return df
 
+    def corrects_rows_alone(
+        self,
+        ground_station: Dict[str, Any],
+    ) -> bool:
+        ''' False, the bin limits are the mean of all scans and each scan
+        ends when the next one starts '''
+
+        return False
+
+    def build_size_distribution(
+        self,
+        df: pd.DataFrame
+    ) -> SizeDistribution:
+        ''' Gather the bin concentrations with the limits from corrections '''
+
+        bins = len(self.bin_limits) - 1
+
+        return SizeDistribution.from_columns(
+            df,
+            [f"Bin_Conc{i}" for i in range(1, bins + 1)],
+            bin_limits=self.bin_limits,
+            bin_centres=df[
+                [f"Bin_Dia{i}" for i in range(1, bins + 1)]
+            ].mean().to_numpy(dtype=float),
+            name=self.name,
+        )
+
+    def build_scan_index(
+        self,
+        df: pd.DataFrame
+    ) -> ScanIndex:
+        ''' Each scan lasts until the next one starts, the last one 1 minute
+
+        As the EndTime of data_corrections(), without the second removed as
+        the scans of the index do not include their end
+        '''
+
+        return ScanIndex.from_starts(
+            df.index, last_duration=pd.Timedelta(minutes=1), name=self.name)
+
     def file_identifier(
         self,
         first_lines_of_csv
@@ -198,6 +225,80 @@ class MSEMSScan(Instrument):
         super().__init__(*args, **kwargs)
         self.name = 'msems_scan'
 
+    def read_scan_configuration(self) -> Dict[str, str]:
+        ''' Read the key:value pairs of the commented header of the file
+
+        The scan configuration (num_bins, scan_min_dia, scan_max_dia) is only
+        given in the header, above the column names
+        '''
+
+        scan_config = {}
+        with open(self.filename, 'r') as in_file:
+            for line in in_file:
+                if not line.startswith('#') or line.startswith('#YY/MM/DD'):
+                    break
+                if ':' in line:
+                    key, value = line[1:].split(':', 1)
+                    scan_config[key.strip()] = value.strip()
+
+        return scan_config
+
+    def build_size_distribution(
+        self,
+        df: pd.DataFrame
+    ) -> SizeDistribution:
+        ''' Gather the raw bin readings, log-spaced between the scan limits '''
+
+        scan_config = self.read_scan_configuration()
+        bins = int(scan_config['num_bins'])
+        bin_limits = np.logspace(
+            np.log10(float(scan_config['scan_min_dia'])),
+            np.log10(float(scan_config['scan_max_dia'])),
+            bins + 1
+        )
+
+        return SizeDistribution.from_columns(
+            df,
+            [f"bin{i}" for i in range(1, bins + 1)],
+            bin_limits=bin_limits,
+            name=self.name,
+        )
+
+    def add_size_distribution_products(
+        self,
+        df: pd.DataFrame
+    ) -> pd.DataFrame:
+        ''' No derived products, the scan readings are raw counts
+
+        The concentrations (and their products) are in msems_inverted
+        '''
+
+        return df
+
+    def corrects_rows_alone(
+        self,
+        ground_station: Dict[str, Any],
+    ) -> bool:
+        ''' False, each scan of the scan index ends when the next starts '''
+
+        return False
+
+    def dndlogdp_dataframe(self) -> pd.DataFrame | None:
+        ''' None, the scan readings are raw counts (see msems_inverted) '''
+
+        return None
+
+    def build_scan_index(
+        self,
+        df: pd.DataFrame
+    ) -> ScanIndex:
+        ''' Each scan lasts until the next one starts
+
+        The last one lasts the median time between the scans
+        '''
+
+        return ScanIndex.from_starts(df.index, name=self.name)
+
     def file_identifier(
         self,
         first_lines_of_csv
@@ -122,4 +122,5 @@ pico = Pico(
         "Differential CO (ppm)", "Battery Charge (V)",
         "Power Input (mV)", "Current (mA)", "SOC (%)",
         "Battery T (degC)", "FET T (degC)"],
+    duplicate_policy="mean",  # Times rounded to the second
     pressure_variable="P (mbars)")
@@ -18,7 +18,13 @@ POPS_flow -> flow should be just below 3, and check for variability increase
 '''
 
 from .base import Instrument
+from processing.size_distribution import SizeDistribution
+from typing import Any, Dict
 import pandas as pd
+import numpy as np
+
+# Number of size bins reported by the POPS (b0 -> b15)
+POPS_BINS = 16
 
 
 class POPS(Instrument):
@@ -30,6 +36,18 @@ class POPS(Instrument):
         super().__init__(*args, **kwargs)
         self.name = 'pops'
 
+        # Calibrated diameter limits of the bins in nm (POPS_BINS + 1). These
+        # depend on the instrument's calibration so are set in the config
+        self.bin_limits: np.ndarray | None = None
+
+    def add_config(self, yaml_props: Dict[str, Any]):
+        ''' Adds the application's config, including optional bin limits '''
+
+        super().add_config(yaml_props)
+
+        if yaml_props.get('bin_limits') is not None:
+            self.bin_limits = np.asarray(yaml_props['bin_limits'], dtype=float)
+
     def file_identifier(
         self,
         first_lines_of_csv
@@ -72,15 +90,46 @@ class POPS(Instrument):
 
         df.columns = df.columns.str.strip()
 
-        # Calculate PartCon_186
-        df['PartCon_186'] = (df['b3'] + df['b4'] + df['b5'] + df['b6']
-                             + df['b7'] + df['b8'] + df['b9'] + df['b10']
-                             + df['b11'] + df['b12'] + df['b13'] + df['b14']
-                             + df['b15']) / df['POPS_Flow'].mean()
+        # Calculate PartCon_186 from the sum of the counts of bins b3 -> b15,
+        # divided by the mean flow
+        counts = df[[f'b{i}' for i in range(3, POPS_BINS)]].to_numpy(
+            dtype='float64', na_value=np.nan)
+        df['PartCon_186'] = pd.Series(
+            counts.sum(axis=1) / df['POPS_Flow'].mean(),
+            index=df.index, dtype='Float64')
         df.drop(columns="PartCon", inplace=True)
 
         return df
 
+    def corrects_rows_alone(
+        self,
+        ground_station: Dict[str, Any],
+    ) -> bool:
+        ''' False, PartCon_186 and the size distribution are divided by the
+        mean flow of all rows '''
+
+        return False
+
+    def build_size_distribution(
+        self,
+        df: pd.DataFrame
+    ) -> SizeDistribution:
+        ''' Gather the bins b0 -> b15, with limits if given in the config
+
+        The bins hold particle counts, which are converted to concentrations
+        by dividing by the mean POPS_Flow
+        '''
+
+        size_distribution = SizeDistribution.from_columns(
+            df,
+            [f"b{i}" for i in range(0, POPS_BINS)],
+            bin_limits=self.bin_limits,
+            name=self.name,
+        )
+        size_distribution.data /= df['POPS_Flow'].mean()
+
+        return size_distribution
+
 
 pops = POPS(
     dtype={
@@ -143,4 +192,5 @@ pops = POPS(
         "MaxPeakPts", "RawPts", "b0", "b1", "b2", "b3", "b4", "b5", "b6",
         "b7", "b8", "b9", "b10", "b11", "b12", "b13", "b14", "b15"
     ],
+    duplicate_policy='mean',  # Times rounded to the second
     pressure_variable='P')
@@ -18,12 +18,17 @@ change date if we pass midnight (not implemented yet).
 from .base import Instrument
 import datetime
 import pandas as pd
+from typing import Any, Dict
 import logging
 from constants import constants
 
 logger = logging.getLogger(__name__)
 logger.setLevel(constants.LOGLEVEL_CONSOLE)
 
+# A time of day this much earlier than the row before is on the next day.
+# Smaller steps back are jitter of the clock and stay on the same day
+MIDNIGHT_ROLLOVER_JUMP = pd.Timedelta(hours=12)
+
 
 class SmartTether(Instrument):
     def __init__(
@@ -67,6 +72,20 @@ class SmartTether(Instrument):
 
         As the rows store only a time variable, a rollover at midnight is
         possible. This function checks for this and corrects the date if needed
+        (for as many midnights as the data passes)
+        '''
+
+        return self.set_time_as_index_chunk(df, {})
+
+    def set_time_as_index_chunk(
+        self,
+        df: pd.DataFrame,
+        state: Dict[str, Any],
+    ) -> pd.DataFrame:
+        ''' Set the DateTime index of rows that follow on from earlier rows
+
+        The time of day of the last row and the number of midnights passed
+        are kept in state for the next rows
         '''
 
         # Date from header (stored in self.date), then add time
@@ -74,17 +93,28 @@ class SmartTether(Instrument):
             self.date + pd.to_timedelta(df['Time'])
         )
 
-        # Check for midnight rollover. Can assume that the data will never be
-        # longer than a day, so just check once for a midnight rollover
-        start_time = pd.Timestamp(df.iloc[0]['Time'])
-        for i, row in df.iterrows():
-            # check if the timestamp is earlier than the start time (i.e. it's
-            # the next day)
-            if pd.Timestamp(row['Time']) < start_time:
-                # add a day to the date column
-                logger.info("SmartTether date passes midnight. Correcting...")
-                logger.info(F"Adding a day at: {df.at[i, 'DateTime']}")
-                df.at[i, 'DateTime'] += pd.Timedelta(days=1)
+        # Check for midnight rollovers. Each time the time of day jumps back
+        # by more than MIDNIGHT_ROLLOVER_JUMP from the last row with a time,
+        # the following rows are a day later
+        time_of_day = pd.to_timedelta(df['Time'])
+        previous_time_of_day = time_of_day.ffill().shift(1)
+        if len(df) > 0 and state.get('last_time_of_day') is not None:
+            previous_time_of_day = previous_time_of_day.fillna(
+                state['last_time_of_day'])
+        rollovers = (
+            previous_time_of_day - time_of_day > MIDNIGHT_ROLLOVER_JUMP
+        ).to_numpy()
+        days_passed = rollovers.cumsum() + state.get('days_passed', 0)
+        for rollover in df.index[rollovers]:
+            logger.info("SmartTether date passes midnight. Correcting...")
+            logger.info(f"Adding a day at: {df.at[rollover, 'DateTime']}")
+        df['DateTime'] += pd.to_timedelta(days_passed, unit='D')
+
+        if len(df) > 0:
+            last_time_of_day = time_of_day.dropna()
+            if len(last_time_of_day) > 0:
+                state['last_time_of_day'] = last_time_of_day.iloc[-1]
+            state['days_passed'] = int(days_passed[-1])
 
         df.drop(columns=["Time"], inplace=True)
 
@@ -122,4 +152,6 @@ smart_tether = SmartTether(
                        "T (deg C)", "%RH", "Wind (degrees)", "Wind (m/s)",
                        "Supply (V)", "UTC Time", "Latitude (deg)",
                        "Longitude (deg)", "Course (deg)", "Speed (m/s)"],
+    cols_circular={"Wind (degrees)": "Wind (m/s)",
+                   "Course (deg)": "Speed (m/s)"},
     pressure_variable='P (mbar)')
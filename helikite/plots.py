@@ -2,11 +2,18 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 import pandas as pd
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Set, Iterable, Callable
 import logging
 from constants import constants
 import numpy as np
-from processing.helpers import reduce_column_to_single_unique_value
+from processing.instrumentation import StageRecorder
+from processing.merge import MergedFrame
+from processing.profiling import Profiler
+from processing.pyramid import Pyramid
+from processing.resample import (
+    circular_columns, grid_origin, resample_block, resample_merged
+)
+from processing.size_distribution import SizeDistribution
 import instruments
 import os
 
@@ -14,6 +21,13 @@ import os
 logger = logging.getLogger(__name__)
 logger.setLevel(constants.LOGLEVEL_CONSOLE)
 
+# Shading of the flight phases on the altitude plot (hovering is not shaded)
+PHASE_COLOURS = {
+    'ground': 'grey',
+    'ascent': 'rgb(31, 119, 180)',
+    'descent': 'rgb(214, 39, 40)',
+}
+
 
 def plot_scatter_from_variable_list_by_index(
     df: pd.DataFrame,
@@ -51,7 +65,8 @@ def generate_grid_plot(
     df: pd.DataFrame,
     all_instruments: List[instruments.Instrument],
     altitude_col: str = "flight_computer_Altitude",
-    resample_seconds: int | None = None
+    resample_seconds: int | None = None,
+    resampled_df: pd.DataFrame | None = None,
 ) -> go.Figure:
     ''' Generates a 4x3 plot of quicklooks variables from several instruments
 
@@ -59,9 +74,9 @@ def generate_grid_plot(
     the total count of points in the plot. This is useful for large datasets
     where the plot is too slow to render, or too many points to be useful.
 
-    The resampling will not happen on the wind direction due to the nature
-    of the data. The wind direction is a circular variable, and resampling
-    will not work as expected.
+    The wind direction is a circular variable, so it is resampled as the
+    direction of the mean wind vector (weighted by the wind speed) rather
+    than the mean of the angles.
 
     Parameters
     ----------
@@ -74,12 +89,31 @@ def generate_grid_plot(
         "flight_computer_Altitude"
     resample_seconds : int, optional
         The number of seconds to resample the data to, by default None
+    resampled_df : pd.DataFrame, optional
+        The mean of the data already resampled to resample_seconds (see
+        processing.pyramid and processing.resample), with circular columns
+        averaged as vectors, used instead of resampling df
     '''
 
     colors = generate_normalised_colours(df)
     fig = make_subplots(rows=3, cols=4, shared_yaxes=False)
 
-    # Always plot wind degrees with original data (not resampled)
+    # Resample the data, and replace the dataframe with the resampled version
+    if resample_seconds is not None:
+        if resampled_df is not None:
+            logger.info("Using grid-plot data already resampled at the "
+                        f"mean of {resample_seconds} seconds")
+            df = resampled_df
+        else:
+            logger.info(
+                "Resampling grid-plot data at the mean of "
+                f"{resample_seconds} seconds "
+            )
+            df = resample_block(
+                df, resample_seconds, grid_origin(df.index),
+                circular=circular_columns(all_instruments))
+        colors = generate_normalised_colours(df)
+
     if instruments.smart_tether in all_instruments:
         fig.add_trace(go.Scattergl(
             x=df["smart_tether_Wind (degrees)"],
@@ -93,16 +127,6 @@ def generate_grid_plot(
             )),
             row=1, col=4)
 
-    # Resample the data, and replace the dataframe with the resampled version
-    if resample_seconds is not None:
-        logger.info(
-            "Resampling grid-plot data at the mean of "
-            f"{resample_seconds} seconds "
-        )
-        df = df.resample(
-            f'{int(resample_seconds)}S').mean(numeric_only=True)
-        colors = generate_normalised_colours(df)
-
     # Add the same temperature plots to all three rows
     for row_id in range(1, 4):
 
@@ -409,102 +433,82 @@ def generate_grid_plot(
     return fig
 
 
-def generate_particle_heatmap(
-    df: pd.DataFrame,
-    props_msems_inverted: Dict[str, Any],
-    props_msems_scan: Dict[str, Any],
+def generate_size_distribution_heatmap(
+    size_distribution: SizeDistribution,
+    title: str,
+    props: Dict[str, Any],
 ) -> go.Figure:
+    ''' Generate a heatmap of the size bins (y) over time (x) '''
 
-    figlist = []
-
-    # Get number of bins
-    bins = reduce_column_to_single_unique_value(df, 'msems_inverted_NumBins')
-
-    z = df[[f"msems_inverted_Bin_Conc{x}" for x in range(1, bins)]].dropna()
-    y = df[[f"msems_inverted_Bin_Lim{x}" for x in range(1, bins)]].dropna()
-    x = df[['msems_inverted_StartTime']].dropna()
+    y = size_distribution.bin_centres
     fig = go.Figure(
         data=go.Heatmap(
-            z=z.T,
-            x=x.index.values,
-            y=y.mean(),
+            z=size_distribution.data.T,
+            x=size_distribution.time_index.values,
+            y=y,
             colorscale='Viridis',
-            **props_msems_inverted
+            **props
         )
     )
     fig.update_yaxes(
         type='log',
-        range=(np.log10(y.mean()[0]), np.log10(y.mean()[-1])),
+        range=(np.log10(y[0]), np.log10(y[-1])),
         tickformat="f", nticks=4
     )
-    fig.update_layout(**constants.PLOT_LAYOUT_COMMON,
-                      title="Bin concentrations (msems_inverted)")
+    fig.update_layout(**constants.PLOT_LAYOUT_COMMON, title=title)
 
     fig.update_yaxes(title_text="D<sub>p</sub> [nm]")
     fig.update_xaxes(title_text="Time")
     fig.update_layout(height=600)
 
-    figlist.append(fig)
+    return fig
 
-    z = df[[f"msems_scan_bin{x}" for x in range(1, bins)]].dropna()
-    y = df[[f"msems_inverted_Bin_Lim{x}" for x in range(1, bins)]].dropna()
-    x = df[['msems_inverted_StartTime']].dropna()
 
-    fig = go.Figure(
-        data=go.Heatmap(
-            z=z.T,
-            x=x.index.values,
-            y=y.mean(),
-            colorscale='Viridis',
-            **props_msems_scan
-        )
-    )
-    fig.update_yaxes(
-        type='log', range=(np.log10(y.mean()[0]), np.log10(y.mean()[-1])),
-        tickformat="f", nticks=4
-    )
-    fig.update_layout(
-        **constants.PLOT_LAYOUT_COMMON, title="Bin readings (msems_scan)"
-    )
+def generate_particle_heatmap(
+    msems_inverted: SizeDistribution,
+    msems_scan: SizeDistribution | None,
+    props_msems_inverted: Dict[str, Any],
+    props_msems_scan: Dict[str, Any],
+) -> List[go.Figure]:
+    ''' Generate heatmaps of the mSEMS inverted and scan bins over time
 
-    fig.update_yaxes(title_text="D<sub>p</sub> [nm]")
-    fig.update_xaxes(title_text="Time")
-    fig.update_layout(height=600)
+    The scan heatmap is omitted if there is no msems_scan data
+    '''
 
-    figlist.append(fig)
+    figlist = [
+        generate_size_distribution_heatmap(
+            msems_inverted, "Bin concentrations (msems_inverted)",
+            props_msems_inverted)
+    ]
+
+    if msems_scan is not None:
+        figlist.append(
+            generate_size_distribution_heatmap(
+                msems_scan, "Bin readings (msems_scan)", props_msems_scan)
+        )
 
     return figlist
 
 
 def generate_average_bin_concentration_plot(
-    df: pd.DataFrame,
+    size_distribution: SizeDistribution,
     title: str,
     timestamp_start: pd.Timestamp,
     timestamp_end: pd.Timestamp,
-    bin_limit_col_prefix: str = 'msems_inverted_Bin_Lim',
-    bin_concentration_col_prefix: str = 'msems_inverted_Bin_Conc',
-    bin_quantity_col: str = 'msems_inverted_NumBins',
     y_logscale: bool = False,
 ) -> go.Figure:
     ''' With a given timestamp, generate an average of MSEM bin concentrations
 
     Parameters
     ----------
-    df : pd.DataFrame
-        Dataframe containing the data
+    size_distribution : SizeDistribution
+        Size distribution to average, usually that of msems_inverted
     title : str
         Title of plot
     timestamp_start : str
         Start timestamp of period to average
     timestamp_end : str
         End timestamp of period to average
-    bin_limit_col_prefix : str, optional
-        Prefix of column containing bin limits, default: msems_inverted_Bin_Lim
-    bin_concentration_col_prefix : str, optional
-        Prefix of column containing bin concentrations,
-        default 'msems_inverted_Bin_Conc'
-    bin_quantity_col : str, optional
-        Column containing number of bins, default 'msems_inverted_NumBins'
     y_logscale : bool, optional
         Whether to use a log scale for the y axis, default False
 
@@ -515,27 +519,20 @@ def generate_average_bin_concentration_plot(
         Plotly figure
     '''
 
-    # Take sample of dataframe of the given time period
-    df = df[timestamp_start:timestamp_end]
-
-    # Get number of bins
-    bins = reduce_column_to_single_unique_value(df, bin_quantity_col)
-
-    x = df[[f"{bin_limit_col_prefix}{x}" for x in range(1, bins)]]
-    y = df[[f"{bin_concentration_col_prefix}{x}" for x in range(1, bins)]]
+    # Take sample of the distribution in the given time period
+    window = size_distribution.window(timestamp_start, timestamp_end)
+    x = window.bin_centres
 
     fig = go.Figure()
 
-    num_records = min(len(x), len(y))
+    num_records = len(window)
     logger.info(f"Generating mean MSEMS plot for {title} with {num_records} "
                 "records")
-    for i in range(0, num_records):
-        recordx = x.iloc[i]
-        recordy = y.iloc[i]
+    for timestamp, record in zip(window.time_index, window.data):
         fig.add_trace(go.Scattergl(
-            x=recordx.to_numpy().flatten(),
-            y=recordy.to_numpy().flatten(),
-            name=str(recordx.name),
+            x=x,
+            y=record,
+            name=str(timestamp),
             line={
                 "color": "rgba(143, 82, 244 ,0.2)",
                 "width": 2.5
@@ -545,8 +542,8 @@ def generate_average_bin_concentration_plot(
 
     # Plot the mean
     fig.add_trace(go.Scattergl(
-        x=x.mean(numeric_only=True).to_numpy().flatten(),
-        y=y.mean(numeric_only=True).to_numpy().flatten(),
+        x=x,
+        y=window.mean(),
         line={
             "width": 5,
             "color": "rgba(255, 0, 0, 1)"
@@ -559,7 +556,7 @@ def generate_average_bin_concentration_plot(
     fig.update_layout(height=600)
     fig.update_xaxes(
         title_text="Bin size", type='log',
-        range=(np.log10(x.mean()[0]), np.log10(x.mean()[-1])),
+        range=(np.log10(x[0]), np.log10(x[-1])),
         tickformat="f", nticks=4
     )
     fig.update_yaxes(title_text="Particle concentration")
@@ -570,9 +567,117 @@ def generate_average_bin_concentration_plot(
     return fig
 
 
+def generate_vertical_profile_plot(
+    profile: pd.DataFrame,
+    variables: List[str],
+    at_ground_level: bool,
+) -> go.Figure:
+    ''' Plot the vertical profiles of the variables side by side
+
+    The median (or the mean if there is no median) of each altitude bin is
+    drawn for the ascents and the descents, within a band between the lowest
+    and the highest percentile (or the min and the max) of the bin
+
+    Parameters
+    ----------
+    profile : pd.DataFrame
+        Profile of processing.profiles.vertical_profile()
+    variables : List[str]
+        Columns of the merged data to plot. Those not in the profile are
+        skipped
+    at_ground_level : bool
+        If the profile is binned by the altitude above ground level
+    '''
+
+    variables = [var for var in variables
+                 if any(col.rsplit('_', 1)[0] == var
+                        for col in profile.columns)]
+    fig = make_subplots(rows=1, cols=max(len(variables), 1),
+                        shared_yaxes=True, subplot_titles=variables)
+    colours = {'ascent': 'rgb(31, 119, 180)', 'descent': 'rgb(214, 39, 40)'}
+    bands = {'ascent': 'rgba(31, 119, 180, 0.2)',
+             'descent': 'rgba(214, 39, 40, 0.2)'}
+
+    for col, var in enumerate(variables, start=1):
+        statistics = [column.rsplit('_', 1)[1] for column in profile.columns
+                      if column.rsplit('_', 1)[0] == var
+                      and profile[column].notna().any()]
+        centre = 'median' if 'median' in statistics else 'mean'
+        percentiles = sorted(
+            (float(statistic[1:]), statistic) for statistic in statistics
+            if statistic.startswith('p'))
+        if len(percentiles) > 1:
+            low, high = percentiles[0][1], percentiles[-1][1]
+        elif 'min' in statistics and 'max' in statistics:
+            low, high = 'min', 'max'
+        else:
+            low, high = None, None
+
+        for direction in profile.index.unique('direction'):
+            rows = profile.xs(direction, level='direction')
+            altitude = rows.index.to_numpy()
+            if low is not None:
+                fig.add_trace(go.Scatter(
+                    x=np.concatenate([rows[f"{var}_{low}"],
+                                      rows[f"{var}_{high}"][::-1]]),
+                    y=np.concatenate([altitude, altitude[::-1]]),
+                    fill='toself', fillcolor=bands.get(direction),
+                    line=dict(width=0), hoverinfo='skip',
+                    name=f"{direction} {low}-{high}", legendgroup=direction,
+                    showlegend=col == 1,
+                ), row=1, col=col)
+            if centre in statistics:
+                fig.add_trace(go.Scatter(
+                    x=rows[f"{var}_{centre}"],
+                    y=altitude,
+                    mode='lines+markers',
+                    line=dict(color=colours.get(direction)),
+                    marker=dict(size=constants.PLOT_MARKER_SIZE / 2),
+                    name=f"{direction} {centre}", legendgroup=direction,
+                    showlegend=col == 1,
+                ), row=1, col=col)
+
+    if at_ground_level:
+        title = "Vertical profiles (altitude above ground level)"
+    else:
+        title = "Vertical profiles (altitude above sea level)"
+
+    fig.update_layout(**constants.PLOT_LAYOUT_COMMON, title=title)
+    fig.update_yaxes(title_text="Altitude (m)", row=1, col=1)
+    fig.update_yaxes(mirror=True, showline=True, linecolor='black',
+                     linewidth=2)
+    fig.update_xaxes(mirror=True, showline=True, linecolor='black',
+                     linewidth=2)
+
+    return fig
+
+
+def vertical_profile_variables(
+    all_instruments: List[instruments.Instrument],
+) -> List[str]:
+    ''' Variables of the vertical profile plot of the available instruments
+    '''
+
+    variables = [
+        f"{instruments.flight_computer.name}_TEMP1",
+        f"{instruments.flight_computer.name}_RH1",
+    ]
+    for instrument, columns in [
+        (instruments.smart_tether, ["Wind (m/s)", "Wind (degrees)"]),
+        (instruments.pops, ["PartCon_186"]),
+        (instruments.ozone_monitor, ["ozone"]),
+        (instruments.pico, ["CO (ppm)"]),
+    ]:
+        if instrument in all_instruments:
+            variables += [f"{instrument.name}_{col}" for col in columns]
+
+    return variables
+
+
 def write_plots_to_html(
     figures: List[go.Figure],
-    filename: str
+    filename: str,
+    figure_cache: 'FigureCache | None' = None,
 ) -> None:
 
     # Remove all None items in figures list. These are None because an
@@ -584,14 +689,23 @@ def write_plots_to_html(
     with open(filename, 'w') as f:
         # Write figures. They'll be sorted by the order they were added
         for fig in figures:
-            f.write(fig.to_html(full_html=False, include_plotlyjs=True))
+            if figure_cache is not None:
+                f.write(figure_cache.to_html(fig))
+            else:
+                f.write(fig.to_html(full_html=False, include_plotlyjs=True))
 
 
 def generate_altitude_plot(
     df: pd.DataFrame,
     at_ground_level: bool,
     altitude_col: str = "flight_computer_Altitude",
+    segments: pd.DataFrame | None = None,
 ) -> go.Figure:
+    ''' Plot the altitude over time
+
+    The flight segments (see processing.segments), if given, are shaded by
+    their phase
+    '''
 
     colors = generate_normalised_colours(df)
 
@@ -609,6 +723,13 @@ def generate_altitude_plot(
         )
     )
 
+    if segments is not None:
+        for start, end, phase in zip(segments['start'], segments['end'],
+                                     segments['phase']):
+            if phase in PHASE_COLOURS:
+                fig.add_vrect(x0=start, x1=end, fillcolor=PHASE_COLOURS[phase],
+                              opacity=0.15, line_width=0, layer='below')
+
     if at_ground_level:
         title = "Altitude (ground level)"
     else:
@@ -691,56 +812,15 @@ def generate_normalised_colours(
     return colors
 
 
-def campaign_2023(
-    df: pd.DataFrame,
-    plot_props: Dict[str, Any],
+def pressure_variables(
     all_instruments: List[instruments.Instrument],
-    output_path_with_time: str,
-) -> None:
+) -> Tuple[List[str], List[str]]:
+    ''' The housekeeping pressure and pressure columns of the instruments
 
-    ''' Defines all the plots for the 2023 campaigns
-
-    Due to the plot specifications being bespoke according to plans defined
-    in 2023, this function attemps to isolate these decisions from further
-    plotting requirements in the future
-
-    Parameters
-    ----------
-    df : pd.DataFrame
-        Dataframe containing all the merged data to be plotted
-    plot_props : Dict[str, Any]
-        Dictionary containing all the properties for the plots originating from
-        the runtime YAML
-    all_instruments : List[instruments.Instrument]
-        List of all instruments that are available after merging all the data
-    output_path_with_time : str
-        Path to the output directory for the plots, most likely the one
-        generated in helikite.py with the current output time
+    Lists the instruments with a pressure variable, which allows the
+    automatic addition of an instrument to the pressure plots
     '''
 
-    # Set altitude plots based on ground station altitude or calculated
-    if plot_props['altitude_ground_level'] is True:
-        altitude_col = constants.ALTITUDE_GROUND_LEVEL_COL
-        logger.info('Plotting altitude relative to ground level')
-    else:
-        altitude_col = constants.ALTITUDE_SEA_LEVEL_COL
-        logger.info('Plotting altitude relative to sea level')
-
-    # List to add plots to that will end up being exported
-    figures_quicklook = []
-    figures_qualitycheck = []
-
-    figures_quicklook.append(generate_altitude_plot(
-        df, at_ground_level=plot_props["altitude_ground_level"],
-        altitude_col=altitude_col)
-    )
-    figures_quicklook.append(generate_grid_plot(
-        df, all_instruments, altitude_col=altitude_col,
-        resample_seconds=plot_props['grid']['resample_seconds'])
-    )
-
-    # Create a list of instruments with pressure housekeeping variables
-    # This allows automatic addition of instrument to pressure plots
     pressure_housekeeping = []
     pressure_quicklook = []
 
@@ -753,26 +833,19 @@ def campaign_2023(
                 f"{instrument.name}_{instrument.pressure_variable}"
             )
 
-    # Housekeeping pressure vars as qualitychecks
-    figures_qualitycheck.append(
-        plot_scatter_from_variable_list_by_index(
-            df, "Housekeeping pressure variables", pressure_housekeeping
-        )
-    )
+    return pressure_housekeeping, pressure_quicklook
 
-    # Same with just pressure vars
-    figures_qualitycheck.append(
-        plot_scatter_from_variable_list_by_index(
-            df, "Pressure variables", pressure_quicklook
-        )
-    )
 
-    ''' Generate plots for qualitychecks based on their variable name in the
-        merged dataframe. The two parameter Tuple[List[str], str] represents
-        the list of variables, and the title given to the plot in the second
-        parameter.
+def qualitycheck_variables(
+    all_instruments: List[instruments.Instrument],
+) -> List[Tuple[List[str], str]]:
+    ''' Variables of the qualitycheck plots of the available instruments
+
+    Each plot is given by the list of its variables in the merged dataframe
+    and its title
     '''
-    for variables, instrument in [
+
+    plots = [
         ([f"{instruments.flight_computer.name}_vBat",
           f"{instruments.flight_computer.name}_TEMPbox"],
          "Flight Computer"),
@@ -805,34 +878,427 @@ def campaign_2023(
          "Filter"
          ) if instruments.filter in all_instruments else (None, None),
         ([f"{instruments.stap_raw.name}_smp_flw"],
-          "STAP Raw",
-        ) if instruments.stap_raw in all_instruments else (None, None),
+         "STAP Raw",
+         ) if instruments.stap_raw in all_instruments else (None, None),
+    ]
+
+    return [(variables, title) for variables, title in plots
+            if variables is not None]
+
+
+def grid_variables(
+    all_instruments: List[instruments.Instrument],
+    altitude_col: str = "flight_computer_Altitude",
+) -> List[str]:
+    ''' Variables of the grid plot (see generate_grid_plot()) of the
+    available instruments '''
+
+    variables = [altitude_col] + [
+        f"{instruments.flight_computer.name}_{col}"
+        for col in ["TEMP1", "TEMP2", "TEMPsamp", "RH1", "RH2", "CO2"]
+    ]
+    for instrument, columns in [
+        (instruments.smart_tether,
+         ["Wind (degrees)", "T (deg C)", "Wind (m/s)", "%RH"]),
+        (instruments.pops, ["PartCon_186"]),
+        (instruments.stap, ["sigmab_smth", "sigmag_smth", "sigmar_smth"]),
+        (instruments.stap_raw, ["invmm_b", "invmm_g", "invmm_r"]),
+        (instruments.pico, ["CO (ppm)", "N2O (ppm)"]),
+        (instruments.ozone_monitor, ["ozone"]),
     ]:
-        if variables is not None:
-            figures_qualitycheck.append(
-                plot_scatter_from_variable_list_by_index(
-                    df, instrument, variables,
-                )
-            )
+        if instrument in all_instruments:
+            variables += [f"{instrument.name}_{col}" for col in columns]
+
+    return variables
+
+
+def budget_resample_seconds(
+    merged: MergedFrame,
+    columns: List[str],
+    memory_budget: float,
+    overhead: float = constants.MERGE_WINDOW_OVERHEAD,
+) -> int | None:
+    ''' Bin length that keeps the plotted columns of merged in budget
+
+    None if the dense columns already fit in the memory budget, otherwise
+    the shortest whole number of seconds whose bins over the flight fit,
+    with the overhead of building the figures from them
+    '''
+
+    row_bytes = merged.row_bytes(columns) * overhead
+    if merged.dense_rows() * row_bytes <= memory_budget:
+        return None
+
+    times = merged.union_index().dropna()
+    if len(times) == 0:
+        return None
+    duration = (times[-1] - times[0]).total_seconds()
+
+    return max(int(np.ceil(duration * row_bytes / memory_budget)), 1)
+
+
+def budget_timeseries(
+    merged: MergedFrame,
+    columns: List[str],
+    seconds: int,
+    circular: Dict[str, str | None],
+    pyramid: Pyramid | None = None,
+) -> pd.DataFrame:
+    ''' The mean of the columns in bins of at least seconds
+
+    Read from the pyramid if it holds all of the columns, in bins of the
+    first multiple of its finest level, otherwise resampled from the blocks
+    '''
+
+    if pyramid is not None and pyramid.levels:
+        finest = min(pyramid.levels)
+        available = set(pyramid.levels[finest].columns.get_level_values(0))
+        if all(col in available for col in columns):
+            return pyramid.aggregate(
+                int(np.ceil(seconds / finest)) * finest, columns=columns)
+
+    return resample_merged(merged, seconds, columns, circular=circular
+                           ).to_dense(columns=columns)
+
+
+def timeseries_variables(
+    all_instruments: List[instruments.Instrument],
+    altitude_col: str = "flight_computer_Altitude",
+) -> List[str]:
+    ''' Variables of the figures plotted from the merged dataframe
+
+    Those of the altitude, grid, pressure and qualitycheck plots, each once
+    '''
+
+    pressure_housekeeping, pressure_quicklook = pressure_variables(
+        all_instruments)
+    variables = (grid_variables(all_instruments, altitude_col)
+                 + pressure_housekeeping + pressure_quicklook)
+    for qualitycheck, title in qualitycheck_variables(all_instruments):
+        variables += qualitycheck
+
+    return list(dict.fromkeys(variables))
+
+
+def variable_instruments(
+    variables: Iterable[str],
+    all_instruments: List[instruments.Instrument],
+) -> Set[str]:
+    ''' Names of the instruments whose prefixed columns are in variables '''
+
+    # The longest name first, as stap_raw_ columns also start with stap_
+    names = sorted((instrument.name for instrument in all_instruments),
+                   key=len, reverse=True)
+
+    found = set()
+    for variable in variables:
+        for name in names:
+            if variable.startswith(f"{name}_"):
+                found.add(name)
+                break
+
+    return found
+
+
+class FigureCache:
+    ''' Figures, and their HTML, kept between runs of campaign_2023()
+
+    A figure is only rebuilt when one of the instruments it depends on has
+    been invalidated since it was built, or when it depends on other
+    instruments than when it was built (an instrument whose variables join
+    the figure), and only converted to HTML once.
+    This lets watch.py refresh the quicklooks as the instrument files grow
+    without rebuilding the figures of the instruments that did not change.
+    '''
+
+    def __init__(self) -> None:
+        # Figure (or list of figures) by name, with the instruments it
+        # depends on (None for all instruments)
+        self._figures: Dict[str, Tuple[Set[str] | None, Any]] = {}
+        # HTML of each figure by its id, with the figure to keep the id valid
+        self._html: Dict[int, Tuple[go.Figure, str]] = {}
+
+    def invalidate(
+        self,
+        instrument_names: Iterable[str],
+    ) -> None:
+        ''' Drop the figures that depend on any of the instruments '''
+
+        instrument_names = set(instrument_names)
+        for name, (depends_on, figure) in list(self._figures.items()):
+            if depends_on is None or depends_on & instrument_names:
+                self.discard(name)
+
+    def discard(
+        self,
+        name: str,
+    ) -> None:
+        ''' Drop a figure and its HTML, if it is cached '''
+
+        depends_on, figure = self._figures.pop(name, (None, None))
+        for fig in figure if isinstance(figure, list) else [figure]:
+            self._html.pop(id(fig), None)
+
+    def build(
+        self,
+        recorder: StageRecorder,
+        name: str,
+        depends_on: Iterable[str] | None,
+        func: Callable[..., Any],
+        *args,
+        **kwargs,
+    ) -> Any:
+        ''' The cached figure name, built with func if it is not cached
+
+        Parameters
+        ----------
+        recorder : StageRecorder
+            Records the time taken to build the figure as 'plots: <name>'
+        name : str
+            Unique name of the figure
+        depends_on : Iterable[str] | None
+            Names of the instruments whose data is in the figure (see
+            variable_instruments()). None to depend on all instruments
+        func : Callable[..., Any]
+            Builds the figure (or list of figures) from args and kwargs
+        '''
+
+        depends_on = set(depends_on) if depends_on is not None else None
+        if name in self._figures and self._figures[name][0] != depends_on:
+            self.discard(name)
+
+        if name not in self._figures:
+            figure = recorder.run(f"plots: {name}", func, *args, **kwargs)
+            self._figures[name] = (depends_on, figure)
+
+        return self._figures[name][1]
+
+    def get(
+        self,
+        name: str,
+        depends_on: Iterable[str] | None = None,
+    ) -> Any:
+        ''' The cached figure name, None if it is not cached
+
+        Also None if depends_on is given and differs from the instruments the
+        cached figure was built from, as build() would rebuild it
+        '''
+
+        built_on, figure = self._figures.get(name, (None, None))
+        if depends_on is not None and built_on != set(depends_on):
+            return None
+
+        return figure
+
+    def to_html(
+        self,
+        fig: go.Figure,
+    ) -> str:
+        ''' HTML of a figure, converted once while the figure is cached '''
+
+        if id(fig) not in self._html:
+            self._html[id(fig)] = (
+                fig, fig.to_html(full_html=False, include_plotlyjs=True))
+
+        return self._html[id(fig)][1]
+
+    def has_html(
+        self,
+        fig: go.Figure,
+    ) -> bool:
+        ''' Whether the figure has already been converted to HTML '''
+
+        return id(fig) in self._html
+
+
+def campaign_2023(
+    df: pd.DataFrame | MergedFrame,
+    plot_props: Dict[str, Any],
+    all_instruments: List[instruments.Instrument],
+    output_path_with_time: str,
+    recorder: StageRecorder | None = None,
+    profiler: Profiler | None = None,
+    figure_cache: FigureCache | None = None,
+    pyramid: Pyramid | None = None,
+    segments: pd.DataFrame | None = None,
+    memory_budget: float | None = None,
+) -> None:
+
+    ''' Defines all the plots for the 2023 campaigns
+
+    Due to the plot specifications being bespoke according to plans defined
+    in 2023, this function attemps to isolate these decisions from further
+    plotting requirements in the future
+
+    Parameters
+    ----------
+    df : pd.DataFrame | MergedFrame
+        Dataframe containing all the merged data to be plotted, or the
+        instrument blocks at native rate that are densified for the plots
+    plot_props : Dict[str, Any]
+        Dictionary containing all the properties for the plots originating from
+        the runtime YAML
+    all_instruments : List[instruments.Instrument]
+        List of all instruments that are available after merging all the data
+    output_path_with_time : str
+        Path to the output directory for the plots, most likely the one
+        generated in helikite.py with the current output time
+    recorder : StageRecorder | None
+        Records the time taken to build and write each figure
+    profiler : Profiler | None
+        Profiles each phase of the plotting, if enabled
+    figure_cache : FigureCache | None
+        Figures of a previous run to reuse if their instruments have not been
+        invalidated. An HTML file is only rewritten if one of its figures was
+        rebuilt
+    pyramid : Pyramid | None
+        Pre-aggregated levels of the data. The grid plot reads its resampled
+        data from them if a level divides its resample_seconds
+    segments : pd.DataFrame | None
+        Segments of the flight phases, shaded on the altitude plot
+    memory_budget : float | None
+        Bytes allowed for the plotted data of a MergedFrame. If its dense
+        columns would not fit, the timeseries are plotted from their mean
+        in bins that do (see budget_resample_seconds()). No limit if None
+    '''
+
+    if recorder is None:
+        recorder = StageRecorder()
+    if profiler is None:
+        profiler = Profiler()
+    if figure_cache is None:
+        figure_cache = FigureCache()
+
+    # Set altitude plots based on ground station altitude or calculated
+    if plot_props['altitude_ground_level'] is True:
+        altitude_col = constants.ALTITUDE_GROUND_LEVEL_COL
+        logger.info('Plotting altitude relative to ground level')
+    else:
+        altitude_col = constants.ALTITUDE_SEA_LEVEL_COL
+        logger.info('Plotting altitude relative to sea level')
+
+    # The mSEMS size distributions are plotted from their SizeDistribution,
+    # so only the columns of the timeseries plots are densified
+    profiler.begin("plots_timeseries")
+    merged = df if isinstance(df, MergedFrame) else None
+    plot_seconds = None
+    if merged is not None:
+        timeseries_cols = [
+            col for col in timeseries_variables(all_instruments, altitude_col)
+            if col in merged.columns
+        ]
+        if memory_budget is not None:
+            plot_seconds = budget_resample_seconds(
+                merged, timeseries_cols, memory_budget)
+        if plot_seconds is None:
+            df = recorder.run("plots: densify", df.to_dense,
+                              columns=timeseries_cols)
+        else:
+            logger.info("The plotted data does not fit in the memory budget "
+                        "at full resolution. Plotting its mean over "
+                        f"{plot_seconds} s")
+            df = recorder.run(
+                "plots: budget resample", budget_timeseries,
+                merged, timeseries_cols, plot_seconds,
+                circular_columns(all_instruments), pyramid)
+
+    # List to add plots to that will end up being exported
+    figures_quicklook = []
+    figures_qualitycheck = []
+
+    altitude_instruments = variable_instruments([altitude_col],
+                                                all_instruments)
+    figures_quicklook.append(figure_cache.build(
+        recorder, "altitude", altitude_instruments, generate_altitude_plot,
+        df, at_ground_level=plot_props["altitude_ground_level"],
+        altitude_col=altitude_col, segments=segments)
+    )
+    grid_instruments = variable_instruments(
+        grid_variables(all_instruments, altitude_col), all_instruments)
+    resample_seconds = plot_props['grid']['resample_seconds']
+    if plot_seconds is not None and (
+        resample_seconds is None or resample_seconds < plot_seconds
+    ):
+        # The plotted data is already resampled at least as coarsely
+        resample_seconds = None
+    resampled_df = None
+    if (
+        resample_seconds is not None
+        and figure_cache.get("grid", grid_instruments) is None
+    ):
+        if (
+            pyramid is not None
+            and pyramid.level_for(resample_seconds) is not None
+        ):
+            resampled_df = recorder.run("plots: grid pyramid",
+                                        pyramid.aggregate, resample_seconds)
+        elif merged is not None:
+            # Resample each instrument at its native rate, then merge
+            resampled_df = recorder.run(
+                "plots: grid resample",
+                lambda: resample_merged(
+                    merged, resample_seconds, timeseries_cols,
+                    circular=circular_columns(all_instruments)).to_dense())
+    figures_quicklook.append(figure_cache.build(
+        recorder, "grid", grid_instruments, generate_grid_plot,
+        df, all_instruments, altitude_col=altitude_col,
+        resample_seconds=resample_seconds, resampled_df=resampled_df)
+    )
+
+    profiler.begin("plots_qualitycheck")
+
+    pressure_housekeeping, pressure_quicklook = pressure_variables(
+        all_instruments)
+
+    # Housekeeping pressure vars as qualitychecks
+    figures_qualitycheck.append(figure_cache.build(
+        recorder, "housekeeping pressure",
+        variable_instruments(pressure_housekeeping, all_instruments),
+        plot_scatter_from_variable_list_by_index,
+        df, "Housekeeping pressure variables", pressure_housekeeping
+    ))
+
+    # Same with just pressure vars
+    figures_qualitycheck.append(figure_cache.build(
+        recorder, "pressure",
+        variable_instruments(pressure_quicklook, all_instruments),
+        plot_scatter_from_variable_list_by_index,
+        df, "Pressure variables", pressure_quicklook
+    ))
+
+    for variables, instrument in qualitycheck_variables(all_instruments):
+        figures_qualitycheck.append(figure_cache.build(
+            recorder, f"qualitycheck {instrument}",
+            variable_instruments(variables, all_instruments),
+            plot_scatter_from_variable_list_by_index,
+            df, instrument, variables,
+        ))
+
+    profiler.begin("plots_size_distribution")
 
     # Generate MSEMS related plots (heatmaps and average bin concentration)
-    if instruments.msems_scan in all_instruments:
+    if instruments.msems_inverted in all_instruments:
         # Create a list of tuples of the form (title, time_start, time_end)
         # for each plot to be used to generate bins in msems altitude plot
         msems_bins = [
             (x, y['time_start'], y['time_end'])
             for x, y in plot_props['msems_readings_averaged'].items()
         ]
-        figures_quicklook.append(
-            generate_altitude_concentration_plot(
-                df, msems_bins,
-                at_ground_level=plot_props['altitude_ground_level'],
-                altitude_col=altitude_col
-            )
-        )
-
-        heatmaps = generate_particle_heatmap(
-            df,
+        figures_quicklook.append(figure_cache.build(
+            recorder, "altitude concentration", altitude_instruments,
+            generate_altitude_concentration_plot,
+            df, msems_bins,
+            at_ground_level=plot_props['altitude_ground_level'],
+            altitude_col=altitude_col
+        ))
+
+        heatmaps = figure_cache.build(
+            recorder, "heatmaps",
+            [instruments.msems_inverted.name, instruments.msems_scan.name],
+            generate_particle_heatmap,
+            instruments.msems_inverted.size_distribution,
+            instruments.msems_scan.size_distribution
+            if instruments.msems_scan in all_instruments else None,
             plot_props['heatmap']['msems_inverted'],
             plot_props['heatmap']['msems_scan'],)
 
@@ -850,8 +1316,11 @@ def campaign_2023(
                 continue
 
             # Generate the plot using the parameters from the config file
-            fig = generate_average_bin_concentration_plot(
-                df=df,
+            fig = figure_cache.build(
+                recorder, f"averaged {title}",
+                [instruments.msems_inverted.name],
+                generate_average_bin_concentration_plot,
+                size_distribution=instruments.msems_inverted.size_distribution,
                 title=title,
                 timestamp_start=props['time_start'],
                 timestamp_end=props['time_end'],
@@ -859,11 +1328,23 @@ def campaign_2023(
             )
             figures_quicklook.append(fig)
 
+    profiler.begin("plots_write")
+
     # Save quicklook and qualitycheck plots to HTML files
     quicklook_filename = os.path.join(output_path_with_time,
                                       constants.QUICKLOOK_PLOT_FILENAME)
     qualitycheck_filename = os.path.join(output_path_with_time,
                                          constants.QUALITYCHECK_PLOT_FILENAME)
 
-    write_plots_to_html(figures_quicklook, quicklook_filename)
-    write_plots_to_html(figures_qualitycheck, qualitycheck_filename)
+    for name, figures, filename in [
+        ("quicklook", figures_quicklook, quicklook_filename),
+        ("qualitycheck", figures_qualitycheck, qualitycheck_filename),
+    ]:
+        # Only rewrite the files with a rebuilt figure
+        if os.path.exists(filename) and all(
+            figure_cache.has_html(fig) for fig in figures if fig is not None
+        ):
+            continue
+        with recorder.stage(f"plots: write {name}"):
+            write_plots_to_html(figures, filename, figure_cache)
+    profiler.end()
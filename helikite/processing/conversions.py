@@ -49,3 +49,48 @@ def pressure_to_altitude(
     )
 
     return altitude
+
+
+def altitude_to_pressure(
+    altitude: float,
+    pressure_at_start: float,
+    temperature_at_start: float,
+    altitude_at_start: float = 0
+) -> float:
+    ''' Convert altitude to pressure, the inverse of pressure_to_altitude
+
+    Arguments
+    ---------
+    altitude: float
+        Altitude in meters to convert to pressure (scalar or numpy array)
+    pressure_at_start: float
+        Pressure at start of flight
+    temperature_at_start: float
+        Temperature at start of flight
+    altitude_at_start: float
+        Altitude at start of flight (default 0)
+
+    Returns
+    -------
+    pressure: float
+        Pressure in the units of pressure_at_start
+
+    Example
+    -------
+    >>> altitude_to_pressure(0, 101325, 20)
+    101325.0
+
+    '''
+
+    temperature_at_start += 273.15
+    pressure_at_sea_level = (
+        pressure_at_start
+        * ((1 - ((0.0065 * altitude_at_start)
+                 / (temperature_at_start + (0.0065 * altitude_at_start))
+                 )) ** -5.257)
+    )
+
+    pressure = pressure_at_sea_level / (
+        (altitude * 0.0065 / temperature_at_start) + 1) ** 5.257
+
+    return pressure
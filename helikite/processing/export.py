@@ -0,0 +1,374 @@
+''' Functions and classes to export dataframes to CSV files
+
+The exports are written in bounded chunks from a background thread so that
+the disk I/O (and any compression) overlaps with the parsing, merging and
+plotting that happens on the main thread.
+'''
+
+import gzip
+import logging
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from typing import IO, Iterable, List, Tuple
+from constants import constants
+from processing.instrumentation import StageRecorder
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for zstd compression
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+# File extension appended to the exported filename for each compression
+COMPRESSION_EXTENSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def open_csv_for_writing(
+    path: str,
+    compression: str | None = None
+) -> IO[str]:
+    ''' Open a text file handle for writing a CSV, optionally compressed
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to write
+    compression : str | None
+        One of None, 'gzip' or 'zstd'
+
+    Returns
+    -------
+    IO[str]
+        Writable text handle
+    '''
+
+    if compression is None:
+        return open(path, 'w', newline='')
+    elif compression == 'gzip':
+        return gzip.open(path, 'wt', newline='')
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ImportError(
+                "The 'zstandard' package is required to export with zstd "
+                "compression. Install it, or set the export compression to "
+                "'gzip' or null in the config file."
+            )
+        return zstandard.open(path, 'wt', newline='')
+    else:
+        raise ValueError(
+            f"Unknown export compression '{compression}'. Options are: "
+            f"{', '.join(str(x) for x in COMPRESSION_EXTENSIONS)}"
+        )
+
+
+# Divisor of the nanosecond times for each resolution pandas writes times in
+DATETIME_UNITS = [('D', 86400 * 10**9), ('s', 10**9), ('ms', 10**6),
+                  ('us', 10**3)]
+
+
+def datetime_csv_unit(
+    index: pd.Index,
+) -> str | None:
+    ''' Resolution that to_csv() writes the times of a DatetimeIndex in
+
+    pandas writes only the dates if all times are at midnight, otherwise the
+    times with as many decimals of the seconds as the most precise time
+    needs. None if the index is not a timezone naive DatetimeIndex.
+    '''
+
+    if not isinstance(index, pd.DatetimeIndex) or index.tz is not None:
+        return None
+
+    values = index.asi8[~index.isna()]
+    for unit, divisor in DATETIME_UNITS:
+        if not (values % divisor).any():
+            return unit
+
+    return 'ns'
+
+
+def format_datetime_index(
+    index: pd.DatetimeIndex,
+    unit: str,
+) -> pd.Index:
+    ''' Times of index as the strings to_csv() writes at the unit '''
+
+    strings = np.datetime_as_string(index.values, unit=unit)
+    strings = np.char.replace(strings, 'T', ' ')
+    strings[np.asarray(index.isna())] = ''
+
+    return pd.Index(strings, dtype=object, name=index.name)
+
+
+def _with_date_unit(
+    df: pd.DataFrame,
+    unit: str | None,
+) -> pd.DataFrame:
+    ''' df with its times formatted at unit, if pandas would not already
+
+    A part of a dataframe can need fewer decimals than the whole dataframe,
+    so its times are formatted explicitly to match a single write.
+    '''
+
+    if unit is None or datetime_csv_unit(df.index) == unit:
+        return df
+
+    df = df.copy(deep=False)
+    df.index = format_datetime_index(df.index, unit)
+
+    return df
+
+
+def write_csv_chunked(
+    df: pd.DataFrame,
+    path: str,
+    chunk_rows: int = constants.EXPORT_CHUNK_ROWS,
+    float_format: str | None = None,
+    compression: str | None = None,
+) -> None:
+    ''' Write a dataframe to CSV, chunk_rows rows at a time
+
+    The output is identical to a single call of df.to_csv(), but the text
+    buffer held in memory is bounded by the chunk size.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe to write
+    path : str
+        Path of the output file (extension is not altered)
+    chunk_rows : int
+        Number of rows to format and write at a time
+    float_format : str | None
+        Format string for floats, passed to pandas to_csv()
+    compression : str | None
+        One of None, 'gzip' or 'zstd'
+    '''
+
+    with open_csv_for_writing(path, compression) as out_file:
+        if len(df) == 0:
+            # Still write the header for an empty dataframe
+            df.to_csv(out_file, float_format=float_format)
+            return
+
+        date_unit = datetime_csv_unit(df.index)
+        for start in range(0, len(df), chunk_rows):
+            _with_date_unit(
+                df.iloc[start:start + chunk_rows], date_unit
+            ).to_csv(
+                out_file, header=(start == 0), float_format=float_format
+            )
+
+
+def write_csv_windowed(
+    frames: Iterable[pd.DataFrame],
+    path: str,
+    chunk_rows: int = constants.EXPORT_CHUNK_ROWS,
+    float_format: str | None = None,
+    compression: str | None = None,
+    date_unit: str | None = None,
+) -> int:
+    ''' Write consecutive dataframes to one CSV, as if they were concatenated
+
+    Each frame is written and released before the next is requested from
+    frames, so only one is held in memory at a time when frames is a
+    generator (see MergedFrame.iter_windows()).
+
+    Parameters
+    ----------
+    frames : Iterable[pd.DataFrame]
+        Dataframes with the same columns, in the order of their rows
+    path : str
+        Path of the output file (extension is not altered)
+    chunk_rows : int
+        Number of rows to format and write at a time
+    float_format : str | None
+        Format string for floats, passed to pandas to_csv()
+    compression : str | None
+        One of None, 'gzip' or 'zstd'
+    date_unit : str | None
+        Resolution to write the times of the index in, see
+        datetime_csv_unit() of the concatenated index. As chosen by pandas
+        for each chunk if None
+
+    Returns
+    -------
+    int
+        Total number of rows written
+    '''
+
+    rows = 0
+    header = True
+    with open_csv_for_writing(path, compression) as out_file:
+        for df in frames:
+            if len(df) == 0 and not header:
+                continue
+
+            # An empty first frame still writes the header
+            for start in range(0, max(len(df), 1), chunk_rows):
+                _with_date_unit(
+                    df.iloc[start:start + chunk_rows], date_unit
+                ).to_csv(
+                    out_file, header=header, float_format=float_format
+                )
+                header = False
+            rows += len(df)
+
+    return rows
+
+
+class CSVExporter:
+    ''' Writes dataframes to CSV files from a background writer thread
+
+    Dataframes are submitted to a bounded queue and written in the order they
+    were submitted. If the queue is full, submit() blocks until the writer
+    catches up, which bounds the memory held by pending exports.
+
+    Any exception raised while writing is re-raised by close(). The time
+    taken by each export is recorded in the recorder, if one is given.
+    '''
+
+    def __init__(
+        self,
+        chunk_rows: int = constants.EXPORT_CHUNK_ROWS,
+        float_format: str | None = None,
+        compression: str | None = None,
+        max_queued: int = constants.EXPORT_MAX_QUEUED,
+        recorder: StageRecorder | None = None,
+    ) -> None:
+
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(
+                f"Unknown export compression '{compression}'. Options are: "
+                f"{', '.join(str(x) for x in COMPRESSION_EXTENSIONS)}"
+            )
+
+        self.chunk_rows = chunk_rows
+        self.float_format = float_format
+        self.compression = compression
+        self.recorder = recorder if recorder is not None else StageRecorder()
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._errors: List[Tuple[str, Exception]] = []
+        self._thread = threading.Thread(
+            target=self._worker, name="csv-exporter", daemon=True)
+        self._thread.start()
+
+    def output_filename(self, path: str) -> str:
+        ''' Returns the path with the extension of the compression added '''
+
+        return f"{path}{COMPRESSION_EXTENSIONS[self.compression]}"
+
+    def submit(
+        self,
+        df: pd.DataFrame,
+        path: str
+    ) -> str:
+        ''' Queue a dataframe to be written to path
+
+        The dataframe must not be modified in place after being submitted.
+        Pass a shallow copy (df.copy(deep=False)) if the caller will go on to
+        rename columns or change the index.
+
+        Returns the filename that will be written (with compression suffix)
+        '''
+
+        filename = self.output_filename(path)
+        logger.debug(f"Queueing export of {len(df)} rows to {filename}")
+        self._queue.put((df, filename))
+
+        return filename
+
+    def write_windows(
+        self,
+        frames: Iterable[pd.DataFrame],
+        path: str,
+        date_unit: str | None = None,
+    ) -> str:
+        ''' Write consecutive dataframes to path on the calling thread
+
+        Unlike submit(), the frames are written immediately, one at a time,
+        so that a generator of windows is only consumed as fast as it is
+        written. See write_csv_windowed().
+
+        Returns the filename that was written (with compression suffix)
+        '''
+
+        filename = self.output_filename(path)
+        with self.recorder.stage(f"export: {os.path.basename(filename)}"):
+            rows = write_csv_windowed(
+                frames, filename,
+                chunk_rows=self.chunk_rows,
+                float_format=self.float_format,
+                compression=self.compression,
+                date_unit=date_unit,
+            )
+        logger.info(f"Exported {rows} rows to {filename}")
+
+        return filename
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            df, filename = item
+            # Release the dataframe once written, not when the next arrives
+            del item
+            try:
+                with self.recorder.stage(
+                    f"export: {os.path.basename(filename)}", df
+                ) as stage:
+                    write_csv_chunked(
+                        df, filename,
+                        chunk_rows=self.chunk_rows,
+                        float_format=self.float_format,
+                        compression=self.compression,
+                    )
+                    stage.output(df)
+                logger.info(f"Exported {len(df)} rows to {filename}")
+            except Exception as e:
+                logger.error(f"Failed to export {filename}: {e}")
+                self._errors.append((filename, e))
+            finally:
+                del df
+                self._queue.task_done()
+
+    def wait(self) -> None:
+        ''' Block until every dataframe submitted so far has been written
+
+        Lets the caller release a large dataframe before building the next
+        '''
+
+        self._queue.join()
+
+    def close(self) -> None:
+        ''' Wait for all queued exports to be written and stop the thread
+
+        Raises the first exception encountered by the writer, if any
+        '''
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+        if self._errors:
+            filename, error = self._errors[0]
+            raise error
+
+    def __enter__(self) -> 'CSVExporter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
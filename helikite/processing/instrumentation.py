@@ -0,0 +1,255 @@
+''' Timing and memory instrumentation of the processing stages
+
+Each stage records its wall time, CPU time of the thread that ran it, the
+rows/columns of the data going in and out, and the peak resident memory of
+the process while it ran. The records are written as JSON in the output
+folder and summarised in the log.
+
+The peak resident memory of the whole process (ru_maxrss) only ever grows,
+so every stage after the largest one would report the same peak. Instead,
+the resident memory is sampled by a thread while any stage is running, and
+each stage keeps the largest sample taken while it ran. Stages of different
+threads that overlap (such as the exports) share the memory of the process.
+'''
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple
+from constants import constants
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+def peak_rss_mb() -> float | None:
+    ''' Peak resident set size of the process so far, in MB '''
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float | None:
+    ''' Resident set size of the process now, in MB
+
+    Read from /proc, None where it is not available (other than Linux)
+    '''
+
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def data_shape(data: Any) -> Tuple[int | None, int | None]:
+    ''' Rows and columns of a dataframe (or anything with a similar shape) '''
+
+    rows = len(data) if hasattr(data, '__len__') else None
+    cols = len(data.columns) if hasattr(data, 'columns') else None
+
+    return rows, cols
+
+
+class StageRecord:
+    ''' Measurements of a single stage, filled in by StageRecorder.stage() '''
+
+    def __init__(
+        self,
+        name: str,
+        data_in: Any = None,
+    ) -> None:
+        self.name = name
+        self.rows_in, self.cols_in = data_shape(data_in)
+        self.rows_out: int | None = None
+        self.cols_out: int | None = None
+        self.wall_seconds: float | None = None
+        self.cpu_seconds: float | None = None
+        self.peak_rss_mb: float | None = None
+        self.thread = threading.current_thread().name
+
+    def output(self, data_out: Any) -> None:
+        ''' Record the shape of the data produced by the stage '''
+
+        self.rows_out, self.cols_out = data_shape(data_out)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows_in': self.rows_in,
+            'cols_in': self.cols_in,
+            'rows_out': self.rows_out,
+            'cols_out': self.cols_out,
+            'peak_rss_mb': self.peak_rss_mb,
+            'thread': self.thread,
+        }
+
+
+class RSSSampler:
+    ''' Samples the resident memory from a thread while stages are running
+
+    Each running record's peak_rss_mb is raised to every sample taken while
+    it runs, and to the memory at its start and end. A peak shorter than the
+    interval between samples can be missed. The thread stops when no stage
+    is running, and is started again by the next stage.
+    '''
+
+    def __init__(
+        self,
+        interval: float = constants.STAGE_RSS_SAMPLE_SECONDS,
+    ) -> None:
+        self.interval = interval
+        self._running: Set[StageRecord] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def begin(
+        self,
+        record: StageRecord,
+    ) -> None:
+        ''' Start following the memory of a stage '''
+
+        if current_rss_mb() is None:
+            return
+
+        with self._lock:
+            self._running.add(record)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name="rss-sampler", daemon=True)
+                self._thread.start()
+        self.sample()
+
+    def end(
+        self,
+        record: StageRecord,
+    ) -> None:
+        ''' Stop following the memory of a stage, after a last sample '''
+
+        self.sample()
+        with self._lock:
+            self._running.discard(record)
+
+    def sample(self) -> None:
+        ''' Raise the peak of the running stages to the current memory '''
+
+        rss = current_rss_mb()
+        if rss is None:
+            return
+
+        with self._lock:
+            for record in self._running:
+                if record.peak_rss_mb is None or rss > record.peak_rss_mb:
+                    record.peak_rss_mb = rss
+
+    def _worker(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._running:
+                    self._thread = None
+                    return
+            self.sample()
+
+
+class StageRecorder:
+    ''' Collects StageRecords of the pipeline stages, from any thread '''
+
+    def __init__(self) -> None:
+        self.records: List[StageRecord] = []
+        self._lock = threading.Lock()
+        self._sampler = RSSSampler()
+
+    @contextmanager
+    def stage(
+        self,
+        name: str,
+        data_in: Any = None,
+    ) -> Iterator[StageRecord]:
+        ''' Measure the code run inside the context
+
+        The yielded record can be given the output with record.output(df)
+        '''
+
+        record = StageRecord(name, data_in)
+        self._sampler.begin(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.thread_time() - cpu_start
+            self._sampler.end(record)
+            with self._lock:
+                self.records.append(record)
+            logger.debug(
+                f"Stage '{name}' took {record.wall_seconds:.3f} s "
+                f"(CPU {record.cpu_seconds:.3f} s)")
+
+    def run(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *args,
+        **kwargs
+    ) -> Any:
+        ''' Call func(*args, **kwargs) as a stage and return its result
+
+        The first positional argument is taken as the input data
+        '''
+
+        with self.stage(name, args[0] if args else None) as record:
+            result = func(*args, **kwargs)
+            record.output(result)
+
+        return result
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [record.to_dict() for record in self.records]
+
+    def write_json(
+        self,
+        filename: str
+    ) -> None:
+        ''' Write all of the records to a JSON file, with the peak memory
+        of the whole process so far '''
+
+        with open(filename, 'w') as out_file:
+            json.dump({'pid': os.getpid(), 'peak_rss_mb': peak_rss_mb(),
+                       'stages': self.to_list()},
+                      out_file, indent=2)
+
+    def log_summary(
+        self,
+        top: int = 10
+    ) -> None:
+        ''' Log the stages that took the most wall time '''
+
+        records = sorted(self.to_list(), key=lambda x: x['wall_seconds'],
+                         reverse=True)
+        total = sum(x['wall_seconds'] for x in records
+                    if x['thread'] == threading.main_thread().name)
+
+        logger.info(f"Timing summary ({len(records)} stages, "
+                    f"{total:.2f} s on the main thread). Slowest stages:")
+        for record in records[:top]:
+            logger.info(
+                f"{record['name']:50.50} {record['wall_seconds']:8.3f} s "
+                f"(CPU {record['cpu_seconds']:8.3f} s, "
+                f"peak RSS {record['peak_rss_mb'] or 0:8.1f} MB)")
@@ -0,0 +1,561 @@
+''' Merging of the instrument dataframes into a master dataframe
+
+Instruments record at very different rates (1 Hz for most, one row per scan
+for the mSEMS, 2 s for the SmartTether). An outer join of all of them on the
+time index creates a frame where most cells of the slow instruments are NaN.
+
+The MergedFrame holds each instrument's block at its native rate, and only
+builds the dense outer-joined frame for the columns that are requested, when
+they are needed for an export or a plot.
+
+With a memory budget, the dense frame is never built in full: it is built one
+time window at a time (see MergedFrame.iter_windows()), each window holding
+the same rows and dtypes as the matching slice of the full merge. The windows
+are cut by their number of merged rows rather than their length in time, so
+that a burst of fast rows cannot push a window over the budget.
+
+The outer join only matches rows with exactly the same time, so instruments
+whose clocks tick a fraction of a second apart (the STAP's fractional
+seconds against the whole seconds of the POPS) never share a row. Aligning
+the blocks onto a reference instrument (see MergedFrame.align_to()) snaps
+the rows of each instrument onto the nearest time of the reference within a
+tolerance, so the merge has about as many rows as the reference.
+'''
+
+import logging
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Tuple
+from constants import constants
+from processing.timeindex import time_range_positions
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+MERGE_MODES = ['dense', 'blocks', 'windowed']
+ALIGN_DIRECTIONS = ['backward', 'forward', 'nearest']
+
+
+def merge_outer_on_index(
+    frames: List[pd.DataFrame]
+) -> pd.DataFrame:
+    ''' Outer merge a list of dataframes on their index, sorted by time
+
+    The first dataframe is the master that all others are merged onto
+    '''
+
+    master_df = frames[0]
+    for df in frames[1:]:
+        master_df = master_df.merge(
+            df, how="outer", left_index=True, right_index=True)
+
+    # Sort rows by the date index. A stable sort keeps rows with the same
+    # time in merge order, so that merging in windows gives the same rows
+    master_df.index = pd.to_datetime(master_df.index)
+    master_df.sort_index(inplace=True, kind='stable')
+
+    return master_df
+
+
+def align_asof(
+    reference: pd.Index,
+    df: pd.DataFrame,
+    tolerance: float = constants.ALIGN_TOLERANCE_SECONDS,
+    direction: str = constants.ALIGN_DIRECTION,
+    name: str | None = None,
+) -> pd.DataFrame:
+    ''' Snap the rows of df onto the times of a reference index
+
+    Each row of df takes the reference time found in the given direction
+    (a reference time takes the last row at or before it, the first row at
+    or after it, or the nearest row) within the tolerance, in a single sweep
+    over the sorted times of both. A row is placed at one reference time at
+    most, so a slow instrument is not repeated on the times of a faster
+    reference. Where several rows take the same reference time, the closest
+    one is kept and the others are dropped.
+
+    Parameters
+    ----------
+    reference : pd.Index
+        Times to align onto, with duplicates or missing times kept as they
+        are
+    df : pd.DataFrame
+        Data with a time index
+    tolerance : float
+        Largest difference in seconds between a reference time and the time
+        of the row it takes
+    direction : str
+        One of ALIGN_DIRECTIONS
+    name : str | None
+        Name of the instrument of df, to log the number of dropped rows
+
+    Returns
+    -------
+    pd.DataFrame
+        The columns of df with the reference as index. Reference times
+        without a row are NaN, rows of df not placed at any reference time
+        are dropped
+    '''
+
+    if direction not in ALIGN_DIRECTIONS:
+        raise ValueError(f"Unknown alignment direction '{direction}'. "
+                         f"Options are: {', '.join(ALIGN_DIRECTIONS)}")
+
+    # The position of each reference time, to restore the reference order
+    # and its missing times after the sweep, and the time itself to find
+    # the closest of the rows that take it
+    position = '_reference_position'
+    reference_time = '_reference_time'
+    valid = np.asarray(reference.notna())
+    right = pd.DataFrame({
+        position: np.flatnonzero(valid),
+        reference_time: reference[valid],
+    }, index=reference[valid]).sort_index(kind='stable')
+
+    left = df[np.asarray(df.index.notna())].sort_index(kind='stable')
+
+    # Seen from the rows of df, a reference time that takes the last row
+    # before it is the first reference time after the row
+    row_direction = {'backward': 'forward', 'forward': 'backward',
+                     'nearest': 'nearest'}[direction]
+    matched = pd.merge_asof(
+        left, right, left_index=True, right_index=True,
+        tolerance=pd.Timedelta(seconds=tolerance), direction=row_direction,
+    )
+    matched = matched[matched[position].notna()]
+
+    # The closest row of each reference time, the first of equally close
+    distance = np.abs(matched[reference_time].to_numpy()
+                      - matched.index.to_numpy())
+    order = np.lexsort((distance, matched[position].to_numpy()))
+    matched = matched.iloc[order].drop_duplicates(position, keep='first')
+
+    if name is not None:
+        dropped = len(df) - len(matched)
+        if dropped:
+            logger.info(f"{name}: {dropped} of {len(df)} rows not aligned "
+                        "(out of the tolerance, without a time, or a closer "
+                        "row took their reference time)")
+
+    aligned = matched.set_index(
+        matched[position].astype('int64')).reindex(range(len(reference)))
+    aligned.index = reference
+
+    return aligned[list(df.columns)]
+
+
+class MergedFrame:
+    ''' Instrument dataframes kept at their native rate until densified
+
+    Blocks are merged in the order they are added. Column names are expected
+    to already be prefixed with the instrument name so that they are unique
+    across blocks.
+    '''
+
+    def __init__(self) -> None:
+        self.blocks: Dict[str, pd.DataFrame] = {}
+
+    def add(
+        self,
+        name: str,
+        df: pd.DataFrame
+    ) -> None:
+        ''' Add an instrument's dataframe as a block '''
+
+        self.blocks[name] = df
+
+    @property
+    def columns(self) -> List[str]:
+        ''' All columns of all blocks in merge order '''
+
+        return [col for df in self.blocks.values() for col in df.columns]
+
+    def align_to(
+        self,
+        reference: str,
+        tolerances: Dict[str, float] = {},
+        directions: Dict[str, str] = {},
+    ) -> 'MergedFrame':
+        ''' Snap every block onto the times of the reference block
+
+        Parameters
+        ----------
+        reference : str
+            Name of the block whose times are kept, such as the flight
+            computer
+        tolerances : Dict[str, float]
+            Tolerance in seconds of each block (see align_asof()), by name.
+            constants.ALIGN_TOLERANCE_SECONDS for the blocks not given
+        directions : Dict[str, str]
+            Direction of each block (see align_asof()), by name.
+            constants.ALIGN_DIRECTION for the blocks not given
+
+        Returns
+        -------
+        MergedFrame
+            The blocks in the same order, all on the index of the reference
+        '''
+
+        if reference not in self.blocks:
+            raise ValueError(f"Cannot align onto '{reference}', it has no "
+                             f"data. Options are: {', '.join(self.blocks)}")
+
+        index = self.blocks[reference].index
+
+        aligned = MergedFrame()
+        for name, df in self.blocks.items():
+            if name != reference:
+                df = align_asof(
+                    index, df,
+                    tolerances.get(name, constants.ALIGN_TOLERANCE_SECONDS),
+                    directions.get(name, constants.ALIGN_DIRECTION),
+                    name=name)
+            aligned.add(name, df)
+
+        return aligned
+
+    def memory_usage(self) -> int:
+        ''' Total bytes held by all blocks, including their indexes '''
+
+        return int(sum(df.memory_usage(deep=True).sum()
+                       for df in self.blocks.values()))
+
+    def to_dense(
+        self,
+        columns: List[str] | None = None,
+        instruments: List[str] | None = None,
+        union_index: bool = True,
+    ) -> pd.DataFrame:
+        ''' Build the dense outer-merged dataframe from the blocks
+
+        Only blocks that hold a requested column are merged with data. The
+        remaining blocks are merged without columns so that the rows (index)
+        are identical to merging every block in full.
+
+        Parameters
+        ----------
+        columns : List[str] | None
+            Columns to include in the output, in this order. All if None
+        instruments : List[str] | None
+            Only include the columns of these instruments. All if None
+        union_index : bool
+            If True, the index is the union of all blocks. If False, only the
+            blocks that provide columns contribute to the index
+
+        Returns
+        -------
+        pd.DataFrame
+            The outer merged dataframe, sorted by the time index
+        '''
+
+        frames = []
+        for df, block_cols in self._block_columns(
+            columns, instruments, union_index
+        ):
+            frames.append(df[block_cols])
+
+        if not frames:
+            raise ValueError("No instrument data to merge for the requested "
+                             f"columns: {columns}")
+
+        master_df = merge_outer_on_index(frames)
+
+        if columns is not None:
+            # Order columns as requested, missing columns are an error as they
+            # would be with a dense dataframe
+            master_df = master_df[columns]
+
+        return master_df
+
+    def _block_columns(
+        self,
+        columns: List[str] | None = None,
+        instruments: List[str] | None = None,
+        union_index: bool = True,
+    ) -> List[Tuple[pd.DataFrame, List[str]]]:
+        ''' The blocks to merge for to_dense(), with their columns to keep
+
+        Blocks without a requested column are kept with no columns if
+        union_index is True, so that they contribute their rows only
+        '''
+
+        block_columns = []
+        for name, df in self.blocks.items():
+            if instruments is not None and name not in instruments:
+                block_cols = []
+            elif columns is None:
+                block_cols = list(df.columns)
+            else:
+                block_cols = [col for col in df.columns if col in columns]
+
+            if block_cols or union_index:
+                block_columns.append((df, block_cols))
+
+        return block_columns
+
+    def dense_dtypes(
+        self,
+        columns: List[str] | None = None,
+    ) -> pd.Series:
+        ''' dtypes of the columns of to_dense(columns), without merging
+
+        A block that is missing rows of the union index has its columns
+        filled with NaN by the merge, which promotes integers to floats and
+        booleans to objects
+        '''
+
+        index = self.union_index()
+        dtypes = []
+        for df, block_cols in self._block_columns(columns):
+            df = df[block_cols]
+            if df.index.nunique(dropna=False) != len(index):
+                # Let pandas promote the dtypes by adding a missing row
+                df = df.iloc[:0].reindex(index[:1])
+            dtypes.append(df.dtypes)
+
+        dtypes = pd.concat(dtypes) if dtypes else pd.Series(dtype=object)
+        if columns is not None:
+            dtypes = dtypes[columns]
+
+        return dtypes
+
+    def union_index(self) -> pd.Index:
+        ''' Sorted unique union of the time indexes of all blocks '''
+
+        indexes = [df.index for df in self.blocks.values()]
+        if not indexes:
+            return pd.DatetimeIndex([])
+
+        index = indexes[0].unique()
+        for other in indexes[1:]:
+            index = index.union(other.unique())
+
+        return index
+
+    def row_bytes(
+        self,
+        columns: List[str] | None = None,
+    ) -> int:
+        ''' Largest number of bytes of one row of to_dense(columns)
+
+        Counts the time index and each column at its dense dtype. Object
+        columns (text, and the integers or booleans promoted by the missing
+        rows of the merge) count their pointer and their largest object,
+        or the NaN that fills their missing rows.
+        '''
+
+        dtypes = self.dense_dtypes(columns)
+        total = 8
+        for df, block_cols in self._block_columns(columns):
+            for col in block_cols:
+                dtype = dtypes[col]
+                if (
+                    pd.api.types.is_object_dtype(dtype)
+                    or isinstance(dtype, pd.StringDtype)
+                ):
+                    largest = (int(df[col].astype(object)
+                                   .map(sys.getsizeof).max())
+                               if len(df) else 0)
+                    total += 8 + max(largest, sys.getsizeof(np.nan))
+                elif len(df):
+                    total += int(df[col].iloc[:1].astype(dtype)
+                                 .memory_usage(index=False))
+                else:
+                    total += 8
+
+        return total
+
+    def dense_rows(self) -> int:
+        ''' Number of rows of to_dense(), without merging '''
+
+        return int(self._rows_per_time().sum()) + sum(
+            int(df.index.isna().sum()) for df in self.blocks.values())
+
+    def _rows_per_time(
+        self,
+        block_columns: List[Tuple[pd.DataFrame, List[str]]] | None = None,
+    ) -> pd.Series:
+        ''' Number of rows of the merge at each time, sorted by time
+
+        The outer merge repeats the rows of each block for every row of the
+        other blocks at the same time, so a time has the product of the
+        number of rows of each block at that time.
+        '''
+
+        if block_columns is None:
+            block_columns = self._block_columns()
+
+        rows = pd.Series(dtype='int64')
+        for df, _ in block_columns:
+            counts = df.index.dropna().value_counts()
+            rows = rows.mul(counts, fill_value=1) if len(rows) else counts
+
+        return rows.sort_index().astype('int64')
+
+    def window_rows(
+        self,
+        memory_budget: int,
+        columns: List[str] | None = None,
+        overhead: float = constants.MERGE_WINDOW_OVERHEAD,
+    ) -> int:
+        ''' Number of merged rows per window that keeps it in budget
+
+        Parameters
+        ----------
+        memory_budget : int
+            Bytes allowed for the dense frame of one window
+        columns : List[str] | None
+            Columns to densify. All if None
+        overhead : float
+            Ratio of the memory used while merging a window to the size of
+            the merged window, for the intermediate frames of the merge
+
+        Returns
+        -------
+        int
+            Rows of each window, at least one
+        '''
+
+        return max(int(memory_budget
+                       / (self.row_bytes(columns) * overhead)), 1)
+
+    def iter_windows(
+        self,
+        window_rows: int,
+        columns: List[str] | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        ''' Build the dense merge of the blocks one window at a time
+
+        Concatenating the windows gives the same rows, columns and dtypes as
+        to_dense(columns), but only one window is held in memory at a time.
+
+        Parameters
+        ----------
+        window_rows : int
+            Largest number of merged rows of each window (see
+            window_rows()). The rows of the same time are never split, so
+            only a time with more rows than this makes a larger window
+        columns : List[str] | None
+            Columns to include in the output, in this order. All if None
+
+        Yields
+        ------
+        pd.DataFrame
+            The outer merged rows of each window, sorted by the time index
+        '''
+
+        block_columns = self._block_columns(columns)
+        if not any(block_cols for _, block_cols in block_columns):
+            raise ValueError("No instrument data to merge for the requested "
+                             f"columns: {columns}")
+
+        rows = self._rows_per_time(block_columns)
+        if len(rows) == 0:
+            yield self.to_dense(columns)
+            return
+
+        dtypes = self.dense_dtypes(columns)
+
+        # Each window starts at the first time that takes its rows past a
+        # multiple of window_rows
+        cumulative = rows.to_numpy().cumsum()
+        starts = np.unique(np.searchsorted(
+            cumulative, np.arange(0, cumulative[-1], window_rows),
+            side='right'))
+        edges = list(rows.index[starts]) + [
+            rows.index[-1] + pd.Timedelta(1, 'ns')]
+
+        for start, end in zip(edges[:-1], edges[1:]):
+            master_df = self._merge_window([
+                self._window_slice(df, start, end)[block_cols]
+                for df, block_cols in block_columns
+            ], columns, dtypes)
+            if master_df is not None:
+                yield master_df
+
+        # Rows without a time are sorted last by the full merge
+        if any(df.index.hasnans for df, _ in block_columns):
+            master_df = self._merge_window([
+                df[np.asarray(df.index.isna())][block_cols]
+                for df, block_cols in block_columns
+            ], columns, dtypes)
+            if master_df is not None:
+                yield master_df
+
+    def time_slice(
+        self,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+        columns: List[str] | None = None,
+    ) -> pd.DataFrame:
+        ''' Dense merge of the columns for the rows with start <= time < end
+
+        Only the rows of the blocks with a value in a requested column are
+        merged, so that a slice of a few columns is not padded with the rows
+        of every instrument. The dtypes are not promoted to those of the full
+        merge.
+
+        Parameters
+        ----------
+        start : pd.Timestamp | None
+            First time to include. From the first row if None
+        end : pd.Timestamp | None
+            Time after the last row to include. To the last row if None
+        columns : List[str] | None
+            Columns to include in the output, in this order. All if None
+        '''
+
+        start = start if start is not None else pd.Timestamp.min
+        end = end if end is not None else pd.Timestamp.max
+
+        frames = []
+        for df, block_cols in self._block_columns(columns, union_index=False):
+            # Rows without any of the columns would only add empty rows
+            frames.append(self._window_slice(
+                df, start, end)[block_cols].dropna(how='all'))
+
+        if not frames:
+            raise ValueError("No instrument data to merge for the requested "
+                             f"columns: {columns}")
+
+        master_df = merge_outer_on_index(frames)
+        if columns is not None:
+            master_df = master_df[columns]
+
+        return master_df
+
+    @staticmethod
+    def _merge_window(
+        frames: List[pd.DataFrame],
+        columns: List[str] | None,
+        dtypes: pd.Series,
+    ) -> pd.DataFrame | None:
+        ''' Outer merge the slices of one window, None if it has no rows '''
+
+        if not any(len(df) for df in frames):
+            return None
+
+        master_df = merge_outer_on_index(frames)
+        if columns is not None:
+            master_df = master_df[columns]
+
+        return master_df.astype(dtypes)
+
+    @staticmethod
+    def _window_slice(
+        df: pd.DataFrame,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+    ) -> pd.DataFrame:
+        ''' Rows of df with start <= time < end '''
+
+        return df.iloc[time_range_positions(df.index, start, end)]
+
+    def dense_size_estimate(self) -> int:
+        ''' Approximate bytes of the fully densified dataframe
+
+        Assumes 8 bytes per cell, on the union index of all blocks
+        '''
+
+        return len(self.union_index()) * (len(self.columns) + 1) * 8
@@ -0,0 +1,301 @@
+''' Estimation of the time and pressure offsets of the instruments
+
+Every instrument with a pressure variable measures the same pressure as the
+flight computer's barometer during the flight, so the lag between their
+pressure traces is the offset of the instrument's clock. Both traces are
+averaged onto a common time grid and cross-correlated (by FFT) at every lag
+at once. The correlation at each lag is the Pearson correlation of the
+samples that overlap at that lag, so gaps in the data and the lags where the
+traces barely overlap do not bias the result.
+
+The time offset suggested for the config is the offset already applied plus
+the lag found, and the pressure offset is the mean difference between the
+two traces once aligned.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from scipy import signal
+from typing import Any, Dict, Tuple
+from constants import constants
+from processing.instrumentation import StageRecorder
+from processing.pipeline import process_instrument
+from processing.resample import grid_origin, resampler
+import instruments
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+def time_offset_seconds(
+    time_offset: Dict[str, int],
+) -> float:
+    ''' Seconds of a time offset of the config (hour, minute, second) '''
+
+    return (time_offset.get('hour', 0) * 3600
+            + time_offset.get('minute', 0) * 60
+            + time_offset.get('second', 0))
+
+
+def split_seconds(
+    seconds: float,
+) -> Dict[str, int]:
+    ''' A time offset of the config (hour, minute, second) of whole seconds
+
+    All three have the sign of seconds, so that they add up to it
+    '''
+
+    sign = -1 if seconds < 0 else 1
+    hours, remainder = divmod(int(round(abs(seconds))), 3600)
+    minutes, remainder = divmod(remainder, 60)
+
+    return {
+        'hour': sign * hours,
+        'minute': sign * minutes,
+        'second': sign * remainder,
+    }
+
+
+def masked_correlation(
+    reference: np.ndarray,
+    other: np.ndarray,
+    min_overlap: int = 2,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ''' Pearson correlation of two series with gaps at every lag
+
+    Parameters
+    ----------
+    reference : np.ndarray
+        Regularly sampled values, NaN where missing
+    other : np.ndarray
+        Values on the same sampling, NaN where missing
+    min_overlap : int
+        Fewest overlapping samples for the correlation at a lag to be given
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The lags in samples, the correlation at each lag (NaN where the
+        traces overlap less than min_overlap samples or do not vary) and the
+        mean difference reference - other of the overlapping samples. At a
+        lag k, the sample n of other is compared to the sample n + k of
+        reference
+    '''
+
+    ref_mask = np.isfinite(reference)
+    other_mask = np.isfinite(other)
+
+    # Centre the values, to reduce the cancellation in the sums below
+    ref = np.where(ref_mask, reference - np.nanmean(reference), 0.0)
+    oth = np.where(other_mask, other - np.nanmean(other), 0.0)
+    ref_mask = ref_mask.astype(float)
+    other_mask = other_mask.astype(float)
+
+    def correlate(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return signal.correlate(a, b, mode='full', method='fft')
+
+    # Sums over the overlapping samples at each lag
+    count = np.round(correlate(ref_mask, other_mask))
+    sum_ref = correlate(ref, other_mask)
+    sum_other = correlate(ref_mask, oth)
+    sum_ref2 = correlate(ref ** 2, other_mask)
+    sum_other2 = correlate(ref_mask, oth ** 2)
+    sum_product = correlate(ref, oth)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sum_product - sum_ref * sum_other / count
+        variance_ref = sum_ref2 - sum_ref ** 2 / count
+        variance_other = sum_other2 - sum_other ** 2 / count
+        correlation = covariance / np.sqrt(variance_ref * variance_other)
+        difference = (
+            (sum_ref - sum_other) / count
+            + np.nanmean(reference) - np.nanmean(other)
+        )
+
+    # Rounding errors leave tiny variances where the values are constant
+    scale = max(np.max(np.abs(ref)), np.max(np.abs(oth)), 1.0) ** 2
+    invalid = (
+        (count < min_overlap)
+        | (variance_ref <= scale * 1e-9)
+        | (variance_other <= scale * 1e-9)
+    )
+    correlation[invalid] = np.nan
+
+    lags = signal.correlation_lags(len(reference), len(other), mode='full')
+
+    return lags, correlation, difference
+
+
+def estimate_lag(
+    reference: pd.Series,
+    other: pd.Series,
+    seconds: float = constants.OFFSET_GRID_SECONDS,
+    max_lag_seconds: float | None = constants.OFFSET_MAX_LAG_SECONDS,
+    min_overlap: float = constants.OFFSET_MIN_OVERLAP,
+) -> Tuple[float, float, float]:
+    ''' Lag between two pressure traces by cross-correlation
+
+    Parameters
+    ----------
+    reference : pd.Series
+        Pressure of the reference (the flight computer) with a time index
+    other : pd.Series
+        Pressure of an instrument with a time index
+    seconds : float
+        Length of the bins of the common grid, the resolution of the lag
+    max_lag_seconds : float | None
+        Largest lag to consider, in either direction. Any lag if None
+    min_overlap : float
+        Fraction of the samples of other that must overlap the reference to
+        consider a lag
+
+    Returns
+    -------
+    Tuple[float, float, float]
+        The seconds to add to the times of other to align it to reference,
+        the pressure to add to other to match reference once aligned, and
+        the correlation of the traces at that lag. NaN if no lag has enough
+        overlap. The lag is interpolated between the bins of the grid
+    '''
+
+    origin = grid_origin(reference.index.append(other.index))
+    if origin is None:
+        return np.nan, np.nan, np.nan
+
+    # Both on the same grid, with the bins without values as NaN
+    grid = pd.concat([
+        resampler(series.astype('float64').to_frame(), seconds, origin
+                  ).mean().iloc[:, 0]
+        for series in (reference, other)
+    ], axis=1).asfreq(pd.Timedelta(seconds=seconds))
+
+    other_values = grid.iloc[:, 1].to_numpy()
+    lags, correlation, difference = masked_correlation(
+        grid.iloc[:, 0].to_numpy(), other_values,
+        min_overlap=max(2, int(np.ceil(
+            min_overlap * np.isfinite(other_values).sum()))))
+
+    if max_lag_seconds is not None:
+        correlation[np.abs(lags * seconds) > max_lag_seconds] = np.nan
+    if np.all(np.isnan(correlation)):
+        return np.nan, np.nan, np.nan
+
+    best = np.nanargmax(correlation)
+
+    # Vertex of the parabola through the peak and its neighbours
+    lag = float(lags[best])
+    if 0 < best < len(correlation) - 1:
+        before, peak, after = correlation[best - 1:best + 2]
+        curvature = before - 2 * peak + after
+        if np.isfinite(curvature) and curvature < 0:
+            lag += 0.5 * (before - after) / curvature
+
+    return lag * seconds, difference[best], correlation[best]
+
+
+def estimate_offsets(
+    config: Dict[str, Any],
+    recorder: StageRecorder | None = None,
+    seconds: float = constants.OFFSET_GRID_SECONDS,
+    max_lag_seconds: float | None = constants.OFFSET_MAX_LAG_SECONDS,
+) -> Dict[str, Dict[str, Any]]:
+    ''' Estimate the offsets of each instrument against the flight computer
+
+    The instruments are processed with the offsets of the config and without
+    trimming, and the pressure variable of each one is compared to the
+    flight computer's
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        The configuration, with the files of the instruments
+    recorder : StageRecorder | None
+        Records the time taken by each step
+    seconds : float
+        Length of the bins of the common grid, the resolution of the offsets
+    max_lag_seconds : float | None
+        Largest change of a time offset to consider. Any if None
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        By the key of each instrument in the config, its suggested
+        'time_offset' (as in the config) and 'pressure_offset', the 'lag'
+        in seconds from its current time offset and the 'correlation' of the
+        pressure traces once aligned
+    '''
+
+    reference_instrument = instruments.flight_computer
+    reference = None
+    pressures = {}
+    for key, props in config['instruments'].items():
+        instrument = getattr(instruments, props['config'])
+        if instrument.pressure_variable is None or props['file'] is None:
+            continue
+        instrument.add_config(props)
+
+        df = process_instrument(instrument, config['ground_station'],
+                                recorder=recorder)
+        if df is None:
+            continue
+
+        pressure = df[instrument.pressure_variable]
+        if instrument is reference_instrument:
+            reference = pressure
+        else:
+            pressures[key] = (pressure, props)
+
+    if reference is None:
+        raise ValueError("The offsets are estimated against the pressure of "
+                         "the flight computer, which has no data")
+
+    estimates = {}
+    for key, (pressure, props) in pressures.items():
+        lag, pressure_offset, correlation = estimate_lag(
+            reference, pressure, seconds, max_lag_seconds)
+        if np.isnan(lag):
+            logger.warning(f"{key}: Its pressure does not overlap the flight "
+                           "computer's, no offset estimated")
+            continue
+
+        estimates[key] = {
+            'time_offset': split_seconds(
+                time_offset_seconds(props['time_offset']) + lag),
+            'pressure_offset': round(float(pressure_offset), 2),
+            'lag': lag,
+            'correlation': float(correlation),
+        }
+
+    return estimates
+
+
+def apply_offsets(
+    config: Dict[str, Any],
+    estimates: Dict[str, Dict[str, Any]],
+    min_correlation: float = constants.OFFSET_MIN_CORRELATION,
+) -> Dict[str, Any]:
+    ''' Write the estimated offsets into the config
+
+    Estimates with a correlation below min_correlation are logged but not
+    written, as the traces probably do not match
+
+    Returns the config, updated in place
+    '''
+
+    for key, estimate in estimates.items():
+        message = (f"{key:20} lag {estimate['lag']:+8.0f} s, time offset "
+                   f"{estimate['time_offset']}, pressure offset "
+                   f"{estimate['pressure_offset']:+.2f} (correlation "
+                   f"{estimate['correlation']:.3f})")
+        if estimate['correlation'] < min_correlation:
+            logger.warning(f"{message}: not written, the correlation is "
+                           f"below {min_correlation}")
+            continue
+
+        logger.info(message)
+        config['instruments'][key]['time_offset'] = estimate['time_offset']
+        config['instruments'][key]['pressure_offset'] = (
+            estimate['pressure_offset'])
+
+    return config
@@ -0,0 +1,104 @@
+''' Processing steps applied to the data of each instrument
+
+Shared by the batch processing in helikite.py and the live processing of
+watch.py, so that both give the same instrument dataframes.
+'''
+
+import logging
+import pandas as pd
+from typing import Any, Dict
+from constants import constants
+from processing.instrumentation import StageRecorder
+from processing.timeindex import validate_time_index
+from instruments.base import Instrument
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+def process_instrument(
+    instrument: Instrument,
+    ground_station: Dict[str, Any],
+    time_trim_start: pd.Timestamp | None = None,
+    time_trim_end: pd.Timestamp | None = None,
+    recorder: StageRecorder | None = None,
+    df: pd.DataFrame | None = None,
+) -> pd.DataFrame | None:
+    ''' Read the instrument's file and apply its time and data corrections
+
+    The size distribution of the instrument, if it has one, is rebuilt from
+    the corrected data.
+
+    Parameters
+    ----------
+    instrument : Instrument
+        Instrument with its configuration (file, offsets) added
+    ground_station : Dict[str, Any]
+        Altitude, pressure and temperature at the start of the flight
+    time_trim_start : pd.Timestamp | None
+        Start of the time range to keep
+    time_trim_end : pd.Timestamp | None
+        End of the time range to keep
+    recorder : StageRecorder | None
+        Records the time taken by each step
+    df : pd.DataFrame | None
+        Data of the instrument already read with its time index set (see
+        processing.tail.TailReader). The file is read if None
+
+    Returns
+    -------
+    pd.DataFrame | None
+        The corrected dataframe, with the original column names. None if
+        there is no data in the time range
+    '''
+
+    if recorder is None:
+        recorder = StageRecorder()
+
+    name = instrument.name
+    if df is None:
+        df = recorder.run(f"{name}: read_data", instrument.read_data)
+
+        # Modify the DateTime index based off the configuration offsets
+        df = recorder.run(f"{name}: set_time_as_index",
+                          instrument.set_time_as_index, df)
+
+    # Sort the rows by time once, so that time ranges are binary searched
+    df = recorder.run(f"{name}: validate_time_index",
+                      validate_time_index, df, name,
+                      instrument.duplicate_policy)
+
+    # Using the time corrections from configuration, correct time
+    df = recorder.run(
+        f"{name}: correct_time_from_config",
+        instrument.correct_time_from_config,
+        df, time_trim_start, time_trim_end
+    )
+    if len(df) == 0:
+        logger.warning(f"Skipping {name}: No data in time range!")
+        return None
+
+    with recorder.stage(f"{name}: data_corrections", df) as stage:
+        # Apply any corrections on the data
+        df = instrument.data_corrections(
+            df,
+            start_altitude=ground_station['altitude'],
+            start_pressure=ground_station['pressure'],
+            start_temperature=ground_station['temperature'],
+        )
+
+        # Gather size resolved data into an array, if there is any
+        instrument.size_distribution = (
+            instrument.build_size_distribution(df)
+        )
+
+        # Add the moments and dN/dlogDp of the size distribution
+        df = instrument.add_size_distribution_products(df)
+
+        # Create housekeeping pressure variable to align pressure
+        df = instrument.set_housekeeping_pressure_offset_variable(
+            df, column_name=constants.HOUSEKEEPING_VAR_PRESSURE
+        )
+        stage.output(df)
+
+    return df
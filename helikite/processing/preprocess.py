@@ -175,6 +175,25 @@ def generate_config(
             'start': None,
             'end': None,
         },
+        'export': {
+            'compression': None,
+            'float_format': None,
+            'resample_seconds': None,
+        },
+        'merge_mode': 'dense',
+        'align_to': None,
+        'memory_budget_mb': constants.MEMORY_BUDGET_MB,
+        'pyramid_levels': constants.PYRAMID_LEVEL_SECONDS,
+        'flight_segments': {
+            'ground_metres': constants.FLIGHT_GROUND_METRES,
+            'min_vertical_speed': constants.FLIGHT_MIN_VERTICAL_SPEED,
+            'min_segment_seconds': constants.FLIGHT_MIN_SEGMENT_SECONDS,
+            'phases': None,
+        },
+        'vertical_profile': {
+            'bin_metres': constants.VERTICAL_PROFILE_BIN_METRES,
+            'statistics': constants.VERTICAL_PROFILE_STATISTICS,
+        },
     }
     yaml_config['ground_station'] = {
         'altitude': None,
@@ -186,6 +205,9 @@ def generate_config(
         'grid': {
             'resample_seconds': None
         },
+        'vertical_profile': {
+            'variables': None,
+        },
         'heatmap': {
             'msems_inverted': {
                 'zmin': None,
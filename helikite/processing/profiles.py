@@ -0,0 +1,330 @@
+''' Vertical profiles of the merged data, binned by altitude
+
+Every exported variable is summarised in bins of altitude, separately for
+the ascents and the descents of the flight. The altitude of the flight
+computer is interpolated in time onto the rows of each instrument, and the
+direction of each row is the phase of the flight segment it is in (see
+processing.segments): rows on the ground or hovering are in neither profile.
+
+The statistics of all the columns of an instrument are found in one pass:
+its rows are sorted once by their (direction, altitude bin) group, then each
+column is sorted within the groups by two stable argsorts of the whole
+array: by value, then by group, which keeps the order of the values within
+each group. The values are compared exactly, whatever their range. The
+counts, sums and quantiles of every group and column are then read from the
+sorted array at once, instead of looping over the bins and the columns.
+
+Angles (see Instrument.cols_circular) only have a mean, the direction of the
+mean vector of each bin, as in processing.resample.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+from constants import constants
+from processing.merge import MergedFrame
+from processing.resample import angle_from_components, circular_components
+from processing.segments import (
+    FLIGHT_PHASES, altitude_at, flight_segments, phase_at
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+PROFILE_DIRECTIONS = ['ascent', 'descent']
+PROFILE_STATISTICS = ['count', 'mean', 'std', 'min', 'max', 'median']
+
+
+def statistic_quantiles(
+    statistics: List[str],
+) -> Dict[str, float | None]:
+    ''' The quantile of each statistic, None for those that are not one
+
+    Parameters
+    ----------
+    statistics : List[str]
+        Any of PROFILE_STATISTICS, or percentiles as 'p' followed by a number
+        from 0 to 100 (eg. 'p10', 'p97.5')
+    '''
+
+    quantiles = {}
+    for statistic in statistics:
+        if statistic in ('count', 'mean', 'std'):
+            quantiles[statistic] = None
+        elif statistic in ('min', 'max', 'median'):
+            quantiles[statistic] = {'min': 0.0, 'max': 1.0,
+                                    'median': 0.5}[statistic]
+        else:
+            try:
+                percentile = float(statistic[1:])
+            except ValueError:
+                percentile = np.nan
+            if not statistic.startswith('p') or not 0 <= percentile <= 100:
+                raise ValueError(
+                    f"Unknown profile statistic '{statistic}'. Options are: "
+                    f"{', '.join(PROFILE_STATISTICS)} or a percentile "
+                    "from p0 to p100")
+            quantiles[statistic] = percentile / 100
+
+    return quantiles
+
+
+def profile_directions(
+    phases: np.ndarray,
+) -> np.ndarray:
+    ''' Position in PROFILE_DIRECTIONS of the direction of each phase
+
+    The phases are positions in processing.segments.FLIGHT_PHASES. -1 for
+    the phases that are neither an ascent nor a descent
+    '''
+
+    directions = np.full(len(phases), -1, dtype=np.int8)
+    for position, direction in enumerate(PROFILE_DIRECTIONS):
+        directions[phases == FLIGHT_PHASES.index(direction)] = position
+
+    return directions
+
+
+def reduce_groups(
+    keys: np.ndarray,
+    values: np.ndarray,
+    statistics: List[str],
+) -> Tuple[np.ndarray, np.ndarray]:
+    ''' Statistics of the columns of values over the rows of each key
+
+    Parameters
+    ----------
+    keys : np.ndarray
+        Integer group of each row
+    values : np.ndarray
+        Two dimensional array of float values, one column per variable, NaN
+        where missing
+    statistics : List[str]
+        Statistics to compute, see statistic_quantiles()
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The sorted unique keys, and an array of the statistics of shape
+        (keys, columns, statistics). The statistics of the groups without
+        any value of a column are NaN (and a count of 0)
+    '''
+
+    quantiles = statistic_quantiles(statistics)
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    values = values[order]
+
+    new_group = np.ones(len(keys), dtype=bool)
+    new_group[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_group)
+    group = np.cumsum(new_group) - 1
+    result = np.full((len(starts), values.shape[1], len(statistics)), np.nan)
+    if len(starts) == 0:
+        return keys[starts], result
+
+    finite = np.isfinite(values)
+    counts = np.add.reduceat(finite.astype(np.int64), starts, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.add.reduceat(
+            np.where(finite, values, 0.0), starts, axis=0) / counts
+
+    if 'std' in statistics:
+        deviations = np.where(finite, values - means[group], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stds = np.sqrt(np.add.reduceat(deviations ** 2, starts, axis=0)
+                           / (counts - 1))
+
+    if any(quantile is not None for quantile in quantiles.values()):
+        # Sort each column within the groups, with its missing values last:
+        # by value (NaN last), then stably by group. Sorted along the rows
+        # of the transpose, which are contiguous
+        by_value = np.argsort(
+            np.ascontiguousarray(np.where(finite, values, np.nan).T),
+            axis=1, kind='stable')
+        by_group = np.argsort(group[by_value], axis=1, kind='stable')
+        within = np.take_along_axis(by_value, by_group, axis=1)
+        ordered = np.take_along_axis(values.T, within, axis=1)
+        columns = np.arange(values.shape[1])
+
+    for position, statistic in enumerate(statistics):
+        if statistic == 'count':
+            result[:, :, position] = counts
+        elif statistic == 'mean':
+            result[:, :, position] = means
+        elif statistic == 'std':
+            result[:, :, position] = stds
+        else:
+            # Linear interpolation between the closest ranks, as pandas and
+            # numpy compute quantiles by default
+            rank = quantiles[statistic] * np.maximum(counts - 1, 0)
+            below = np.floor(rank).astype(np.int64)
+            above = np.ceil(rank).astype(np.int64)
+            value_below = ordered[columns, starts[:, None] + below]
+            value_above = ordered[columns, starts[:, None] + above]
+            result[:, :, position] = np.where(
+                counts > 0,
+                value_below + (rank - below) * (value_above - value_below),
+                np.nan)
+
+    return keys[starts], result
+
+
+def profile_block(
+    df: pd.DataFrame,
+    altitude: pd.Series,
+    bin_metres: float,
+    statistics: List[str],
+    segments: pd.DataFrame,
+    circular: Dict[str, str | None] = {},
+) -> pd.DataFrame:
+    ''' Profile of the numeric columns of an instrument, see vertical_profile()
+    '''
+
+    altitudes = altitude_at(altitude, df.index)
+    directions = profile_directions(phase_at(segments, df.index))
+    bins = np.floor(altitudes / bin_metres)
+
+    rows = (directions >= 0) & np.isfinite(bins)
+    columns = [col for col in df.select_dtypes('number').columns
+               if col not in circular]
+    angles = [col for col in circular if col in df.columns]
+
+    # Add the components of the angles, of which only the mean is kept
+    components = []
+    for col in angles:
+        weight = circular[col]
+        sin, cos = circular_components(
+            df.loc[rows, col],
+            df.loc[rows, weight] if weight in df.columns else None)
+        components += [sin.to_numpy(), cos.to_numpy()]
+
+    values = df.loc[rows, columns].to_numpy(dtype='float64', na_value=np.nan)
+    if components:
+        values = np.column_stack([values] + components)
+
+    # The group of each row, by direction then altitude bin
+    lowest = int(bins[rows].min()) if rows.any() else 0
+    width = int(bins[rows].max()) - lowest + 1 if rows.any() else 1
+    keys = (directions[rows].astype(np.int64) * width
+            + (bins[rows] - lowest).astype(np.int64))
+    keys, reduced = reduce_groups(keys, values, statistics)
+
+    profile = pd.DataFrame(
+        reduced[:, :len(columns)].reshape(
+            len(keys), len(columns) * len(statistics)),
+        columns=[f"{col}_{statistic}"
+                 for col in columns for statistic in statistics])
+
+    for position, col in enumerate(angles):
+        sin = reduced[:, len(columns) + 2 * position, :]
+        cos = reduced[:, len(columns) + 2 * position + 1, :]
+        for statistic_position, statistic in enumerate(statistics):
+            if statistic == 'mean':
+                profile[f"{col}_mean"] = angle_from_components(
+                    pd.Series(sin[:, statistic_position]),
+                    pd.Series(cos[:, statistic_position]))
+            elif statistic == 'count':
+                profile[f"{col}_count"] = sin[:, statistic_position]
+            else:
+                profile[f"{col}_{statistic}"] = np.nan
+
+    profile.index = pd.MultiIndex.from_arrays([
+        np.array(PROFILE_DIRECTIONS)[keys // width],
+        (keys % width + lowest + 0.5) * bin_metres,
+    ], names=['direction', 'altitude'])
+
+    return profile
+
+
+def vertical_profile(
+    merged: MergedFrame | pd.DataFrame,
+    altitude_col: str = constants.ALTITUDE_SEA_LEVEL_COL,
+    bin_metres: float = constants.VERTICAL_PROFILE_BIN_METRES,
+    statistics: List[str] = constants.VERTICAL_PROFILE_STATISTICS,
+    columns: List[str] | None = None,
+    circular: Dict[str, str | None] | None = None,
+    segments: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    ''' Statistics of every variable in altitude bins, ascents and descents
+
+    Each instrument is binned at its native rate, so that the merged data is
+    never densified
+
+    Parameters
+    ----------
+    merged : MergedFrame | pd.DataFrame
+        The instruments, or an already merged dataframe
+    altitude_col : str
+        Column of the altitude (of the flight computer) to bin by
+    bin_metres : float
+        Height of the altitude bins
+    statistics : List[str]
+        Statistics of each bin, see statistic_quantiles()
+    columns : List[str] | None
+        Columns to profile, all the numeric columns if None
+    circular : Dict[str, str | None] | None
+        Columns of angles with their weight columns, see
+        processing.resample.circular_columns()
+    segments : pd.DataFrame | None
+        Segments of the flight phases (see
+        processing.segments.flight_segments()), from the altitude with the
+        default thresholds if None
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by the direction and the centre of the altitude bin, with
+        the columns named as the variable and the statistic (eg.
+        'pops_PartCon_186_median'). Only the bins with rows are included
+    '''
+
+    statistic_quantiles(statistics)
+    if isinstance(merged, pd.DataFrame):
+        blocks = {'merged': merged}
+    else:
+        blocks = merged.blocks
+    circular = circular or {}
+
+    altitude = None
+    for df in blocks.values():
+        if altitude_col in df.columns:
+            altitude = df[altitude_col]
+    if altitude is None:
+        raise ValueError(f"No altitude column '{altitude_col}' to bin the "
+                         "vertical profile by")
+    if segments is None:
+        segments = flight_segments(altitude)
+
+    profiles = []
+    for df in blocks.values():
+        if columns is not None:
+            df = df[[col for col in df.columns if col in columns
+                     or col in circular.values()]]
+        if len(df.columns) == 0:
+            continue
+        profile = profile_block(
+            df, altitude, bin_metres, statistics, segments,
+            {col: weight for col, weight in circular.items()
+             if columns is None or col in columns})
+        if columns is not None:
+            # The weights of the angles are only profiled if requested
+            profile = profile[[
+                col for col in profile.columns
+                if col.rsplit('_', 1)[0] in columns]]
+        profiles.append(profile)
+
+    if not profiles:
+        return pd.DataFrame(
+            index=pd.MultiIndex.from_arrays(
+                [[], []], names=['direction', 'altitude']))
+
+    profile = pd.concat(profiles, axis=1).sort_index()
+
+    # The bins that only other instruments have rows in
+    counts = [col for col in profile.columns if col.endswith('_count')]
+    profile[counts] = profile[counts].fillna(0)
+
+    return profile
@@ -0,0 +1,148 @@
+''' Optional cProfile and tracemalloc profiling of the processing phases
+
+Enabled with the --profile switch. Each phase (one per instrument and one per
+group of plots) writes into the profile folder of the outputs:
+
+- <phase>.prof         cProfile stats, load with pstats or snakeviz
+- <phase>.tracemalloc  tracemalloc snapshot, load with Snapshot.load()
+- <phase>.txt          Top allocations made during the phase that are still
+                       held at its end, and the peak traced memory
+
+Phases are either profiled with the profile() context manager, or one after
+another with begin(), which ends the previous phase, and a final end(). When
+disabled, these return immediately and tracemalloc is not started, so the
+processing runs without any profiling overhead.
+'''
+
+import cProfile
+import logging
+import os
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+from constants import constants
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+class Profiler:
+    ''' Profiles named phases of the processing into output_path
+
+    Parameters
+    ----------
+    output_path : str | None
+        Folder to write the profiles to. Profiling is disabled if None
+    top : int
+        Number of allocation sites to list in each phase's text summary
+    '''
+
+    def __init__(
+        self,
+        output_path: str | None = None,
+        top: int = constants.PROFILE_TOP_ALLOCATIONS,
+    ) -> None:
+        self.output_path = output_path
+        self.top = top
+
+        self._phase: str | None = None
+        self._profile: cProfile.Profile | None = None
+        self._snapshot_start: tracemalloc.Snapshot | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.output_path is not None
+
+    def start(self) -> None:
+        ''' Create the output folder and start tracing allocations '''
+
+        if not self.enabled:
+            return
+
+        os.makedirs(self.output_path, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        logger.info(f"Profiling enabled, writing to {self.output_path}")
+
+    def stop(self) -> None:
+        ''' End any running phase and stop tracing allocations '''
+
+        self.end()
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def begin(
+        self,
+        name: str,
+    ) -> None:
+        ''' Start profiling the phase name, ending any running phase '''
+
+        if not self.enabled:
+            return
+
+        self.end()
+
+        tracemalloc.reset_peak()
+        self._phase = name
+        self._snapshot_start = tracemalloc.take_snapshot()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def end(self) -> None:
+        ''' Stop profiling the running phase and write out its profiles '''
+
+        if not self.enabled or self._phase is None:
+            return
+
+        self._profile.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_end = tracemalloc.take_snapshot()
+
+        base_filename = os.path.join(self.output_path, self._phase)
+        self._profile.dump_stats(f"{base_filename}.prof")
+        snapshot_end.dump(f"{base_filename}.tracemalloc")
+        self._write_top_allocations(
+            f"{base_filename}.txt", self._phase, self._snapshot_start,
+            snapshot_end, peak)
+
+        logger.info(f"Profiled '{self._phase}': peak traced memory "
+                    f"{peak / 1e6:.1f} MB")
+
+        self._phase = None
+        self._profile = None
+        self._snapshot_start = None
+
+    @contextmanager
+    def profile(
+        self,
+        name: str,
+    ) -> Iterator[None]:
+        ''' Profile the code run inside the context as the phase name '''
+
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def _write_top_allocations(
+        self,
+        filename: str,
+        name: str,
+        snapshot_start: tracemalloc.Snapshot,
+        snapshot_end: tracemalloc.Snapshot,
+        peak: int,
+    ) -> None:
+
+        # Ignore the memory used by tracemalloc itself
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = snapshot_end.filter_traces(filters).compare_to(
+            snapshot_start.filter_traces(filters), 'lineno')
+
+        with open(filename, 'w') as out_file:
+            out_file.write(f"Phase: {name}\n")
+            out_file.write(f"Peak traced memory: {peak / 1e6:.1f} MB\n")
+            out_file.write(f"Top {self.top} allocations held at the end of "
+                           "the phase:\n")
+            for stat in stats[:self.top]:
+                out_file.write(f"{stat}\n")
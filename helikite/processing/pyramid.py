@@ -0,0 +1,363 @@
+''' Multi-resolution time pyramid of the merged data
+
+Plots and analyses at a coarse time resolution (such as the grid plot with
+resample_seconds) would otherwise resample the full resolution merged data
+each time. The pyramid holds the data pre-aggregated into time bins of a few
+lengths (by default 10 s, 1 min and 10 min) with the mean, minimum,
+maximum and count of the values of each column in each bin. A level of 1 s
+bins would be about as long as the merged data, with four statistics per
+column, so it is only built if asked for.
+
+The pyramid is built in one pass over the instrument blocks of a
+MergedFrame, at their native rate, so the dense merge is never needed: the
+finest level is aggregated from the blocks, and each coarser level from the
+finest level whose bin length divides its own. The bins are aligned to the
+midnight of the first day of data, as pandas' resample() aligns them, so a
+level has the same bins as resampling the merged data at that length.
+
+Circular columns (angles such as the wind direction) are averaged as
+vectors: the pyramid also holds the mean of the two components of their
+vectors, named <column>_sin and <column>_cos, which coarsen exactly like any
+other mean, and the mean of the angle is the direction of the mean vector.
+
+The statistics are those of each instrument's own rows. Where an instrument
+has several rows at the same time, the outer merge repeats the rows of the
+other instruments at that time, which resampling the merged data counts
+more than once but the pyramid does not.
+'''
+
+import glob
+import logging
+import os
+import pandas as pd
+from typing import Dict, List, Tuple
+from constants import constants
+from processing.export import CSVExporter, write_csv_chunked
+from processing.merge import MergedFrame
+from processing.resample import (
+    angle_from_components, circular_components, grid_origin, resampler
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+STATISTICS = ['mean', 'min', 'max', 'count']
+CIRCULAR_COMPONENTS = ('sin', 'cos')
+
+
+def component_columns(
+    column: str,
+) -> Tuple[str, str]:
+    ''' Names of the columns of the vector components of a circular column '''
+
+    sin_name, cos_name = (f"{column}_{component}"
+                          for component in CIRCULAR_COMPONENTS)
+
+    return sin_name, cos_name
+
+
+def _circular_means(
+    means: pd.DataFrame,
+) -> pd.DataFrame:
+    ''' Replace the mean of each column that has its vector components in
+    means by the direction of the mean vector '''
+
+    for column in means.columns:
+        sin_name, cos_name = component_columns(column)
+        if sin_name in means.columns and cos_name in means.columns:
+            means[column] = angle_from_components(
+                means[sin_name], means[cos_name])
+
+    return means
+
+
+def _stack_statistics(
+    statistics: Dict[str, pd.DataFrame],
+) -> pd.DataFrame:
+    ''' One dataframe with (column, statistic) columns '''
+
+    columns = statistics['mean'].columns
+    df = pd.concat(statistics, axis=1).swaplevel(axis=1)
+
+    return df[pd.MultiIndex.from_product([columns, STATISTICS])]
+
+
+def aggregate_block(
+    df: pd.DataFrame,
+    seconds: int,
+    origin: pd.Timestamp,
+) -> pd.DataFrame:
+    ''' Aggregate the rows of an instrument block into time bins
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Numeric columns with a time index
+    seconds : int
+        Length of the bins
+    origin : pd.Timestamp
+        Start of a bin, the bins are aligned to it
+
+    Returns
+    -------
+    pd.DataFrame
+        The statistics of each column in each bin, with (column, statistic)
+        columns
+    '''
+
+    bins = resampler(df, seconds, origin)
+
+    return _stack_statistics({
+        'mean': _circular_means(bins.mean()),
+        'min': bins.min(),
+        'max': bins.max(),
+        'count': bins.count(),
+    })
+
+
+def coarsen_level(
+    level: pd.DataFrame,
+    seconds: int,
+    origin: pd.Timestamp,
+) -> pd.DataFrame:
+    ''' Aggregate a level into longer time bins
+
+    The bin length of the level must divide seconds, so that each of its
+    bins falls in a single bin of the coarser level
+    '''
+
+    count = level.xs('count', axis=1, level=1)
+    total = level.xs('mean', axis=1, level=1) * count
+
+    coarse_count = resampler(count, seconds, origin).sum()
+
+    return _stack_statistics({
+        'mean': _circular_means(
+            resampler(total, seconds, origin).sum(min_count=1)
+            / coarse_count),
+        'min': resampler(level.xs('min', axis=1, level=1),
+                         seconds, origin).min(),
+        'max': resampler(level.xs('max', axis=1, level=1),
+                         seconds, origin).max(),
+        'count': coarse_count,
+    })
+
+
+class Pyramid:
+    ''' Levels of pre-aggregated data at increasing time bin lengths
+
+    Parameters
+    ----------
+    levels : Dict[int, pd.DataFrame]
+        Each level by its bin length in seconds, with (column, statistic)
+        columns for each of the STATISTICS
+    '''
+
+    def __init__(
+        self,
+        levels: Dict[int, pd.DataFrame],
+    ) -> None:
+        self.levels = dict(sorted(levels.items()))
+
+    @classmethod
+    def build(
+        cls,
+        merged: MergedFrame,
+        level_seconds: List[int] = constants.PYRAMID_LEVEL_SECONDS,
+        columns: List[str] | None = None,
+        circular: Dict[str, str | None] | None = None,
+    ) -> 'Pyramid':
+        ''' Aggregate the numeric columns of the merged blocks into levels
+
+        Parameters
+        ----------
+        merged : MergedFrame
+            The instrument blocks at their native rate
+        level_seconds : List[int]
+            Bin lengths of the levels
+        columns : List[str] | None
+            Columns to aggregate, of which the non-numeric ones are skipped.
+            All if None
+        circular : Dict[str, str | None] | None
+            Columns of angles to average as vectors, with their weight columns
+            (see processing.resample.circular_columns()). Their components
+            are added to the levels
+
+        Returns
+        -------
+        Pyramid
+            The levels, each with the bins from the first to the last time of
+            all blocks, whether or not a bin has values
+        '''
+
+        index = merged.union_index().dropna()
+        origin = grid_origin(index)
+        if origin is None:
+            return cls({})
+
+        blocks = []
+        for df in merged.blocks.values():
+            keep = list(df.columns)
+            if columns is not None:
+                keep = [col for col in keep if col in columns]
+            # Weighted by the full block, the weights may not be in columns
+            components = {}
+            for column, weight in (circular or {}).items():
+                if column not in keep:
+                    continue
+                vectors = circular_components(
+                    df[column], df[weight] if weight is not None else None)
+                components.update(zip(component_columns(column), vectors))
+            df = pd.concat(
+                [df[keep], pd.DataFrame(components, index=df.index)], axis=1
+            ).select_dtypes('number')
+            if len(df.columns) > 0:
+                blocks.append(df.astype('float64'))
+        if not blocks:
+            return cls({})
+
+        levels: Dict[int, pd.DataFrame] = {}
+        for seconds in sorted(level_seconds):
+            # All bins from the first to the last time of the merged data
+            bins = resampler(
+                pd.Series(0, index=index[[0, -1]]), seconds, origin
+            ).sum().index
+
+            finer = [finer for finer in levels if seconds % finer == 0]
+            if finer:
+                level = coarsen_level(levels[max(finer)], seconds, origin)
+            else:
+                level = pd.concat([
+                    aggregate_block(df, seconds, origin) for df in blocks
+                ], axis=1)
+
+            level = level.reindex(bins)
+            counts = [col for col in level.columns if col[1] == 'count']
+            level[counts] = level[counts].fillna(0).astype('int64')
+            level.index.name = index.name
+            levels[seconds] = level
+
+        return cls(levels)
+
+    def level_for(
+        self,
+        seconds: float,
+    ) -> int | None:
+        ''' The coarsest level whose bin length divides seconds, if any '''
+
+        levels = [level for level in self.levels
+                  if seconds >= level and seconds % level == 0]
+
+        return max(levels) if levels else None
+
+    def aggregate(
+        self,
+        seconds: float,
+        statistic: str = 'mean',
+        columns: List[str] | None = None,
+    ) -> pd.DataFrame:
+        ''' One statistic of the columns in bins of the given length
+
+        Read from the level of that length, or aggregated from the coarsest
+        level whose bin length divides it, instead of the full data
+
+        Parameters
+        ----------
+        seconds : float
+            Length of the bins
+        statistic : str
+            One of the STATISTICS
+        columns : List[str] | None
+            Columns to return. All if None
+
+        Returns
+        -------
+        pd.DataFrame
+            The statistic of each column in each bin
+        '''
+
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic '{statistic}'. Options are: "
+                             f"{', '.join(STATISTICS)}")
+
+        level_seconds = self.level_for(seconds)
+        if level_seconds is None:
+            raise ValueError(
+                f"No pyramid level divides {seconds} seconds. Levels are: "
+                f"{', '.join(str(level) for level in self.levels)}")
+
+        level = self.levels[level_seconds]
+        if columns is not None:
+            # With the vector components of the circular columns
+            available = set(level.columns.get_level_values(0))
+            level_columns = list(columns) + [
+                name for column in columns
+                for name in component_columns(column) if name in available
+            ]
+            level = level[pd.MultiIndex.from_product(
+                [level_columns, STATISTICS])]
+        if seconds != level_seconds:
+            seconds = int(seconds)
+            level = coarsen_level(level, seconds, grid_origin(level.index))
+
+        df = level.xs(statistic, axis=1, level=1)
+
+        return df[columns] if columns is not None else df
+
+    @staticmethod
+    def filename(
+        seconds: int,
+    ) -> str:
+        ''' Name of the CSV file of a level '''
+
+        base, extension = os.path.splitext(constants.MASTER_CSV_FILENAME)
+
+        return f"{base}_{seconds}s{extension}"
+
+    def write(
+        self,
+        folder: str,
+        exporter: CSVExporter | None = None,
+    ) -> List[str]:
+        ''' Write each level to a CSV file in folder
+
+        The columns are named <column>_<statistic>. The levels are queued to
+        the exporter if one is given, otherwise written immediately
+
+        Returns the filenames written
+        '''
+
+        os.makedirs(folder, exist_ok=True)
+
+        filenames = []
+        for seconds, level in self.levels.items():
+            df = level.copy(deep=False)
+            df.columns = [f"{column}_{statistic}"
+                          for column, statistic in level.columns]
+            path = os.path.join(folder, self.filename(seconds))
+            if exporter is not None:
+                filenames.append(exporter.submit(df, path))
+            else:
+                write_csv_chunked(df, path)
+                filenames.append(path)
+
+        return filenames
+
+    @classmethod
+    def read(
+        cls,
+        folder: str,
+    ) -> 'Pyramid':
+        ''' Read the levels written by write() '''
+
+        base, extension = os.path.splitext(constants.MASTER_CSV_FILENAME)
+
+        levels = {}
+        for path in glob.glob(os.path.join(folder, f"{base}_*s{extension}*")):
+            seconds = os.path.basename(path)[len(base) + 1:].split('s')[0]
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+            df.columns = pd.MultiIndex.from_tuples(
+                [tuple(column.rsplit('_', 1)) for column in df.columns])
+            levels[int(seconds)] = df
+
+        return cls(levels)
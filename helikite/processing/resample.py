@@ -0,0 +1,225 @@
+''' Resampling of the instruments onto a common time grid
+
+Resampling the outer merged data averages each column over a union index
+where most rows are NaN rows of the other instruments, and the union index of
+instruments with sub-second timestamps (the POPS, the STAP) is much larger
+than the number of seconds in the flight. Instead, each instrument block is
+averaged into the bins of a common grid at its native rate, so that the
+merge only joins the few rows of the grid that each instrument has data in.
+
+The grid is aligned to the midnight of the first day of data, as pandas'
+resample() aligns its bins, so the bins are the same as those of resampling
+the merged data.
+
+Angles (wind direction, GPS course) cannot be averaged arithmetically, as
+the mean of 350 and 10 degrees would be 180. The columns that an instrument
+lists as circular are averaged as vectors instead: each angle is split into
+its components (weighted by a magnitude such as the wind speed), the
+components are averaged, and the direction of the mean vector is the mean
+angle.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+from constants import constants
+from instruments.base import Instrument
+from processing.merge import MergedFrame
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+def grid_origin(
+    index: pd.DatetimeIndex,
+) -> pd.Timestamp | None:
+    ''' Start of the grid of bins for the times of index
+
+    The midnight of the first day, which resample() aligns its bins to by
+    default. None if index has no times
+    '''
+
+    times = index.dropna()
+    if len(times) == 0:
+        return None
+
+    return times.min().floor('D')
+
+
+def resampler(
+    df: pd.DataFrame,
+    seconds: float,
+    origin: pd.Timestamp,
+):
+    ''' Resampler of the rows of df with a time into bins of the grid '''
+
+    return df[df.index.notna()].resample(
+        pd.Timedelta(seconds=seconds), origin=origin)
+
+
+def circular_columns(
+    all_instruments: List[Instrument],
+) -> Dict[str, str | None]:
+    ''' The circular columns of the instruments, with their weight columns,
+    prefixed with the instrument names '''
+
+    return {
+        column: weight
+        for instrument in all_instruments
+        for column, weight in instrument.circular_columns.items()
+    }
+
+
+def circular_components(
+    angle: pd.Series,
+    weight: pd.Series | None = None,
+) -> Tuple[pd.Series, pd.Series]:
+    ''' The two components of the vectors of the angles
+
+    Parameters
+    ----------
+    angle : pd.Series
+        Angles in degrees
+    weight : pd.Series | None
+        Length of each vector, unit vectors if None
+
+    Returns
+    -------
+    Tuple[pd.Series, pd.Series]
+        The sine and cosine components, NaN where the angle or its weight is
+        missing
+    '''
+
+    radians = np.deg2rad(angle.astype('float64'))
+    magnitude = weight.astype('float64') if weight is not None else 1.0
+
+    return magnitude * np.sin(radians), magnitude * np.cos(radians)
+
+
+def angle_from_components(
+    sin_component: pd.Series,
+    cos_component: pd.Series,
+) -> pd.Series:
+    ''' The angles in degrees [0, 360) of vectors given by their components
+
+    The angle of a null vector (such as calm wind) is undefined and NaN
+    '''
+
+    angle = np.rad2deg(np.arctan2(sin_component, cos_component)) % 360
+
+    return angle.mask((sin_component == 0) & (cos_component == 0))
+
+
+def resample_block(
+    df: pd.DataFrame,
+    seconds: float,
+    origin: pd.Timestamp,
+    circular: Dict[str, str | None] | None = None,
+) -> pd.DataFrame:
+    ''' Aggregate the rows of an instrument into bins of the grid
+
+    Numeric columns are averaged and the other columns (comments, times as
+    text) take their first value in each bin. Circular columns are averaged
+    as vectors weighted by their weight column. Bins without any row are
+    dropped.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Instrument data with a time index
+    seconds : float
+        Length of the bins
+    origin : pd.Timestamp
+        Start of a bin, the bins are aligned to it
+    circular : Dict[str, str | None] | None
+        Columns of angles in degrees, with the column that weighs each
+        angle (None for equal weights). Those not in df are ignored
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per bin with data, indexed by the start of the bin, with
+        the columns of df in their order
+    '''
+
+    numeric = df.select_dtypes('number').columns
+    others = [col for col in df.columns if col not in numeric]
+
+    frames = []
+    if len(numeric) > 0:
+        frames.append(resampler(df[numeric], seconds, origin).mean())
+    if others:
+        frames.append(resampler(df[others], seconds, origin).first())
+    rows = resampler(df, seconds, origin).size()
+
+    resampled = pd.concat(frames, axis=1)[list(df.columns)]
+    resampled.index.name = df.index.name
+
+    for column, weight in (circular or {}).items():
+        if column not in df.columns:
+            continue
+        sin_component, cos_component = circular_components(
+            df[column], df[weight] if weight is not None else None)
+        components = resampler(pd.DataFrame({
+            'sin': sin_component, 'cos': cos_component,
+        }), seconds, origin).mean()
+        resampled[column] = angle_from_components(
+            components['sin'], components['cos'])
+
+    return resampled[rows.to_numpy() > 0]
+
+
+def resample_merged(
+    merged: MergedFrame,
+    seconds: float,
+    columns: List[str] | None = None,
+    circular: Dict[str, str | None] | None = None,
+) -> MergedFrame:
+    ''' Resample each instrument block of merged onto a common grid
+
+    Parameters
+    ----------
+    merged : MergedFrame
+        The instrument blocks at their native rate
+    seconds : float
+        Length of the bins of the grid
+    columns : List[str] | None
+        Columns to resample. All if None. Blocks without any of the columns
+        are left out
+    circular : Dict[str, str | None] | None
+        Columns of angles to average as vectors, with their weight columns
+        (see circular_columns()). The weight columns do not need to be in
+        columns
+
+    Returns
+    -------
+    MergedFrame
+        The resampled blocks in the same order, which share the times of the
+        grid so that they can be merged without growing the index
+    '''
+
+    origin = grid_origin(merged.union_index())
+
+    resampled = MergedFrame()
+    if origin is None:
+        return resampled
+
+    for name, df in merged.blocks.items():
+        keep = list(df.columns)
+        if columns is not None:
+            keep = [col for col in keep if col in columns]
+        if len(keep) == 0:
+            continue
+
+        # Keep the weights of the angles to average, even if not requested
+        block_circular = {column: weight
+                          for column, weight in (circular or {}).items()
+                          if column in keep}
+        weights = [weight for weight in block_circular.values()
+                   if weight is not None and weight not in keep]
+
+        resampled.add(name, resample_block(
+            df[keep + weights], seconds, origin, block_circular)[keep])
+
+    return resampled
@@ -0,0 +1,186 @@
+''' Index of the time intervals of the scans of a scanning instrument
+
+The mSEMS reports one row per scan, at the start of the scan. Finding the
+scan that a measurement of another instrument falls in would otherwise mean
+searching the merged data for the rows of the scans. The ScanIndex holds the
+start and end of each scan as sorted int64 arrays, so that the scan covering
+any number of times, or the scans overlapping a time window, are found by
+binary search, and the rows of another instrument can be labelled with their
+scan or averaged over each scan at once.
+
+The scans are half-open intervals [start, end): a scan ends where the next
+one starts, so that every time between the first start and the last end is
+in exactly one scan.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from constants import constants
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+class ScanIndex:
+    ''' Sorted, non-overlapping time intervals of the scans of an instrument
+
+    Parameters
+    ----------
+    starts : pd.DatetimeIndex
+        Start of each scan, sorted
+    ends : pd.DatetimeIndex
+        End of each scan (not part of the scan), at most the start of the
+        next scan
+    name : str | None
+        Name of the instrument that scanned
+    '''
+
+    def __init__(
+        self,
+        starts: pd.DatetimeIndex,
+        ends: pd.DatetimeIndex,
+        name: str | None = None,
+    ) -> None:
+        self.starts = pd.DatetimeIndex(starts)
+        self.ends = pd.DatetimeIndex(ends)
+        self.name = name
+
+        if len(self.starts) != len(self.ends):
+            raise ValueError(f"{len(self.starts)} scan starts do not match "
+                             f"{len(self.ends)} scan ends")
+        if self.starts.hasnans or self.ends.hasnans:
+            raise ValueError("The scans must all have a start and an end")
+
+        self._starts = self.starts.asi8
+        self._ends = self.ends.asi8
+        if (
+            np.any(np.diff(self._starts) < 0)
+            or np.any(self._ends < self._starts)
+            or np.any(self._ends[:-1] > self._starts[1:])
+        ):
+            raise ValueError("The scans must be sorted and must not overlap")
+
+    @classmethod
+    def from_starts(
+        cls,
+        starts: pd.DatetimeIndex,
+        last_duration: pd.Timedelta | None = None,
+        name: str | None = None,
+    ) -> 'ScanIndex':
+        ''' Scans that each last until the start of the next one
+
+        Parameters
+        ----------
+        starts : pd.DatetimeIndex
+            Sorted start times, of which missing times are ignored
+        last_duration : pd.Timedelta | None
+            Duration of the last scan. The median time between the starts if
+            None
+        name : str | None
+            Name of the instrument that scanned
+        '''
+
+        starts = pd.DatetimeIndex(starts).dropna()
+        if len(starts) == 0:
+            return cls(starts, starts, name)
+
+        if last_duration is None:
+            last_duration = (pd.Timedelta(np.median(np.diff(starts.asi8)))
+                             if len(starts) > 1 else pd.Timedelta(0))
+
+        ends = starts[1:].append(
+            pd.DatetimeIndex([starts[-1] + last_duration]))
+
+        return cls(starts, ends, name)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def intervals(self) -> pd.IntervalIndex:
+        ''' The scans as a pandas IntervalIndex '''
+
+        return pd.IntervalIndex.from_arrays(
+            self.starts, self.ends, closed='left', name=self.name)
+
+    def scan_at(
+        self,
+        times: pd.DatetimeIndex,
+    ) -> np.ndarray:
+        ''' Number of the scan covering each time
+
+        Parameters
+        ----------
+        times : pd.DatetimeIndex
+            Any times, in any order
+
+        Returns
+        -------
+        np.ndarray
+            The position of the scan of each time in the index, -1 for the
+            times outside of every scan or missing
+        '''
+
+        times = pd.DatetimeIndex(times)
+        values = times.asi8
+        scans = np.searchsorted(self._starts, values, side='right') - 1
+
+        outside = (scans < 0) | np.asarray(times.isna())
+        outside[~outside] = values[~outside] >= self._ends[scans[~outside]]
+        scans[outside] = -1
+
+        return scans
+
+    def overlapping(
+        self,
+        start: pd.Timestamp | str,
+        end: pd.Timestamp | str,
+    ) -> slice:
+        ''' The scans with any time in the window [start, end] '''
+
+        first = np.searchsorted(self._ends, pd.Timestamp(start).value,
+                                side='right')
+        last = np.searchsorted(self._starts, pd.Timestamp(end).value,
+                               side='right')
+
+        return slice(int(first), int(max(first, last)))
+
+    def attach(
+        self,
+        df: pd.DataFrame,
+        column: str = 'scan',
+    ) -> pd.DataFrame:
+        ''' A copy of df with the number of the scan of each row
+
+        The rows outside of every scan have a missing scan number
+        '''
+
+        scans = self.scan_at(df.index)
+        labels = pd.array(scans, dtype='Int64')
+        labels[scans < 0] = pd.NA
+
+        return df.assign(**{column: labels})
+
+    def aggregate(
+        self,
+        df: pd.DataFrame,
+    ) -> pd.DataFrame:
+        ''' Mean of the numeric columns of df over the rows of each scan
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per scan, indexed by the start of the scan. The scans
+            without any row of df are NaN
+        '''
+
+        scans = self.scan_at(df.index)
+        inside = scans >= 0
+
+        means = df[inside].select_dtypes('number').groupby(
+            scans[inside]).mean()
+        means = means.reindex(range(len(self)))
+        means.index = self.starts
+
+        return means
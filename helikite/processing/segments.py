@@ -0,0 +1,322 @@
+''' Segmentation of the flight into phases by the flight computer altitude
+
+The altitude of the flight computer is smoothed by a centred rolling mean,
+and its vertical speed is the change of the smoothed altitude over a window
+centred on each time. Each time is then in one of the FLIGHT_PHASES: on the
+ground if it is within a few metres of the lowest altitude of the flight,
+otherwise ascending or descending if it climbs or sinks faster than a
+minimum speed, or else hovering. Runs of a phase shorter than a minimum
+duration (a gust during an ascent) are merged into the phase before them.
+
+The phases are kept as a table of segments, with the start, the end (the
+start of the next segment, not included) and the phase of each. The rows of
+any instrument in a segment are found by binary search on its sorted times,
+so that a phase is selected from the merged data by slicing rather than by
+filtering every row.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from typing import List
+from constants import constants
+from processing.merge import MergedFrame
+from processing.scans import ScanIndex
+from processing.timeindex import time_range_positions
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+FLIGHT_PHASES = ['ground', 'ascent', 'descent', 'hover']
+
+
+def check_phases(
+    phases: List[str],
+) -> None:
+    ''' Raise a ValueError if any phase is not one of FLIGHT_PHASES '''
+
+    for phase in phases:
+        if phase not in FLIGHT_PHASES:
+            raise ValueError(f"Unknown flight phase '{phase}'. Options are: "
+                             f"{', '.join(FLIGHT_PHASES)}")
+
+
+def altitude_at(
+    altitude: pd.Series,
+    index: pd.DatetimeIndex,
+) -> np.ndarray:
+    ''' The altitude at each time of index, interpolated linearly in time
+
+    NaN for the times before the first or after the last altitude, and for
+    the missing times
+    '''
+
+    valid = altitude.notna().to_numpy() & np.asarray(altitude.index.notna())
+    times = altitude.index.asi8[valid].astype('float64')
+    values = altitude.to_numpy(dtype='float64', na_value=np.nan)[valid]
+
+    if len(times) == 0:
+        return np.full(len(index), np.nan)
+
+    order = np.argsort(times, kind='stable')
+    at = np.interp(index.asi8.astype('float64'), times[order], values[order],
+                   left=np.nan, right=np.nan)
+    at[np.asarray(index.isna())] = np.nan
+
+    return at
+
+
+def smooth_altitude(
+    altitude: pd.Series,
+    window_seconds: float = constants.FLIGHT_SMOOTHING_SECONDS,
+) -> pd.Series:
+    ''' Rolling mean of the altitude over a window centred on each time
+
+    The rows without a time or an altitude are dropped
+    '''
+
+    altitude = altitude[
+        altitude.notna().to_numpy() & np.asarray(altitude.index.notna())
+    ].astype('float64').sort_index(kind='stable')
+
+    return altitude.rolling(pd.Timedelta(seconds=window_seconds),
+                            center=True, min_periods=1).mean()
+
+
+def vertical_speed(
+    altitude: pd.Series,
+    index: pd.DatetimeIndex,
+    window_seconds: float = constants.FLIGHT_SPEED_WINDOW_SECONDS,
+) -> np.ndarray:
+    ''' Vertical speed (m/s) at each time of index
+
+    The change of the interpolated altitude over the window centred on each
+    time. Near the start and the end of the flight the window is cut to the
+    times with an altitude
+    '''
+
+    valid = np.asarray(altitude.index.notna()) & altitude.notna().to_numpy()
+    if not valid.any():
+        return np.full(len(index), np.nan)
+
+    first = altitude.index[valid].min().value
+    last = altitude.index[valid].max().value
+    times = index.asi8
+    half_window = int(window_seconds * 1e9 / 2)
+
+    before = np.clip(times - half_window, first, last)
+    after = np.clip(times + half_window, first, last)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = (
+            (altitude_at(altitude, pd.DatetimeIndex(after))
+             - altitude_at(altitude, pd.DatetimeIndex(before)))
+            / ((after - before) / 1e9)
+        )
+    speed[np.asarray(index.isna()) | (after <= before)] = np.nan
+
+    return speed
+
+
+def phase_codes(
+    height: np.ndarray,
+    speed: np.ndarray,
+    ground_metres: float = constants.FLIGHT_GROUND_METRES,
+    min_speed: float = constants.FLIGHT_MIN_VERTICAL_SPEED,
+) -> np.ndarray:
+    ''' Position in FLIGHT_PHASES of the phase at each height and speed
+
+    Parameters
+    ----------
+    height : np.ndarray
+        Height (m) above the lowest altitude of the flight
+    speed : np.ndarray
+        Vertical speed (m/s)
+    ground_metres : float
+        Highest height on the ground
+    min_speed : float
+        Slowest vertical speed of an ascent or a descent
+    '''
+
+    codes = np.full(len(height), FLIGHT_PHASES.index('hover'), dtype=np.int8)
+    with np.errstate(invalid='ignore'):
+        codes[speed >= min_speed] = FLIGHT_PHASES.index('ascent')
+        codes[speed <= -min_speed] = FLIGHT_PHASES.index('descent')
+        codes[height < ground_metres] = FLIGHT_PHASES.index('ground')
+
+    return codes
+
+
+def merge_short_runs(
+    codes: np.ndarray,
+    times: np.ndarray,
+    min_seconds: float = constants.FLIGHT_MIN_SEGMENT_SECONDS,
+) -> np.ndarray:
+    ''' Relabel the runs of a code shorter than min_seconds
+
+    Each short run takes the code of the last long run before it (or of the
+    first long run, at the start)
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        Code of each time
+    times : np.ndarray
+        Sorted times as int64 nanoseconds
+    min_seconds : float
+        Shortest duration of a run, from its first time to the first time of
+        the next run
+    '''
+
+    if len(codes) == 0:
+        return codes
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[times[starts[1:]], times[-1]]
+    long = (ends - times[starts]) / 1e9 >= min_seconds
+    if long.all() or not long.any():
+        return codes
+
+    run_codes = pd.Series(np.where(long, codes[starts], np.nan))
+    run_codes = run_codes.ffill().bfill().to_numpy().astype(codes.dtype)
+
+    return np.repeat(run_codes, np.diff(np.r_[starts, len(codes)]))
+
+
+def flight_segments(
+    altitude: pd.Series,
+    smoothing_seconds: float = constants.FLIGHT_SMOOTHING_SECONDS,
+    window_seconds: float = constants.FLIGHT_SPEED_WINDOW_SECONDS,
+    min_speed: float = constants.FLIGHT_MIN_VERTICAL_SPEED,
+    ground_metres: float = constants.FLIGHT_GROUND_METRES,
+    min_segment_seconds: float = constants.FLIGHT_MIN_SEGMENT_SECONDS,
+) -> pd.DataFrame:
+    ''' Segments of the flight in each phase, from the altitude
+
+    Parameters
+    ----------
+    altitude : pd.Series
+        Altitude (m) of the flight computer with a time index
+    smoothing_seconds : float
+        Window of the rolling mean of the altitude
+    window_seconds : float
+        Window over which the vertical speed is measured
+    min_speed : float
+        Slowest vertical speed (m/s) of an ascent or a descent
+    ground_metres : float
+        Highest height above the lowest altitude of the flight on the ground
+    min_segment_seconds : float
+        Shortest segment, shorter ones are merged into the segment before
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per segment, in order, with its 'start', its 'end' (the
+        start of the next segment, or just after the last altitude) and its
+        'phase', one of FLIGHT_PHASES
+    '''
+
+    smoothed = smooth_altitude(altitude, smoothing_seconds)
+    if len(smoothed) == 0:
+        return pd.DataFrame({
+            'start': pd.DatetimeIndex([]), 'end': pd.DatetimeIndex([]),
+            'phase': pd.Series([], dtype=object)})
+
+    times = smoothed.index.asi8
+    codes = phase_codes(
+        smoothed.to_numpy() - smoothed.min(),
+        vertical_speed(smoothed, smoothed.index, window_seconds),
+        ground_metres, min_speed)
+    codes = merge_short_runs(codes, times, min_segment_seconds)
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    spacing = np.diff(times)
+    last_duration = pd.Timedelta(
+        int(times[-1] - times[starts[-1]])
+        + int(np.median(spacing[spacing > 0]) if (spacing > 0).any() else 1))
+    index = ScanIndex.from_starts(smoothed.index[starts], last_duration)
+
+    segments = pd.DataFrame({
+        'start': index.starts,
+        'end': index.ends,
+        'phase': np.array(FLIGHT_PHASES, dtype=object)[codes[starts]],
+    })
+    counts = segments['phase'].value_counts()
+    logger.info(f"Flight segmented into {len(segments)} segments: "
+                + ", ".join(f"{counts.get(phase, 0)} {phase}"
+                            for phase in FLIGHT_PHASES))
+
+    return segments
+
+
+def phase_at(
+    segments: pd.DataFrame,
+    index: pd.DatetimeIndex,
+) -> np.ndarray:
+    ''' Position in FLIGHT_PHASES of the phase of each time of index
+
+    -1 for the times outside of every segment
+    '''
+
+    scans = ScanIndex(segments['start'], segments['end']).scan_at(index)
+    codes = np.array(
+        [FLIGHT_PHASES.index(phase) for phase in segments['phase']] + [-1],
+        dtype=np.int8)
+
+    return codes[scans]
+
+
+def segment_positions(
+    index: pd.DatetimeIndex,
+    segments: pd.DataFrame,
+) -> np.ndarray:
+    ''' Positions of the rows of index in the segments
+
+    Each segment is a slice of the rows of a sorted index, found by binary
+    search (see processing.timeindex.time_range_positions())
+    '''
+
+    positions = []
+    for start, end in zip(segments['start'], segments['end']):
+        rows = time_range_positions(index, start, end)
+        positions.append(np.arange(rows.start, rows.stop)
+                         if isinstance(rows, slice) else rows)
+
+    return (np.concatenate(positions) if positions
+            else np.array([], dtype=np.int64))
+
+
+def select_phases(
+    data: MergedFrame | pd.DataFrame,
+    segments: pd.DataFrame,
+    phases: List[str],
+) -> MergedFrame | pd.DataFrame:
+    ''' The rows of data in the segments of the phases
+
+    Parameters
+    ----------
+    data : MergedFrame | pd.DataFrame
+        Instruments, or a dataframe, with a time index
+    segments : pd.DataFrame
+        Segments of flight_segments()
+    phases : List[str]
+        Phases to keep, of FLIGHT_PHASES
+
+    Returns
+    -------
+    MergedFrame | pd.DataFrame
+        The same type as data, with only the rows in the segments of the
+        phases (each block of a MergedFrame is sliced)
+    '''
+
+    check_phases(phases)
+    selected = segments[segments['phase'].isin(phases)]
+
+    if isinstance(data, pd.DataFrame):
+        return data.iloc[segment_positions(data.index, selected)]
+
+    merged = MergedFrame()
+    for name, df in data.blocks.items():
+        merged.add(name, df.iloc[segment_positions(df.index, selected)])
+
+    return merged
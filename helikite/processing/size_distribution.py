@@ -0,0 +1,194 @@
+''' Array-backed particle size distributions
+
+The size-resolved instruments (mSEMS, POPS) report one column per size bin.
+The SizeDistribution holds these as one contiguous (time, bin) array along
+with the bin limits, the bin centres and the time index, so that totals,
+windowed means and heatmaps are single array operations.
+'''
+
+import numpy as np
+import pandas as pd
+from typing import List
+from processing.timeindex import time_range_positions
+
+# Names of the moments of the size distribution, see SizeDistribution.moments
+MOMENT_COLUMNS = ["N_total", "S_total", "V_total"]
+
+
+class SizeDistribution:
+    ''' Particle concentrations for each size bin over time
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Concentrations of shape (time, bin). Missing values are NaN
+    time_index : pd.DatetimeIndex
+        Timestamps of each row in data (sorted)
+    bin_limits : np.ndarray | None
+        Limits of the bins in nm, of length n_bins + 1. None if unknown
+    bin_centres : np.ndarray | None
+        Centre diameter of each bin in nm. If None, the geometric mean of
+        each bin's limits is used (when the limits are known)
+    name : str | None
+        Name of the instrument that measured the distribution
+    '''
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        time_index: pd.DatetimeIndex,
+        bin_limits: np.ndarray | None = None,
+        bin_centres: np.ndarray | None = None,
+        name: str | None = None,
+    ) -> None:
+
+        self.data = np.ascontiguousarray(data, dtype=float)
+        self.time_index = pd.DatetimeIndex(time_index)
+        self.name = name
+
+        if self.data.ndim != 2 or self.data.shape[0] != len(self.time_index):
+            raise ValueError(
+                f"Size distribution data of shape {self.data.shape} does not "
+                f"match a time index of length {len(self.time_index)}")
+
+        self.bin_limits = None
+        if bin_limits is not None:
+            self.bin_limits = np.asarray(bin_limits, dtype=float)
+            if len(self.bin_limits) != self.bins + 1:
+                raise ValueError(
+                    f"Expected {self.bins + 1} bin limits for {self.bins} "
+                    f"bins, got {len(self.bin_limits)}")
+
+        if bin_centres is not None:
+            self.bin_centres = np.asarray(bin_centres, dtype=float)
+        elif self.bin_limits is not None:
+            self.bin_centres = np.sqrt(
+                self.bin_limits[:-1] * self.bin_limits[1:])
+        else:
+            self.bin_centres = None
+
+    @classmethod
+    def from_columns(
+        cls,
+        df: pd.DataFrame,
+        columns: List[str],
+        bin_limits: np.ndarray | None = None,
+        bin_centres: np.ndarray | None = None,
+        name: str | None = None,
+    ) -> 'SizeDistribution':
+        ''' Gather the bin columns of a dataframe into a SizeDistribution '''
+
+        data = df[columns].to_numpy(dtype=float, na_value=np.nan)
+
+        return cls(data, df.index, bin_limits, bin_centres, name)
+
+    @property
+    def bins(self) -> int:
+        ''' Number of size bins '''
+
+        return self.data.shape[1]
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def total(
+        self,
+        first_bin: int = 0,
+        last_bin: int | None = None,
+    ) -> pd.Series:
+        ''' Sum of the concentrations of bins [first_bin, last_bin) per row
+
+        A row with a missing value in any of the summed bins is NaN
+        '''
+
+        return pd.Series(
+            self.data[:, first_bin:last_bin].sum(axis=1),
+            index=self.time_index, name=self.name)
+
+    def window(
+        self,
+        start: pd.Timestamp | str | None = None,
+        end: pd.Timestamp | str | None = None,
+    ) -> 'SizeDistribution':
+        ''' Rows with start <= time <= end, as a view on the same array
+
+        The time index is sorted when the instrument's time index is
+        validated, so the window is found by binary search
+        '''
+
+        rows = time_range_positions(self.time_index, start, end, 'both')
+
+        return SizeDistribution(
+            self.data[rows], self.time_index[rows],
+            self.bin_limits, self.bin_centres, self.name)
+
+    def mean(
+        self,
+        start: pd.Timestamp | str | None = None,
+        end: pd.Timestamp | str | None = None,
+    ) -> np.ndarray:
+        ''' Mean concentration of each bin over a time window, ignoring NaN '''
+
+        window = self.window(start, end).data
+        if len(window) == 0:
+            return np.full(self.bins, np.nan)
+
+        counts = np.sum(~np.isnan(window), axis=0)
+        sums = np.nansum(window, axis=0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    @property
+    def dlogdp(self) -> np.ndarray:
+        ''' Width of each bin in log10 of the diameter '''
+
+        if self.bin_limits is None:
+            raise ValueError(f"No bin limits known for {self.name}")
+
+        return np.diff(np.log10(self.bin_limits))
+
+    def dndlogdp(self) -> np.ndarray:
+        ''' Concentrations normalised by the bin widths (dN/dlogDp) '''
+
+        return self.data / self.dlogdp
+
+    def moments(self) -> pd.DataFrame:
+        ''' Total number, surface and volume concentration of each row
+
+        Calculated in one matrix product of the (time, bin) concentrations
+        with the per-bin weights of each moment, using the bin centres:
+
+        - N_total: sum(dN)                      [cm-3]
+        - S_total: sum(pi * Dp^2 * dN)          [um2 cm-3]
+        - V_total: sum(pi / 6 * Dp^3 * dN)      [um3 cm-3]
+
+        A row with a missing value in any bin is NaN
+        '''
+
+        if self.bin_centres is None:
+            raise ValueError(f"No bin diameters known for {self.name}")
+
+        diameter_um = self.bin_centres / 1000
+        weights = np.stack((
+            np.ones(self.bins),
+            np.pi * diameter_um ** 2,
+            np.pi / 6 * diameter_um ** 3,
+        ), axis=1)
+
+        return pd.DataFrame(
+            self.data @ weights, index=self.time_index, columns=MOMENT_COLUMNS)
+
+    def to_dataframe(
+        self,
+        column_prefix: str = "bin",
+        dndlogdp: bool = False,
+    ) -> pd.DataFrame:
+        ''' Expand the distribution into one column per bin
+
+        The concentrations are normalised by the bin widths if dndlogdp
+        '''
+
+        return pd.DataFrame(
+            self.dndlogdp() if dndlogdp else self.data, index=self.time_index,
+            columns=[f"{column_prefix}{i}" for i in range(1, self.bins + 1)])
@@ -0,0 +1,129 @@
+''' Incremental reading of instrument files that are still being written
+
+A TailReader remembers how far it has read into an instrument's file and the
+state of the parser (column names and dtypes of the header, the state of the
+instrument's time index such as the SmartTether's midnight rollovers, the
+flight computer's repeated headers). Each call of read_new() parses only the
+complete lines appended to the file since the previous call, so that a file
+of hundreds of MB is not parsed again from the start at each refresh.
+'''
+
+import copy
+import logging
+import os
+import pandas as pd
+from typing import Any, Dict
+from constants import constants
+from instruments.base import Instrument
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+class TailReader:
+    ''' Reads the lines appended to an instrument's file since the last read
+
+    Parameters
+    ----------
+    instrument : Instrument
+        Instrument with its configuration (file) added
+
+    Attributes
+    ----------
+    df : pd.DataFrame | None
+        All rows read so far with their time index, as given by
+        instrument.set_time_as_index(instrument.read_data()) for the lines
+        read. Copy it before modifying it
+    '''
+
+    def __init__(
+        self,
+        instrument: Instrument,
+    ) -> None:
+        self.instrument = instrument
+        self.reset()
+
+    def reset(self) -> None:
+        ''' Forget what has been read, to read the file from the start '''
+
+        self.filename = self.instrument.filename
+        self.offset = 0
+        self.rows = 0
+        self.read_state: Dict[str, Any] = {}
+        self.time_state: Dict[str, Any] = {}
+        self.df: pd.DataFrame | None = None
+
+    def _read_lines(self) -> bytes:
+        ''' The complete lines of the file after the offset '''
+
+        with open(self.filename, 'rb') as in_file:
+            in_file.seek(self.offset)
+            data = in_file.read()
+
+        # Leave a partly written last line for the next read
+        return data[:data.rfind(b'\n') + 1]
+
+    def read_new(self) -> pd.DataFrame | None:
+        ''' Read the rows appended to the file since the last call
+
+        The file is read again from the start if the instrument was given
+        another file, or if the file is now shorter than what was read (it
+        was replaced)
+
+        Returns
+        -------
+        pd.DataFrame | None
+            The new rows with their time index. None if there are no new
+            complete rows yet
+        '''
+
+        if (
+            self.filename != self.instrument.filename
+            or os.path.getsize(self.instrument.filename) < self.offset
+        ):
+            if self.offset > 0:
+                logger.info(f"{self.instrument.filename} was replaced, "
+                            "reading it from the start")
+            self.reset()
+
+        data = self._read_lines()
+        if not data:
+            return None
+
+        # Keep the state as it was, in case these lines cannot be read yet
+        read_state = copy.deepcopy(self.read_state)
+        first_chunk = self.offset == 0
+        try:
+            # Newlines as read_data() reads them in text mode
+            df = self.instrument.read_chunk(
+                data.decode().replace('\r\n', '\n'), read_state)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+            if not first_chunk:
+                raise
+            # The header may not be complete yet
+            logger.debug(f"{self.filename}: header not readable yet: {e}")
+            return None
+
+        if first_chunk and len(df) == 0:
+            # Only the header so far, read it again with the first rows
+            return None
+
+        self.read_state = read_state
+        self.offset += len(data)
+
+        # Number the rows as if the whole file was read at once
+        if isinstance(df.index, pd.RangeIndex):
+            df.index = df.index + self.rows
+        self.rows += len(df)
+
+        if len(df) == 0:
+            # Only comments or repeated headers
+            return None
+
+        df = self.instrument.set_time_as_index_chunk(df, self.time_state)
+        if self.df is None:
+            self.df = df
+        else:
+            self.df = pd.concat([self.df, df])
+
+        return df
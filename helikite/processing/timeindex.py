@@ -0,0 +1,229 @@
+''' Validation and slicing of the time index of the instruments
+
+The time index of each instrument is checked once, right after it is set:
+the rows without a time are reported and dropped, rows out of order are
+reported and sorted by time, and the duplicate times are reported. The time
+ranges of the rest of the pipeline (trimming, time windows of the merge and
+of the plots, flight segments) are then found by binary search on the
+sorted times, and selected as a slice of the rows instead of a boolean mask
+over all of them. As the index has no missing times, pandas keeps whether
+it is sorted, so that each search costs O(log n) and not a pass over the
+index.
+
+Instruments that round their times to the second (the POPS, the Pico) can
+have several rows at the same time, which the outer merge repeats against
+the rows of every other instrument at that time. Each instrument has a
+policy for its duplicate times: keep them all, keep the first or the last
+row, average them into one row, or stop with an error.
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from constants import constants
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+INCLUSIVE = ['both', 'neither', 'left', 'right']
+DUPLICATE_POLICIES = ['keep', 'first', 'last', 'mean', 'error']
+
+
+def check_duplicate_policy(
+    policy: str,
+    name: str | None = None,
+) -> None:
+    ''' Raise a ValueError if the policy is not one of DUPLICATE_POLICIES '''
+
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"{name}: Unknown duplicate policy '{policy}'. "
+                         f"Options are: {', '.join(DUPLICATE_POLICIES)}")
+
+
+def resolve_duplicates(
+    df: pd.DataFrame,
+    policy: str = 'keep',
+    name: str | None = None,
+) -> pd.DataFrame:
+    ''' Reduce the rows with the same time to one, by the policy
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data with a sorted time index, the rows without a time last
+    policy : str
+        One of DUPLICATE_POLICIES: 'keep' all rows, the 'first' or 'last'
+        row of each time, the 'mean' of the numeric columns (and the first
+        value of the others), or raise an 'error'
+    name : str | None
+        Name of the instrument, for the log
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows with unique times, then the rows without a time as they are
+    '''
+
+    check_duplicate_policy(policy, name)
+
+    valid = len(df) - (int(df.index.isna().sum()) if df.index.hasnans else 0)
+    duplicated = np.asarray(df.index[:valid].duplicated(
+        keep='last' if policy == 'last' else 'first'))
+    count = int(np.count_nonzero(duplicated))
+    if count == 0 or policy == 'keep':
+        return df
+
+    if policy == 'error':
+        times = df.index[:valid][duplicated].unique()
+        raise ValueError(
+            f"{name}: {count} duplicate timestamps, first at {times[0]}. "
+            "Set a duplicate_policy other than 'error' in the config to "
+            f"resolve them. Options are: {', '.join(DUPLICATE_POLICIES)}")
+
+    logger.info(f"{name}: Keeping the {policy} of the rows of {count} "
+                "duplicate timestamps")
+
+    if policy in ('first', 'last'):
+        keep = np.ones(len(df), dtype=bool)
+        keep[:valid] = ~duplicated
+        return df[keep]
+
+    # The times are sorted, so the groups are runs of rows in order
+    rows = df.iloc[:valid]
+    numeric = rows.select_dtypes('number').columns
+    others = [col for col in rows.columns if col not in numeric]
+    groups = rows.groupby(level=0, sort=False)
+    frames = []
+    if len(numeric) > 0:
+        frames.append(groups[list(numeric)].mean())
+    if others:
+        frames.append(groups[others].first())
+    reduced = pd.concat(frames, axis=1)[list(df.columns)]
+    reduced.index.name = df.index.name
+
+    return pd.concat([reduced, df.iloc[valid:]])
+
+
+def validate_time_index(
+    df: pd.DataFrame,
+    name: str | None = None,
+    duplicate_policy: str = 'keep',
+) -> pd.DataFrame:
+    ''' Report the problems of the time index of df and sort it if needed
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Instrument data with a time index
+    name : str | None
+        Name of the instrument, for the log
+    duplicate_policy : str
+        How to resolve the duplicate times, see resolve_duplicates()
+
+    Returns
+    -------
+    pd.DataFrame
+        df itself if its times are all given, in order and unique or kept,
+        otherwise its rows with a time, sorted by time, keeping the order of
+        equal times, and with the duplicates resolved
+    '''
+
+    check_duplicate_policy(duplicate_policy, name)
+
+    missing = np.asarray(df.index.isna())
+    if missing.any():
+        logger.warning(f"{name}: Dropping {int(missing.sum())} rows without "
+                       "a time")
+        df = df[~missing]
+
+    times = df.index.asi8
+    out_of_order = int(np.count_nonzero(np.diff(times) < 0))
+    duplicates = len(times) - len(np.unique(times))
+
+    if duplicates:
+        logger.warning(f"{name}: {duplicates} duplicate timestamps")
+
+    if out_of_order:
+        logger.warning(f"{name}: {out_of_order} timestamps out of order, "
+                       "sorting the rows by time")
+        df = df.sort_index(kind='stable', na_position='last')
+
+    if duplicates:
+        df = resolve_duplicates(df, duplicate_policy, name)
+
+    return df
+
+
+def is_sorted(
+    index: pd.DatetimeIndex,
+) -> bool:
+    ''' If the times are in order, with the missing times last '''
+
+    if not index.hasnans:
+        return index.is_monotonic_increasing
+
+    missing = np.asarray(index.isna())
+    valid = len(index) - int(missing.sum())
+
+    return bool(missing[valid:].all()
+                and index[:valid].is_monotonic_increasing)
+
+
+def time_range_positions(
+    index: pd.DatetimeIndex,
+    start: pd.Timestamp | str | None = None,
+    end: pd.Timestamp | str | None = None,
+    inclusive: str = 'left',
+) -> slice | np.ndarray:
+    ''' Positions of the times of index between start and end
+
+    Found by binary search if the index is sorted (see
+    validate_time_index()), otherwise by comparing every time. Missing times
+    are never in the range. Whether an index without missing times is
+    sorted is kept by pandas, so only an index with missing times is checked
+    again at each call
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex
+        Times of the rows
+    start : pd.Timestamp | str | None
+        Start of the range. From the first time if None
+    end : pd.Timestamp | str | None
+        End of the range. To the last time if None
+    inclusive : str
+        Which of start and end are in the range, one of INCLUSIVE
+
+    Returns
+    -------
+    slice | np.ndarray
+        A slice of the rows if the index is sorted, otherwise the positions
+        of the rows in the range. Either can be given to df.iloc[]
+    '''
+
+    if inclusive not in INCLUSIVE:
+        raise ValueError(f"Unknown inclusive '{inclusive}'. Options are: "
+                         f"{', '.join(INCLUSIVE)}")
+    left = inclusive in ('both', 'left')
+    right = inclusive in ('both', 'right')
+
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if not is_sorted(index):
+        mask = np.asarray(index.notna())
+        if start is not None:
+            mask &= np.asarray(index >= start if left else index > start)
+        if end is not None:
+            mask &= np.asarray(index <= end if right else index < end)
+        return np.flatnonzero(mask)
+
+    valid = len(index) - (int(index.isna().sum()) if index.hasnans else 0)
+    times = index[:valid] if valid < len(index) else index
+
+    first = 0 if start is None else times.searchsorted(
+        start, side='left' if left else 'right')
+    last = valid if end is None else times.searchsorted(
+        end, side='right' if right else 'left')
+
+    return slice(int(first), int(max(first, last)))
@@ -0,0 +1,384 @@
+''' Local web server of the quicklook time series
+
+The HTML files written by plots.campaign_2023() hold every point of every
+figure, which for a long flight makes files of hundreds of MB that browsers
+struggle to open. The server instead keeps the merged instrument data in
+memory and sends each time series figure with at most a few thousand points
+per trace, averaged into time bins over the whole flight. Each time a figure
+is zoomed or panned, the browser requests the visible time range again, which
+is averaged into bins small enough to keep the same number of points. Once
+the visible range has fewer rows than that, the rows are sent as they are,
+so the data can be inspected at full resolution.
+
+The server only uses the standard library http.server, and plotly.js is
+served from the plotly package, so that no external service is needed.
+'''
+
+import json
+import logging
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.offline
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+from constants import constants
+from processing import sorting
+from processing.export import format_datetime_index
+from processing.instrumentation import StageRecorder
+from processing.merge import MergedFrame
+from processing.pipeline import process_instrument
+import instruments
+import plots
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+# Requests the visible time range of a figure each time it is zoomed or
+# panned, and replaces the data of its traces
+PAGE_SCRIPT = '''
+<script>
+function updateRange(div, start, end) {
+    var url = "data?figure=" + encodeURIComponent(div.id);
+    if (start !== undefined) {
+        url += "&start=" + encodeURIComponent(start)
+            + "&end=" + encodeURIComponent(end);
+    }
+    fetch(url).then(function (response) {
+        return response.json();
+    }).then(function (data) {
+        var traces = data.y.map(function (y, i) { return i; });
+        Plotly.restyle(div, {
+            x: data.y.map(function () { return data.x; }),
+            y: data.y,
+        }, traces);
+    });
+}
+
+window.addEventListener("load", function () {
+    FIGURES.forEach(function (name) {
+        var div = document.getElementById(name);
+        div.on("plotly_relayout", function (event) {
+            if (event["xaxis.autorange"]) {
+                updateRange(div);
+            } else if (event["xaxis.range[0]"] !== undefined) {
+                updateRange(div, event["xaxis.range[0]"],
+                            event["xaxis.range[1]"]);
+            } else if (event["xaxis.range"] !== undefined) {
+                updateRange(div, event["xaxis.range"][0],
+                            event["xaxis.range"][1]);
+            }
+        });
+    });
+});
+</script>
+'''
+
+
+def downsample(
+    df: pd.DataFrame,
+    max_points: int = constants.SERVER_MAX_POINTS,
+) -> Tuple[pd.DataFrame, pd.Timedelta | None]:
+    ''' Reduce the rows of df to about max_points by averaging time bins
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Numeric columns with a time index
+    max_points : int
+        Largest number of rows to return
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.Timedelta | None]
+        The rows of df with a time, averaged into bins of equal length if
+        there are more than max_points, and the length of the bins (None if
+        the rows are returned as they are). Empty bins are dropped
+    '''
+
+    df = df[np.asarray(df.index.notna())]
+    if len(df) <= max_points:
+        return df, None
+
+    span = df.index.max() - df.index.min()
+    bin_width = max(span / max_points, pd.Timedelta(milliseconds=1))
+    bin_width = bin_width.ceil('ms')
+    df = df.resample(bin_width).mean().dropna(how='all')
+
+    return df, bin_width
+
+
+def load_campaign(
+    config: Dict[str, Any],
+    recorder: StageRecorder | None = None,
+) -> Tuple[MergedFrame, List[instruments.Instrument]]:
+    ''' Process the instruments of the config and hold them for merging
+
+    Returns
+    -------
+    Tuple[MergedFrame, List[instruments.Instrument]]
+        The instrument blocks in merge order, and the instruments with data
+    '''
+
+    time_trim_start = pd.to_datetime(config['global']['time_trim']['start'])
+    time_trim_end = pd.to_datetime(config['global']['time_trim']['end'])
+
+    all_export_dfs = []
+    for instrument, props in config['instruments'].items():
+        instrument_obj = getattr(instruments, props['config'])
+        instrument_obj.add_config(props)
+
+        if instrument_obj.filename is None:
+            logger.warning(f"Skipping {instrument}: No file assigned!")
+            continue
+
+        df = process_instrument(
+            instrument_obj, config['ground_station'],
+            time_trim_start, time_trim_end, recorder=recorder
+        )
+        if df is None:
+            continue
+
+        all_export_dfs.append(
+            (instrument_obj.add_device_name_to_columns(df), instrument_obj))
+
+    all_export_dfs.sort(key=sorting.df_column_sort_key)
+    merged = MergedFrame()
+    for df, instrument in all_export_dfs:
+        merged.add(instrument.name, df)
+
+    return merged, [instrument for df, instrument in all_export_dfs]
+
+
+class QuicklookServer:
+    ''' Serves the time series figures of the merged data, resampled to the
+    time range in view
+
+    Parameters
+    ----------
+    merged : MergedFrame
+        Data of all instruments at their native rate
+    all_instruments : List[instruments.Instrument]
+        The instruments with data in merged
+    plot_props : Dict[str, Any]
+        Properties of the plots from the config
+    max_points : int
+        Largest number of points of each trace sent to the browser
+    '''
+
+    def __init__(
+        self,
+        merged: MergedFrame,
+        all_instruments: List[instruments.Instrument],
+        plot_props: Dict[str, Any],
+        max_points: int = constants.SERVER_MAX_POINTS,
+    ) -> None:
+        self.merged = merged
+        self.max_points = max_points
+
+        if plot_props['altitude_ground_level'] is True:
+            altitude = ("Altitude (ground level)",
+                        [constants.ALTITUDE_GROUND_LEVEL_COL])
+        else:
+            altitude = ("Altitude (sea level)",
+                        [constants.ALTITUDE_SEA_LEVEL_COL])
+        pressure_housekeeping, pressure_quicklook = plots.pressure_variables(
+            all_instruments)
+
+        # Title and columns of each figure, by the id of its div
+        figures = {
+            'altitude': altitude,
+            'pressure': ("Pressure variables", pressure_quicklook),
+            'housekeeping-pressure': ("Housekeeping pressure variables",
+                                      pressure_housekeeping),
+        }
+        for i, (variables, title) in enumerate(
+            plots.qualitycheck_variables(all_instruments)
+        ):
+            figures[f"qualitycheck-{i}"] = (title, variables)
+
+        # Only plot the columns that are in the data
+        self.figures: Dict[str, Tuple[str, List[str]]] = {}
+        available = set(merged.columns)
+        for name, (title, columns) in figures.items():
+            columns = [col for col in columns if col in available]
+            if columns:
+                self.figures[name] = (title, columns)
+
+        self._plotlyjs: str | None = None
+
+    def _data_frame(
+        self,
+        name: str,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+    ) -> Tuple[pd.DataFrame, pd.Timedelta | None]:
+        ''' The downsampled columns of a figure in the time range '''
+
+        if name not in self.figures:
+            raise KeyError(f"Unknown figure '{name}'")
+
+        title, columns = self.figures[name]
+        df = self.merged.time_slice(start, end, columns)
+        df = df.apply(pd.to_numeric, errors='coerce')
+
+        return downsample(df, self.max_points)
+
+    def data(
+        self,
+        name: str,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+    ) -> Dict[str, Any]:
+        ''' The points of each trace of a figure in the time range
+
+        Parameters
+        ----------
+        name : str
+            Id of the figure
+        start : pd.Timestamp | None
+            Start of the time range. From the first row if None
+        end : pd.Timestamp | None
+            End of the time range. To the last row if None
+
+        Returns
+        -------
+        Dict[str, Any]
+            The times ('x'), the values of each trace in the order of the
+            figure's columns with None for missing values ('y'), and the
+            length in seconds of the bins they are averaged over
+            ('bin_seconds', None for the rows as they are)
+        '''
+
+        df, bin_width = self._data_frame(name, start, end)
+
+        y = []
+        for col in df.columns:
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            y.append([None if np.isnan(value) else value
+                      for value in values.tolist()])
+
+        return {
+            'x': list(format_datetime_index(df.index, 'ms')),
+            'y': y,
+            'bin_seconds': (bin_width.total_seconds()
+                            if bin_width is not None else None),
+        }
+
+    def figure(
+        self,
+        name: str,
+    ) -> go.Figure:
+        ''' A figure over the whole time range '''
+
+        df, bin_width = self._data_frame(name)
+        title, columns = self.figures[name]
+
+        return plots.plot_scatter_from_variable_list_by_index(
+            df, title, columns)
+
+    def page(self) -> str:
+        ''' The HTML page with all figures '''
+
+        divs = [
+            self.figure(name).to_html(
+                full_html=False, include_plotlyjs=False, div_id=name)
+            for name in self.figures
+        ]
+        script = PAGE_SCRIPT.replace(
+            "FIGURES", json.dumps(list(self.figures)))
+
+        return (
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            "<title>Helikite quicklooks</title>\n"
+            "<script src=\"plotly.min.js\"></script>\n</head>\n<body>\n"
+            + "\n".join(divs) + script + "</body>\n</html>\n"
+        )
+
+    def plotlyjs(self) -> str:
+        ''' plotly.js from the plotly package, read once '''
+
+        if self._plotlyjs is None:
+            self._plotlyjs = plotly.offline.get_plotlyjs()
+
+        return self._plotlyjs
+
+    def make_server(
+        self,
+        host: str = constants.SERVER_HOST,
+        port: int = constants.SERVER_PORT,
+    ) -> ThreadingHTTPServer:
+        ''' An HTTP server of this quicklook, not yet started '''
+
+        server = ThreadingHTTPServer((host, port), QuicklookRequestHandler)
+        server.quicklook = self
+
+        return server
+
+    def serve(
+        self,
+        host: str = constants.SERVER_HOST,
+        port: int = constants.SERVER_PORT,
+    ) -> None:
+        ''' Serve the quicklooks until interrupted (Ctrl+C) '''
+
+        server = self.make_server(host, port)
+        logger.info("Serving the quicklooks at "
+                    f"http://{host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopping the quicklook server")
+        finally:
+            server.server_close()
+
+
+class QuicklookRequestHandler(BaseHTTPRequestHandler):
+    ''' Handles the requests to a QuicklookServer (self.server.quicklook) '''
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        quicklook = self.server.quicklook
+
+        if url.path == '/':
+            self._send(200, 'text/html', quicklook.page())
+        elif url.path == '/plotly.min.js':
+            self._send(200, 'text/javascript', quicklook.plotlyjs())
+        elif url.path == '/data':
+            query = parse_qs(url.query)
+            try:
+                data = quicklook.data(
+                    query['figure'][0],
+                    pd.Timestamp(query['start'][0])
+                    if 'start' in query else None,
+                    pd.Timestamp(query['end'][0])
+                    if 'end' in query else None,
+                )
+            except (KeyError, ValueError) as e:
+                self._send(400, 'text/plain', f"Bad request: {e}")
+                return
+            self._send(200, 'application/json', json.dumps(data))
+        else:
+            self._send(404, 'text/plain', "Not found")
+
+    def _send(
+        self,
+        status: int,
+        content_type: str,
+        body: str,
+    ) -> None:
+        encoded = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(
+        self,
+        format: str,
+        *args: Any,
+    ) -> None:
+        # Log requests with the application's logger instead of stderr
+        logger.debug(format % args)
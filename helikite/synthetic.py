@@ -0,0 +1,1041 @@
+''' Synthetic campaign data in the raw file format of every instrument
+
+The generated flights follow a repeating cycle of time on the ground, an
+ascent, a hover at the top and a descent. Every instrument samples the same
+atmosphere (pressure, temperature, humidity, wind and particles) at its own
+rate and writes it in the format of its raw file, so that each file is
+identified by its instrument's file_identifier() and can be read by the full
+pipeline.
+
+Files are written in chunks of time so that multi-day campaigns at high rates
+can be generated without holding them in memory.
+'''
+
+import datetime
+import logging
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, Iterator, List, TextIO
+from constants import constants
+from instruments.flight_computer import CSV_HEADER as FC_CSV_HEADER
+from instruments.pops import POPS_BINS
+from processing import preprocess
+from processing.conversions import altitude_to_pressure
+import instruments
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+# Flight cycle, in seconds and metres above ground level
+GROUND_SECONDS = 900
+ASCENT_RATE = 1.0
+HOVER_SECONDS = 600
+MAX_ALTITUDE = 500
+
+# Conditions at the ground station
+GROUND_ALTITUDE = 350
+GROUND_PRESSURE = 975.0
+GROUND_TEMPERATURE = 15.0
+
+# Seconds between 1904-01-01 (STAP) and 1970-01-01 (Unix epoch)
+IGOR_EPOCH_OFFSET = 2082844800
+
+# Diameter range of the mSEMS scans in nm
+MSEMS_MIN_DIA = 8
+MSEMS_MAX_DIA = 270
+
+# Diameter limits of the POPS bins in nm, as given in the config
+POPS_BIN_LIMITS = np.logspace(np.log10(150), np.log10(3000), POPS_BINS + 1)
+
+# Size distribution of the synthetic aerosol (lognormal)
+MEDIAN_DIAMETER = 60
+GEOMETRIC_STD = 1.8
+
+
+class SyntheticCampaign:
+    ''' Generates the raw files of a synthetic campaign
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        Time of the first sample
+    duration_seconds : int
+        Length of the campaign
+    sampling_seconds : float
+        Period of the 1 Hz instruments. The instruments that sample slower
+        (SmartTether, ozone monitor) use a multiple of this. It can be a
+        fraction of a second for the instruments whose files hold fractions
+        of a second (POPS, Pico). The others only hold whole seconds,
+        so they sample at the nearest whole number of seconds, at least one
+    msems_bins : int
+        Number of size bins of the mSEMS scans
+    msems_scan_seconds : int
+        Duration of one mSEMS scan
+    clock_offsets : Dict[str, float] | None
+        Seconds that the clock of an instrument (by name) is ahead of the
+        flight computer. Missing instruments have no offset
+    seed : int
+        Seed of the random noise, the same seed gives identical files
+    chunk_seconds : int
+        Length of time generated and written at once
+    header_repeat_seconds : float | None
+        Time between the repeated headers of the flight computer log, as
+        written each time it restarts during a flight. Only the header at
+        the start of the file if None
+    '''
+
+    def __init__(
+        self,
+        start: datetime.datetime = datetime.datetime(2022, 9, 29, 10),
+        duration_seconds: int = 3600,
+        sampling_seconds: float = 1,
+        msems_bins: int = 60,
+        msems_scan_seconds: int = 70,
+        clock_offsets: Dict[str, float] | None = None,
+        seed: int = 0,
+        chunk_seconds: int = 6 * 3600,
+        header_repeat_seconds: float | None = 6 * 3600,
+    ) -> None:
+
+        if sampling_seconds <= 0:
+            raise ValueError("sampling_seconds must be positive, got "
+                             f"{sampling_seconds}")
+
+        self.start = pd.Timestamp(start)
+        self.duration_seconds = duration_seconds
+        self.sampling_seconds = sampling_seconds
+        self.msems_bins = msems_bins
+        self.msems_scan_seconds = msems_scan_seconds
+        self.clock_offsets = clock_offsets or {}
+        self.seed = seed
+        self.chunk_seconds = chunk_seconds
+        self.header_repeat_seconds = header_repeat_seconds
+
+    @property
+    def writers(self) -> Dict[str, Callable[[str], None]]:
+        ''' The file writer of each instrument, by the instrument's name '''
+
+        return {
+            instruments.flight_computer.name: self.write_flight_computer,
+            instruments.smart_tether.name: self.write_smart_tether,
+            instruments.pops.name: self.write_pops,
+            instruments.msems_readings.name: self.write_msems_readings,
+            instruments.msems_scan.name: self.write_msems_scan,
+            instruments.msems_inverted.name: self.write_msems_inverted,
+            instruments.stap.name: self.write_stap,
+            instruments.stap_raw.name: self.write_stap_raw,
+            instruments.mcpc.name: self.write_mcpc,
+            instruments.pico.name: self.write_pico,
+            instruments.ozone_monitor.name: self.write_ozone,
+            instruments.filter.name: self.write_filter,
+        }
+
+    def filename(
+        self,
+        instrument: str
+    ) -> str:
+        ''' Name of the raw file of an instrument, as named by the instrument
+        '''
+
+        date = self.start.strftime("%Y%m%d")
+        short_date = self.start.strftime("%y%m%d")
+        msems = f"mSEMS_103_{short_date}_{self.start.strftime('%H%M%S')}"
+
+        return {
+            instruments.flight_computer.name: f"LOG_{date}.txt",
+            instruments.smart_tether.name: f"LOG_{date}_A.csv",
+            instruments.pops.name: f"HK_{date}x001.csv",
+            instruments.msems_readings.name: f"{msems}_READINGS.txt",
+            instruments.msems_scan.name: f"{msems}_SCAN.txt",
+            instruments.msems_inverted.name: f"{msems}_INVERTED.txt",
+            instruments.stap.name: f"STAP_{short_date}A0_processed.txt",
+            instruments.stap_raw.name: f"STAP_{short_date}A0.txt",
+            instruments.mcpc.name: f"{short_date}A0.TXT",
+            instruments.pico.name: f"Pico100217_{short_date}Eng.txt",
+            instruments.ozone_monitor.name: "LOG46.txt",
+            instruments.filter.name: f"FILTER_{short_date}A0.txt",
+        }[instrument]
+
+    def write_all(
+        self,
+        folder: str,
+        instrument_names: List[str] | None = None,
+    ) -> Dict[str, str]:
+        ''' Write the raw files of the instruments into folder
+
+        Parameters
+        ----------
+        folder : str
+            Folder to write the files to, created if it does not exist
+        instrument_names : List[str] | None
+            Names of the instruments to write. All if None
+
+        Returns
+        -------
+        Dict[str, str]
+            Path of the file written for each instrument, by name
+        '''
+
+        os.makedirs(folder, exist_ok=True)
+
+        files = {}
+        for name, writer in self.writers.items():
+            if instrument_names is not None and name not in instrument_names:
+                continue
+
+            path = os.path.join(folder, self.filename(name))
+            logger.info(f"Writing synthetic {name} data to {path}")
+            writer(path)
+            files[name] = path
+
+        return files
+
+    def atmosphere(
+        self,
+        seconds: np.ndarray,
+    ) -> pd.DataFrame:
+        ''' Conditions seen by the helikite at seconds since the start
+
+        Returns altitude (m above ground), pressure (hPa), temperature (deg
+        C), relative humidity (%), wind speed (m/s), wind direction (deg) and
+        the particle number concentration (cm-3)
+        '''
+
+        seconds = np.asarray(seconds, dtype=float)
+
+        # Position in the flight cycle: ground, ascent, hover, descent
+        climb_seconds = MAX_ALTITUDE / ASCENT_RATE
+        cycle_seconds = GROUND_SECONDS + 2 * climb_seconds + HOVER_SECONDS
+        t = seconds % cycle_seconds
+        altitude = np.select(
+            [t < GROUND_SECONDS,
+             t < GROUND_SECONDS + climb_seconds,
+             t < GROUND_SECONDS + climb_seconds + HOVER_SECONDS],
+            [0,
+             (t - GROUND_SECONDS) * ASCENT_RATE,
+             MAX_ALTITUDE],
+            (cycle_seconds - t) * ASCENT_RATE
+        )
+
+        # Slow daily cycle of the ground conditions
+        day_phase = 2 * np.pi * seconds / 86400
+        ground_pressure = GROUND_PRESSURE + 3 * np.sin(day_phase / 3)
+        ground_temperature = GROUND_TEMPERATURE + 5 * np.sin(day_phase)
+
+        pressure = altitude_to_pressure(
+            altitude, ground_pressure, ground_temperature)
+
+        return pd.DataFrame({
+            'altitude': altitude,
+            'pressure': pressure,
+            'temperature': ground_temperature - 0.0065 * altitude,
+            'rh': 60 + 20 * altitude / MAX_ALTITUDE,
+            'wind_speed': 3 + altitude / 100 + np.sin(day_phase * 24),
+            # Wind from the north, so the direction wraps around 0/360
+            'wind_direction': (350 + 30 * np.sin(day_phase * 12)) % 360,
+            'concentration': 2000 * np.exp(-altitude / 300),
+        })
+
+    def _rng(
+        self,
+        name: str,
+        chunk: int,
+    ) -> np.random.Generator:
+        ''' Random generator for the noise of one chunk of an instrument '''
+
+        return np.random.default_rng([self.seed, zlib.crc32(name.encode()),
+                                      chunk])
+
+    def _period(
+        self,
+        multiple: int = 1,
+        fractional: bool = False,
+    ) -> float:
+        ''' Sampling period of an instrument, a multiple of sampling_seconds
+
+        Rounded to a whole number of seconds (at least one) unless the
+        instrument's file holds fractions of a second
+        '''
+
+        period = multiple * self.sampling_seconds
+        if fractional:
+            return period
+
+        return max(1, round(period))
+
+    def _chunks(
+        self,
+        name: str,
+        period_seconds: float,
+    ) -> Iterator[Dict[str, Any]]:
+        ''' Sample times of an instrument, one chunk of time at a time
+
+        Yields the chunk number, the seconds since the start (in the flight
+        computer's time) and the timestamps of the instrument's clock
+        '''
+
+        offset = pd.Timedelta(seconds=self.clock_offsets.get(name, 0))
+        samples_per_chunk = max(1, int(self.chunk_seconds // period_seconds))
+        total_samples = int(self.duration_seconds // period_seconds)
+
+        for chunk, first in enumerate(
+            range(0, total_samples, samples_per_chunk)
+        ):
+            seconds = np.arange(
+                first, min(first + samples_per_chunk, total_samples)
+            ) * period_seconds
+            times = (self.start + offset
+                     + pd.to_timedelta(seconds, unit='s'))
+
+            yield {
+                'chunk': chunk,
+                'seconds': seconds,
+                'times': times,
+                'rng': self._rng(name, chunk),
+            }
+
+    def _size_fractions(
+        self,
+        bin_limits: np.ndarray,
+    ) -> np.ndarray:
+        ''' Fraction of the particles in each bin of the lognormal mode '''
+
+        log_limits = np.log(bin_limits)
+        centres = (log_limits[:-1] + log_limits[1:]) / 2
+        shape = np.exp(-(centres - np.log(MEDIAN_DIAMETER)) ** 2
+                       / (2 * np.log(GEOMETRIC_STD) ** 2))
+
+        fractions = shape * np.diff(log_limits)
+
+        return fractions / fractions.sum()
+
+    @property
+    def msems_bin_limits(self) -> np.ndarray:
+        return np.logspace(np.log10(MSEMS_MIN_DIA), np.log10(MSEMS_MAX_DIA),
+                           self.msems_bins + 1)
+
+    def write_flight_computer(
+        self,
+        path: str,
+    ) -> None:
+        ''' Flight computer log. The header is repeated every
+        header_repeat_seconds, as it is when the flight computer restarts
+        during a flight
+        '''
+
+        name = instruments.flight_computer.name
+        last_restart = np.nan
+        with open(path, 'w') as out_file:
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    'SBI': '$',
+                    'DateTime': _epoch_seconds(chunk['times']),
+                    'PartCon': rng.poisson(atm['concentration'] / 10),
+                    'CO2': 415 + rng.normal(0, 2, n),
+                    'P_baro': atm['pressure'] + rng.normal(0, 0.02, n),
+                    'TEMPbox': 20 + atm['temperature'] / 5,
+                    'mFlow': 'NA',
+                    'TEMPsamp': atm['temperature'] + 1,
+                    'RHsamp': atm['rh'] - 2,
+                    'TEMP1': atm['temperature'] + rng.normal(0, 0.05, n),
+                    'RH1': atm['rh'] + rng.normal(0, 0.2, n),
+                    'TEMP2': atm['temperature'] + rng.normal(0, 0.05, n),
+                    'RH2': atm['rh'] + rng.normal(0, 0.2, n),
+                    # Each row is terminated by a '#'
+                    'vBat': _format(24.8 - chunk['seconds'] / 86400, "%.2f#"),
+                })
+
+                # The header is written before the first row of each restart
+                restarts = (
+                    chunk['seconds'] // self.header_repeat_seconds
+                    if self.header_repeat_seconds is not None
+                    else np.zeros(n)
+                )
+                previous = np.concatenate([[last_restart], restarts[:-1]])
+                headers = list(np.flatnonzero(restarts != previous))
+                for first, end in zip([0] + headers, headers + [n]):
+                    if first == end:
+                        continue
+                    if first in headers:
+                        out_file.write(FC_CSV_HEADER)
+                    _write_rows(out_file, rows.iloc[first:end],
+                                delimiter=',', float_format="%.2f")
+                if n > 0:
+                    last_restart = restarts[-1]
+
+    def write_smart_tether(
+        self,
+        path: str,
+    ) -> None:
+        ''' SmartTether log. The date is only in the header, the rows only
+        have the time of day, which passes midnight in campaigns over a day
+        '''
+
+        name = instruments.smart_tether.name
+        with open(path, 'w') as out_file:
+            out_file.write(
+                "SmartTether log file\n"
+                f"Date {self.start.month}/{self.start.day}/{self.start.year}"
+                "\n\n"
+                "Time,Comment,Module ID,Alt (m),P (mbar),T (deg C),%RH,Wind "
+                "(degrees),Wind (m/s),Supply (V),UTC Time,Latitude (deg),"
+                "Longitude (deg),Course (deg),Speed (m/s)\n"
+            )
+            for chunk in self._chunks(name, self._period(2)):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                _write_rows(out_file, pd.DataFrame({
+                    'Time': chunk['times'].strftime("%H:%M:%S"),
+                    'Comment': '',
+                    'Module ID': '03AA9B2A',
+                    'Alt (m)': atm['altitude'].round().astype(int),
+                    'P (mbar)': _format(
+                        atm['pressure'] + rng.normal(0, 0.05, n), "%.1f"),
+                    'T (deg C)': _format(atm['temperature'], "%.3f"),
+                    '%RH': _format(atm['rh'], "%.1f"),
+                    'Wind (degrees)': (
+                        atm['wind_direction'] + rng.normal(0, 5, n)
+                    ).round().astype(int) % 360,
+                    'Wind (m/s)': _format(
+                        np.abs(atm['wind_speed'] + rng.normal(0, 0.3, n)),
+                        "%.1f"),
+                    'Supply (V)': '2.66',
+                    'UTC Time': (
+                        chunk['times'] - pd.Timedelta(hours=3)
+                    ).strftime("%H:%M:%S"),
+                    'Latitude (deg)': _format(
+                        67.999827 + rng.normal(0, 1e-5, n), "%.6f"),
+                    'Longitude (deg)': _format(
+                        24.239877 + rng.normal(0, 1e-5, n), "%.6f"),
+                    'Course (deg)': '',
+                    'Speed (m/s)': '0.00',
+                }), delimiter=',')
+
+    def write_pops(
+        self,
+        path: str,
+    ) -> None:
+        ''' POPS housekeeping file with the counts of the 16 size bins '''
+
+        name = instruments.pops.name
+        with open(path, 'w') as out_file:
+            out_file.write(
+                "DateTime, Status, PartCt, PartCon, BL, BLTH, STD, P, TofP, "
+                "POPS_Flow, PumpFB, LDTemp, LaserFB, LD_Mon, Temp, BatV, "
+                "Laser_Current, Flow_Set,PumpLife_hrs, BL_Start, TH_Mult, "
+                "nbins, logmin, logmax, Skip_Save, MinPeakPts,MaxPeakPts, "
+                "RawPts,b0,b1,b2,b3,b4,b5,b6,b7,b8,b9,b10,b11,b12,b13,b14,"
+                "b15\n"
+            )
+            # Particles larger than ~150 nm fall in the POPS bins
+            fractions = 0.6 ** np.arange(POPS_BINS)
+            fractions /= fractions.sum()
+
+            for chunk in self._chunks(name, self._period(fractional=True)):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                flow = 2.9 + rng.normal(0, 0.02, n)
+                counts = rng.poisson(np.outer(
+                    atm['concentration'] * 0.02 * flow, fractions))
+                rows = pd.DataFrame({
+                    # Sampled with a few milliseconds of jitter
+                    'DateTime': _format(
+                        _epoch_seconds(chunk['times'], fractional=True)
+                        + rng.uniform(0.5, 0.53, n), "%.3f"),
+                    'Status': 1,
+                    'PartCt': counts.sum(axis=1),
+                    'PartCon': counts.sum(axis=1) / flow,
+                    'BL': 2140,
+                    'BLTH': 2175,
+                    'STD': 12 + rng.normal(0, 0.5, n),
+                    'P': atm['pressure'] + rng.normal(0, 0.05, n),
+                    'TofP': atm['temperature'] + 5,
+                    'POPS_Flow': flow,
+                    'PumpFB': 160,
+                    'LDTemp': 37.2,
+                    'LaserFB': 518,
+                    'LD_Mon': 1420,
+                    'Temp': atm['temperature'] + 4,
+                    'BatV': 11.6,
+                    'Laser_Current': 2.87,
+                    'Flow_Set': 2.72,
+                    'PumpLife_hrs': 879.46,
+                    'BL_Start': 30000,
+                    'TH_Mult': '3.0',
+                    'nbins': POPS_BINS,
+                    'logmin': 1.75,
+                    'logmax': 4.81,
+                    'Skip_Save': 0,
+                    'MinPeakPts': 10,
+                    'MaxPeakPts': 255,
+                    'RawPts': 512,
+                })
+                for i in range(POPS_BINS):
+                    rows[f"b{i}"] = counts[:, i]
+
+                _write_rows(out_file, rows, delimiter=',',
+                            float_format="%.2f")
+
+    def write_msems_readings(
+        self,
+        path: str,
+    ) -> None:
+        ''' mSEMS readings, the 1 Hz housekeeping of the mSEMS and its CPC '''
+
+        name = instruments.msems_readings.name
+        columns = list(instruments.msems_readings.dtype)
+        with open(path, 'w') as out_file:
+            out_file.write(_msems_preamble())
+            out_file.write("\t".join(columns) + "\n")
+
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                _write_rows(out_file, pd.DataFrame({
+                    '#YY/MM/DD': chunk['times'].strftime("%y/%m/%d"),
+                    'HR:MN:SC': chunk['times'].strftime("%H:%M:%S"),
+                    'msems_mode': 1,
+                    'mono_dia': rng.integers(8, 270, n),
+                    'sheath_sp': 2.5,
+                    'sheath_rh': atm['rh'].round().astype(int) - 10,
+                    'sheath_temp': atm['temperature'] + 1,
+                    'pressure': atm['pressure'].round().astype(int),
+                    'lfe_temp': atm['temperature'],
+                    'sheath_flow': 2.5 + rng.normal(0, 0.01, n),
+                    'sheath_pwr': 218,
+                    'impct_prs': 0.6,
+                    'hv_volts': rng.uniform(4, 2400, n),
+                    'hv_dac': rng.integers(0, 36601, n),
+                    'sd_install': 1,
+                    'ext_volts': 12.7,
+                    'msems_errs': 0,
+                    'mcpc_hrtb': 0,
+                    'mcpc_smpf': 0.313,
+                    'mcpc_satf': 0.312,
+                    'mcpc_cndt': 19.7,
+                    'mcpc_satt': 44.7,
+                    'mcpcpwr': 1,
+                    'mcpcpmp': 1,
+                    'sd_save': 1,
+                    'mcpc_errs': 0,
+                    'mcpc_a_conc': rng.poisson(atm['concentration'] / 50),
+                    'mcpc_a_cnt': rng.poisson(atm['concentration'] / 10),
+                })[columns], delimiter='\t', float_format="%.3f")
+
+    def _msems_scans(self) -> Iterator[Dict[str, Any]]:
+        ''' Scan times and particle counts of the mSEMS, shared by the scan
+        and inverted files so that they describe the same scans
+        '''
+
+        name = instruments.msems_scan.name
+        fractions = self._size_fractions(self.msems_bin_limits)
+
+        for chunk in self._chunks(name, self.msems_scan_seconds):
+            atm = self.atmosphere(chunk['seconds'])
+            chunk['atmosphere'] = atm
+            chunk['concentrations'] = np.outer(atm['concentration'],
+                                               fractions)
+            yield chunk
+
+    def write_msems_scan(
+        self,
+        path: str,
+    ) -> None:
+        ''' mSEMS scans, the raw counts of each size bin of each scan '''
+
+        with open(path, 'w') as out_file:
+            out_file.write(_msems_preamble(scan_config={
+                'sheath_sp': "2.50",
+                'scan_type': "1",
+                'scan_max_dia': str(MSEMS_MAX_DIA),
+                'scan_min_dia': str(MSEMS_MIN_DIA),
+                'num_bins': str(self.msems_bins),
+                'bin_time': "1.00",
+                'plumbing_time': "1.28",
+            }))
+            bin_columns = [f"bin{i}" for i in range(1, self.msems_bins + 1)]
+            out_file.write("\t".join(
+                ["#YY/MM/DD", "HR:MN:SC", "scan_direction", "actual_max_dia",
+                 "scan_max_volts", "scan_min_volts", "sheath_flw_avg",
+                 "sheath_flw_stdev", "mcpc_smpf_avg", "mcpc_smpf_stdev",
+                 "press_avg", "press_stdev", "temp_avg", "temp_stdev",
+                 "sheath_rh_avg", "sheath_rh_stdev"]
+                + bin_columns
+                + ["msems_errs", "mcpc_smpf", "mcpc_satf", "mcpc_cndt",
+                   "mcpc_satt", "mcpc_errs"]) + "\n")
+
+            for chunk in self._msems_scans():
+                rng = chunk['rng']
+                atm = chunk['atmosphere']
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    '#YY/MM/DD': chunk['times'].strftime("%y/%m/%d"),
+                    'HR:MN:SC': chunk['times'].strftime("%H:%M:%S"),
+                    'scan_direction': 0,
+                    'actual_max_dia': MSEMS_MAX_DIA,
+                    'scan_max_volts': 2405.6,
+                    'scan_min_volts': 4.3,
+                    'sheath_flw_avg': 2.5,
+                    'sheath_flw_stdev': np.abs(rng.normal(0, 0.006, n)),
+                    'mcpc_smpf_avg': 0.314,
+                    'mcpc_smpf_stdev': np.abs(rng.normal(0, 0.0005, n)),
+                    'press_avg': atm['pressure'] + rng.normal(0, 0.05, n),
+                    'press_stdev': np.abs(rng.normal(0, 0.2, n)),
+                    'temp_avg': atm['temperature'],
+                    'temp_stdev': np.abs(rng.normal(0, 0.05, n)),
+                    'sheath_rh_avg': atm['rh'] - 10,
+                    'sheath_rh_stdev': np.abs(rng.normal(0, 0.1, n)),
+                })
+                # Counts of a ~0.3 cm3 sample over each bin
+                counts = rng.poisson(chunk['concentrations'] * 0.3 / 10)
+                rows = pd.concat([rows, pd.DataFrame(
+                    counts, columns=bin_columns)], axis=1)
+                rows['msems_errs'] = 0
+                rows['mcpc_smpf'] = 0.315
+                rows['mcpc_satf'] = 0.312
+                rows['mcpc_cndt'] = 19.7
+                rows['mcpc_satt'] = 44.8
+                rows['mcpc_errs'] = 0
+
+                _write_rows(out_file, rows, delimiter='\t',
+                            float_format="%.5g")
+
+    def write_msems_inverted(
+        self,
+        path: str,
+    ) -> None:
+        ''' mSEMS inverted scans, the concentration of each size bin '''
+
+        bins = self.msems_bins
+        limits = self.msems_bin_limits
+        centres = np.sqrt(limits[:-1] * limits[1:])
+        dia_columns = [f"Bin_Dia{i}" for i in range(1, bins + 1)]
+        conc_columns = [f"Bin_Conc{i}" for i in range(1, bins + 1)]
+
+        with open(path, 'w') as out_file:
+            out_file.write("\t".join(
+                ["#Date", "Time", "Temp(C)", "Press(hPa)", "NumBins"]
+                + dia_columns + conc_columns) + "\n")
+
+            for chunk in self._msems_scans():
+                rng = self._rng(instruments.msems_inverted.name,
+                                chunk['chunk'])
+                atm = chunk['atmosphere']
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    '#Date': chunk['times'].strftime("%y/%m/%d"),
+                    'Time': chunk['times'].strftime("%H:%M:%S"),
+                    'Temp(C)': atm['temperature'],
+                    'Press(hPa)': atm['pressure'],
+                    'NumBins': float(bins),
+                })
+                # The bin diameters shift slightly with each scan
+                diameters = centres * (1 + rng.normal(0, 3e-4, (n, 1)))
+                concentrations = np.abs(
+                    chunk['concentrations']
+                    * (1 + rng.normal(0, 0.1, (n, bins))))
+                rows = pd.concat([
+                    rows,
+                    pd.DataFrame(diameters, columns=dia_columns),
+                    pd.DataFrame(concentrations, columns=conc_columns),
+                ], axis=1)
+
+                _write_rows(out_file, rows, delimiter='\t',
+                            float_format="%.6f")
+
+    def write_stap(
+        self,
+        path: str,
+    ) -> None:
+        ''' Processed STAP data, timestamped in seconds since 1904 '''
+
+        name = instruments.stap.name
+        with open(path, 'w') as out_file:
+            out_file.write(
+                "datetimes,sample_press_mbar,sample_temp_C,sigmab,sigmag,"
+                "sigmar,sigmab_smth,sigmag_smth,sigmar_smth\n"
+            )
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    'datetimes': (_epoch_seconds(chunk['times'])
+                                  + IGOR_EPOCH_OFFSET),
+                    'sample_press_mbar': (
+                        atm['pressure'] - 15).round().astype(int),
+                    'sample_temp_C': (atm['temperature'] + 4).round(1),
+                })
+                absorption = atm['concentration'].to_numpy() / 1000
+                for colour, scale in [('b', 1.2), ('g', 1.0), ('r', 0.8)]:
+                    sigma = absorption * scale + rng.normal(0, 1, n)
+                    rows[f"sigma{colour}"] = sigma
+                    rows[f"sigma{colour}_smth"] = pd.Series(sigma).rolling(
+                        30, min_periods=1).mean()
+                if chunk['chunk'] == 0:
+                    # No absorption is calculated for the first sample
+                    rows.loc[0, ['sigmab', 'sigmag', 'sigmar']] = np.nan
+
+                _write_rows(out_file, rows, delimiter=',', na_rep='NAN',
+                            float_format="%.16g")
+
+    def write_stap_raw(
+        self,
+        path: str,
+    ) -> None:
+        ''' Raw STAP output. The first readings flag the sensor warming up '''
+
+        name = instruments.stap_raw.name
+        columns = list(instruments.stap_raw.dtype)
+        with open(path, 'w') as out_file:
+            out_file.write(_preamble("#STAP-UAV SN:101", 29))
+            out_file.write("\t".join(columns) + "\n")
+
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    # Date and time fields have an extra whitespace
+                    '#YY/MM/DD': chunk['times'].strftime("%y/%m/%d "),
+                    'HR:MN:SC': chunk['times'].strftime(" %H:%M:%S"),
+                    'red_smp': rng.integers(900000, 910000, n),
+                    'red_ref': rng.integers(900000, 910000, n),
+                    'grn_smp': rng.integers(900000, 910000, n),
+                    'grn_ref': rng.integers(900000, 910000, n),
+                    'blu_smp': rng.integers(900000, 910000, n),
+                    'blu_ref': rng.integers(900000, 910000, n),
+                    'blk_smp': rng.integers(0, 100, n),
+                    'blk_ref': rng.integers(0, 100, n),
+                    'smp_flw': 1.0 + rng.normal(0, 0.01, n),
+                    'smp_tmp': atm['temperature'] + 4,
+                    'smp_prs': atm['pressure'].round().astype(int),
+                    'pump_pw': 120,
+                    'psvolts': 12.1,
+                    'err_rpt': 0,
+                    'cntdown': 300,
+                    'sd_stat': 1.0,
+                    'fltstat': 1,
+                    'flow_sp': 1,
+                    'intervl': 1,
+                    'stapctl': 1,
+                })
+                absorption = atm['concentration'].to_numpy() / 1000
+                for colour, scale in [('r', 0.8), ('g', 1.0), ('b', 1.2)]:
+                    rows[f"invmm_{colour}"] = _format(
+                        absorption * scale + rng.normal(0, 1, n), "%.2f")
+                if chunk['chunk'] == 0:
+                    rows.loc[:9, ['invmm_r', 'invmm_g', 'invmm_b']] = "-0.00*"
+
+                _write_rows(out_file, rows[columns], delimiter='\t',
+                            float_format="%.2f")
+
+    def write_mcpc(
+        self,
+        path: str,
+    ) -> None:
+        ''' mCPC particle counter '''
+
+        name = instruments.mcpc.name
+        columns = list(instruments.mcpc.dtype)
+        with open(path, 'w') as out_file:
+            out_file.write(_preamble("#MCPC-UAV SN:22", 13))
+            out_file.write("\t".join(columns) + "\n")
+
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+
+                concentration = rng.poisson(atm['concentration'])
+                _write_rows(out_file, pd.DataFrame({
+                    '#YY/MM/DD': chunk['times'].strftime("%y/%m/%d"),
+                    'HR:MN:SC': chunk['times'].strftime("%H:%M:%S"),
+                    'aveconc': atm['concentration'].round().astype(int),
+                    'concent': concentration,
+                    'rawconc': concentration,
+                    'cnt_sec': concentration // 10,
+                    'condtmp': 19.7,
+                    'satttmp': 44.7,
+                    'satbtmp': 44.6,
+                    'optctmp': 40.1,
+                    'inlttmp': atm['temperature'] + 5,
+                    'smpflow': 360,
+                    'satflow': 310,
+                    'pressur': atm['pressure'].round().astype(int),
+                    'condpwr': 120,
+                    'sattpwr': 110,
+                    'satbpwr': 100,
+                    'optcpwr': 90,
+                    'satfpwr': 80,
+                    'exhfpwr': 70,
+                    'fillcnt': 0,
+                    'err_num': 0,
+                    'mcpcpmp': 1,
+                    'mcpcpwr': 1,
+                })[columns], delimiter='\t', float_format="%.2f")
+
+    def write_pico(
+        self,
+        path: str,
+    ) -> None:
+        ''' Pico gas monitor (CO, N2O and H2O) with its spectral fit terms '''
+
+        name = instruments.pico.name
+        columns = list(instruments.pico.dtype)
+        with open(path, 'w') as out_file:
+            out_file.write(",".join(columns) + "\n")
+
+            for chunk in self._chunks(name, self._period(fractional=True)):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                rows = pd.DataFrame({
+                    # Up to 200 ms late, less than half a sampling period
+                    'Time Stamp': (
+                        chunk['times'] + pd.to_timedelta(rng.integers(
+                            0, min(200, int(500 * self.sampling_seconds)), n
+                        ), unit='ms')
+                    ).strftime("%m/%d/%Y %H:%M:%S.%f").str[:-3],
+                    'Inlet Number': 1,
+                    'P (mbars)': atm['pressure'] + rng.normal(0, 0.1, n),
+                    'T0 (degC)': 45.0,
+                    'T5 (degC)': 45.1,
+                    'Tgas(degC)': atm['temperature'] + 20,
+                    'Laser PID Readout': 2000,
+                    'Det PID Readout': 3000,
+                })
+                for window in range(2):
+                    for term in range(10):
+                        rows[f"win{window}Fit{term}"] = rng.normal(0, 1, n)
+                co = 0.1 + rng.normal(0, 0.002, n)
+                rows['Det Bkgd'] = 0.01
+                rows['Ramp Ampl'] = 1.5
+                rows['N2O (ppm)'] = 0.335 + rng.normal(0, 0.001, n)
+                rows['H2O (ppm)'] = 8000 + 100 * atm['rh'] / 60
+                rows['CO (ppm)'] = co
+                rows['Mean N2O (ppm)'] = 0.335
+                rows['Mean H2O (ppm)'] = 8000
+                rows['Differential CO (ppm)'] = co - 0.1
+                rows['Battery Charge (V)'] = 16
+                rows['Power Input (mV)'] = 16000
+                rows['Current (mA)'] = 900
+                rows['SOC (%)'] = 90
+                rows['Battery T (degC)'] = 25.0
+                rows['FET T (degC)'] = 30.0
+
+                _write_rows(out_file, rows[columns], delimiter=',',
+                            float_format="%.5f")
+
+    def write_ozone(
+        self,
+        path: str,
+    ) -> None:
+        ''' Ozone monitor log. There is no header and each row is followed by
+        an empty line
+        '''
+
+        name = instruments.ozone_monitor.name
+        with open(path, 'w') as out_file:
+            for chunk in self._chunks(name, self._period(2)):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                _write_rows(out_file, pd.DataFrame({
+                    'ozone': 35 + atm['altitude'] / 100 + rng.normal(0, 1, n),
+                    'cell_temp': atm['temperature'] + 10,
+                    'cell_pressure': atm['pressure'] + rng.normal(0, 0.1, n),
+                    'flow_rate': rng.integers(1400, 1500, n),
+                    'date': chunk['times'].strftime("%d/%m/%y"),
+                    'time': chunk['times'].strftime("%H:%M:%S"),
+                    'unused': 0,
+                }), delimiter=',', float_format="%.1f", lineterminator="\n\n")
+
+    def write_filter(
+        self,
+        path: str,
+    ) -> None:
+        ''' Filter sampler, which moves to the next filter every 30 minutes '''
+
+        name = instruments.filter.name
+        columns = list(instruments.filter.dtype)
+        with open(path, 'w') as out_file:
+            out_file.write(_preamble("#FILTER-UAV SN:7", 13))
+            out_file.write("\t".join(columns) + "\n")
+
+            for chunk in self._chunks(name, self._period()):
+                rng = chunk['rng']
+                atm = self.atmosphere(chunk['seconds'])
+                n = len(atm)
+
+                position = (chunk['seconds'] // 1800).astype(int) % 8 + 1
+                _write_rows(out_file, pd.DataFrame({
+                    # Date and time fields have an extra whitespace
+                    '#YY/MM/DD': chunk['times'].strftime("%y/%m/%d "),
+                    'HR:MN:SC': chunk['times'].strftime(" %H:%M:%S"),
+                    'cur_pos': position,
+                    'cntdown': 1800 - (chunk['seconds'] % 1800).astype(int),
+                    'smp_flw': 2.0 + rng.normal(0, 0.02, n),
+                    'smp_tmp': atm['temperature'] + 3,
+                    'smp_prs': atm['pressure'].round().astype(int),
+                    'pump_pw': 150,
+                    'psvolts': 12.0,
+                    'err_rpt': 0,
+                    'pumpctl': 1,
+                    'ctlmode': 1,
+                    'intervl': 1800,
+                    'flow_sp': 2.0,
+                })[columns], delimiter='\t', float_format="%.2f")
+
+
+def _epoch_seconds(
+    times: pd.DatetimeIndex,
+    fractional: bool = False,
+) -> np.ndarray:
+    ''' Seconds since 1970-01-01 of each timestamp, whole seconds unless
+    fractional '''
+
+    if fractional:
+        return times.asi8 / 10**9
+
+    return times.asi8 // 10**9
+
+
+def _format(
+    values: Any,
+    format_string: str,
+) -> np.ndarray:
+    ''' Format each value with a printf-style format string '''
+
+    return np.char.mod(format_string, np.asarray(values, dtype=float))
+
+
+def _write_rows(
+    out_file: TextIO,
+    rows: pd.DataFrame,
+    delimiter: str,
+    **kwargs
+) -> None:
+    ''' Append the rows of a dataframe to an open file, without a header '''
+
+    rows.to_csv(out_file, sep=delimiter, header=False, index=False, **kwargs)
+
+
+def _preamble(
+    title: str,
+    lines: int,
+) -> str:
+    ''' Commented header of an instrument file, of exactly lines lines '''
+
+    preamble = [title, "#------------", "#Firmware:1.3", "#"]
+    preamble += ["#"] * (lines - len(preamble))
+
+    return "\n".join(preamble[:lines]) + "\n"
+
+
+def _msems_preamble(
+    scan_config: Dict[str, str] | None = None,
+) -> str:
+    ''' The commented header of the mSEMS readings and scan files
+
+    The readings header is 31 lines. The scan file adds the scan and constant
+    configuration, for a header of 55 lines
+    '''
+
+    lines = [
+        "#mSEMS SN:103", "#------------", "#mSEMS Firmware:1.3",
+        "#mSEMS Mfg Date:20/9/24", "#MCPC SN:22", "#",
+        "#hdw_conf", "#--------", "#mcpc_a_yn:1", "#mcpc_b_yn:0",
+        "#mcpc_b_smpf:0.360", "#samp_rh_yn:0", "#sheath_rh_yn:1",
+        "#col_type:0", "#samp_type:0", "#",
+        "#calibration", "#-----------", "#sheath_c2:-5075.60",
+        "#sheath_c1:1557.90", "#sheath_c0:-4164.70", "#cal_temp:19.0",
+        "#impct_slp:2147.3", "#impct_off:-431.2", "#press_slp:3885.3",
+        "#press_off:-995.7", "#hv_slope:1482.2", "#hv_offset:752.8",
+        "#ext_volts_slp:4898.0", "#ext_volts_off:3356.0", "#",
+    ]
+
+    if scan_config is not None:
+        lines += ["#scan_conf", "#---------"]
+        lines += [f"#{key}:{value}" for key, value in scan_config.items()]
+        lines += [
+            "#", "#constants", "#---------", "#hv_polarity:0",
+            "#hv_max_volts:3000", "#mcpc_tau:0.250", "#mcpc_c2:0.845",
+            "#mcpc_c1:7.929", "#mcpc_c0:1.025", "#col_length:0.063500",
+            "#col_r_outer:0.021717", "#col_r_inner:0.019050", "#",
+            "#bin_conc=false", "#",
+        ]
+
+    return "\n".join(lines) + "\n"
+
+
+def write_campaign(
+    folder: str,
+    campaign: SyntheticCampaign,
+    instrument_names: List[str] | None = None,
+) -> Dict[str, Any]:
+    ''' Write the raw files of a campaign and a config file to run it
+
+    The config is generated as in the generate_config step, with the files
+    and dates that the preprocess step would fill in
+
+    Parameters
+    ----------
+    folder : str
+        Folder to write the files and config.yaml to
+    campaign : SyntheticCampaign
+        The campaign to generate
+    instrument_names : List[str] | None
+        Names of the instruments to write. All if None
+
+    Returns
+    -------
+    Dict[str, Any]
+        The configuration, as written to the config file
+    '''
+
+    files = campaign.write_all(folder, instrument_names)
+
+    config_path = os.path.join(folder, constants.CONFIG_FILE)
+    preprocess.generate_config(overwrite=True, path=config_path)
+    config = preprocess.read_yaml_config(config_path)
+
+    # Only keep the instruments that have a file, as after preprocessing
+    config['instruments'] = {
+        instrument: props
+        for instrument, props in config['instruments'].items()
+        if getattr(instruments, props['config']).name in files
+    }
+    for props in config['instruments'].values():
+        props['file'] = files[getattr(instruments, props['config']).name]
+
+    config['ground_station']['altitude'] = GROUND_ALTITUDE
+    if 'pops' in config['instruments']:
+        config['instruments']['pops']['bin_limits'] = (
+            POPS_BIN_LIMITS.round(1).tolist())
+
+    # The SmartTether date is read from its header in preprocessing
+    if 'smart_tether' in config['instruments']:
+        config['instruments']['smart_tether']['date'] = (
+            campaign.start.normalize().to_pydatetime())
+
+    preprocess.export_yaml_config(config, config_path)
+
+    return config
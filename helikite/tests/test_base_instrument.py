@@ -1,4 +1,7 @@
+import numpy as np
 import pandas as pd
+import pytest
+from instruments.base import Instrument
 
 
 def test_read_data(campaign_file_paths_and_instruments):
@@ -8,3 +11,45 @@ def test_read_data(campaign_file_paths_and_instruments):
 
         assert isinstance(df, pd.DataFrame), "Data is not a pandas DataFrame"
         assert df.empty is False, "No data found in file"
+
+
+def test_correct_time_offset_and_drift():
+    index = pd.DatetimeIndex([
+        "2022-09-29 10:00:00", "2022-09-29 11:00:00", None,
+        "2022-09-29 12:00:00", "2022-09-29 13:00:00"], name="DateTime")
+    df = pd.DataFrame({"a": range(5)}, index=index)
+
+    instrument = Instrument()
+    instrument.time_offset = {'hour': 0, 'minute': 1, 'second': 0}
+    assert instrument.time_correction(index[:0]) is not None
+
+    # Constant offset, as the DateOffset addition did
+    corrected = instrument.correct_time_from_config(df.copy())
+    expected = index + pd.DateOffset(minutes=1)
+    assert corrected.index.equals(expected)
+    assert corrected.index.name == "DateTime"
+
+    # Linear drift from the first time, on top of the offset
+    instrument.time_drift = {'seconds_per_hour': 2}
+    corrected = instrument.correct_time_from_config(df.copy())
+    assert list(corrected.index - expected)[:2] == [
+        pd.Timedelta(0), pd.Timedelta(seconds=2)]
+    assert pd.isna(corrected.index[2])
+    assert corrected.index[4] - expected[4] == pd.Timedelta(seconds=6)
+
+    # Anchors, interpolated and extrapolated from the end segments
+    instrument.time_offset = {'hour': 0, 'minute': 0, 'second': 0}
+    instrument.time_drift = {'anchors': [
+        ["2022-09-29 12:00:00", -4], ["2022-09-29 11:00:00", 0]]}
+    corrected = instrument.correct_time_from_config(df.copy())
+    shift = (corrected.index - index).total_seconds()
+    np.testing.assert_allclose(shift[[0, 1, 3, 4]], [4, 0, -4, -8])
+
+    instrument.time_drift = {'seconds_per_hour': 1, 'anchors': [
+        ["2022-09-29 12:00:00", -4]]}
+    with pytest.raises(ValueError):
+        instrument.correct_time_from_config(df.copy())
+
+    # Nothing to correct
+    instrument.time_drift = None
+    assert instrument.time_correction(index) is None
@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks import BenchmarkSuite, measure, write_results  # noqa
+
+
+def test_measure_median_and_memory():
+    calls = []
+
+    def func(values):
+        calls.append(values)
+        return [0] * 100000
+
+    result = measure(func, setup=lambda: ([1, 2],), repeats=3)
+
+    # Three timed runs and one run for the memory
+    assert len(calls) == 4
+    assert len(result['seconds']) == 3
+    assert min(result['seconds']) <= result['median_seconds']
+    assert result['iqr_seconds'] >= 0
+    assert result['peak_memory_mb'] >= 0.8
+
+
+def test_suite_writes_results(tmp_path):
+    ''' Run the whole suite on a short campaign '''
+
+    results = BenchmarkSuite(
+        sizes={'10min': 600}, repeats=1, data_folder=str(tmp_path / "data")
+    ).run()
+    filename = tmp_path / "results.json"
+    write_results(results, str(filename))
+
+    with open(filename) as f:
+        loaded = json.load(f)
+
+    names = [result['name'] for result in loaded['results']]
+    for stage in ["pops: read_data", "pops: set_time_as_index",
+                  "pops: data_corrections", "merge", "export: master csv",
+                  "exports: dense", "exports: blocks",
+                  "plots: grid", "plots: heatmaps", "plots: write html"]:
+        assert stage in names
+
+    # Densifying one export at a time holds less than the full merge
+    peaks = {result['name']: result['peak_memory_mb']
+             for result in loaded['results']}
+    assert peaks["exports: blocks"] < peaks["exports: dense"]
+
+    assert all(result['size'] == '10min' for result in loaded['results'])
+    assert loaded['metadata']['repeats'] == 1
@@ -0,0 +1,75 @@
+import os
+import sys
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks import write_results  # noqa
+from compare_benchmarks import (  # noqa
+    compare, compare_files, format_table, read_results, regressions
+)
+
+
+def result(name, median_seconds, iqr_seconds=0.0, peak_memory_mb=100.0):
+    return {'size': '1h', 'name': name, 'rows': 10,
+            'seconds': [median_seconds], 'median_seconds': median_seconds,
+            'iqr_seconds': iqr_seconds, 'peak_memory_mb': peak_memory_mb}
+
+
+def write(tmp_path, filename, results):
+    write_results({'metadata': {}, 'results': results},
+                  str(tmp_path / filename))
+    return str(tmp_path / filename)
+
+
+def test_regressions_are_noise_aware(tmp_path):
+    baseline = read_results(write(tmp_path, "baseline.json", [
+        result("slower", 1.0),
+        result("noisy", 1.0, iqr_seconds=0.5),
+        result("faster", 1.0),
+        result("more memory", 1.0, peak_memory_mb=100),
+        result("tiny", 0.001),
+        result("removed", 1.0),
+    ]))
+    current = read_results(write(tmp_path, "current.json", [
+        result("slower", 1.2),
+        result("noisy", 1.4, iqr_seconds=0.1),
+        result("faster", 0.5),
+        result("more memory", 1.0, peak_memory_mb=150),
+        result("tiny", 0.005),
+        result("added", 1.0),
+    ]))
+
+    rows = compare(baseline, current, tolerance=0.1)
+    status = {(row['name'], row['metric']): row['status'] for row in rows}
+
+    assert status[("slower", "time")] == "REGRESSION"
+    assert status[("noisy", "time")] == "ok"
+    assert status[("faster", "time")] == "improvement"
+    assert status[("more memory", "time")] == "ok"
+    assert status[("more memory", "memory")] == "REGRESSION"
+    assert status[("tiny", "time")] == "ok"
+    assert status[("removed", None)] == "removed"
+    assert status[("added", None)] == "new"
+
+    assert {(row['name'], row['metric']) for row in regressions(rows)} == {
+        ("slower", "time"), ("more memory", "memory")}
+
+    # A larger tolerance accepts the slowdown
+    assert [row['name'] for row in regressions(
+        compare(baseline, current, tolerance=0.6))] == []
+
+    table = format_table(rows).splitlines()
+    assert table[0].split() == ["Size", "Stage", "Metric", "Baseline",
+                                "Current", "Ratio", "Threshold", "Status"]
+    assert len(table) == len(rows) + 2
+
+
+@pytest.mark.parametrize("current_seconds,passed", [(1.05, True),
+                                                    (2.0, False)])
+def test_compare_files(tmp_path, current_seconds, passed):
+    baseline = write(tmp_path, "baseline.json", [result("merge", 1.0)])
+    current = write(tmp_path, "current.json",
+                    [result("merge", current_seconds)])
+
+    assert compare_files(baseline, current, tolerance=0.1) is passed
@@ -0,0 +1,80 @@
+import gzip
+import os
+import sys
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.export import (  # noqa
+    CSVExporter, datetime_csv_unit, write_csv_chunked
+)
+from instruments import flight_computer  # noqa
+
+
+def test_chunked_export_matches_to_csv(fc_data: pd.DataFrame, tmp_path):
+    ''' Writing in chunks should produce the same file as a single write '''
+
+    df = flight_computer.set_time_as_index(fc_data)
+
+    expected = tmp_path / "expected.csv"
+    chunked = tmp_path / "chunked.csv"
+    df.to_csv(expected)
+    write_csv_chunked(df, str(chunked), chunk_rows=777)
+
+    assert chunked.read_text() == expected.read_text()
+
+
+def test_chunks_keep_the_time_resolution(tmp_path):
+    ''' Chunks with whole seconds are written with the decimals of others '''
+
+    df = pd.DataFrame(
+        {'a': range(6)},
+        index=pd.to_datetime(["2022-09-29 10:00:00", "2022-09-29 10:00:01",
+                              None, "2022-09-29 10:00:02",
+                              "2022-09-29 10:00:02.5", "2022-09-29 10:00:03"]))
+    assert datetime_csv_unit(df.index) == 'ms'
+    assert datetime_csv_unit(df.index[:2]) == 's'
+    assert datetime_csv_unit(pd.DatetimeIndex(["2022-09-29"])) == 'D'
+
+    expected = tmp_path / "expected.csv"
+    chunked = tmp_path / "chunked.csv"
+    df.to_csv(expected)
+    write_csv_chunked(df, str(chunked), chunk_rows=2)
+
+    assert chunked.read_text() == expected.read_text()
+
+
+def test_background_export_with_gzip(fc_data: pd.DataFrame, tmp_path):
+    ''' Exports are written by the thread and compressed when requested '''
+
+    df = flight_computer.set_time_as_index(fc_data)
+
+    with CSVExporter(chunk_rows=1000, compression='gzip') as exporter:
+        filename = exporter.submit(df, str(tmp_path / "fc.csv"))
+
+    assert filename.endswith(".csv.gz")
+    with gzip.open(filename, 'rt', newline='') as in_file:
+        assert in_file.read() == df.to_csv()
+
+
+def test_export_errors_raised_on_close(fc_data: pd.DataFrame, tmp_path):
+    ''' An error in the writer thread should not be silently lost '''
+
+    exporter = CSVExporter()
+    exporter.submit(fc_data, str(tmp_path / "missing_folder" / "fc.csv"))
+
+    with pytest.raises(FileNotFoundError):
+        exporter.close()
+
+
+def test_wait_until_written(fc_data: pd.DataFrame, tmp_path):
+    ''' wait() returns once the queued exports are on disk '''
+
+    df = flight_computer.set_time_as_index(fc_data)
+
+    with CSVExporter() as exporter:
+        filename = exporter.submit(df, str(tmp_path / "fc.csv"))
+        exporter.wait()
+
+        assert open(filename).read() == df.to_csv()
@@ -0,0 +1,91 @@
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from constants import constants  # noqa
+from processing.instrumentation import (  # noqa
+    StageRecorder, current_rss_mb
+)
+from processing.profiling import Profiler  # noqa
+
+
+def test_stage_records_shapes_and_times(tmp_path):
+    recorder = StageRecorder()
+    df = pd.DataFrame({'a': range(10), 'b': range(10)})
+
+    result = recorder.run("head", lambda x, n: x.head(n)[['a']], df, 3)
+    assert len(result) == 3
+
+    with pytest.raises(ValueError):
+        with recorder.stage("failing", df):
+            raise ValueError("Stage failed")
+
+    filename = tmp_path / "timings.json"
+    recorder.write_json(filename)
+
+    with open(filename) as f:
+        stages = json.load(f)['stages']
+
+    assert [x['name'] for x in stages] == ["head", "failing"]
+    assert (stages[0]['rows_in'], stages[0]['cols_in']) == (10, 2)
+    assert (stages[0]['rows_out'], stages[0]['cols_out']) == (3, 1)
+    assert stages[1]['rows_out'] is None
+    assert all(x['wall_seconds'] >= 0 for x in stages)
+
+
+@pytest.mark.skipif(current_rss_mb() is None,
+                    reason="The resident memory is only read on Linux")
+def test_stage_peak_memory_is_per_stage():
+    ''' A stage after a larger one reports its own peak, not the larger '''
+
+    recorder = StageRecorder()
+
+    with recorder.stage("large"):
+        values = np.ones(25_000_000)  # 200 MB
+        values.sum()
+        # Held for a few samples, a shorter peak can be missed
+        time.sleep(5 * constants.STAGE_RSS_SAMPLE_SECONDS)
+        del values
+    with recorder.stage("small"):
+        sum(range(1000))
+
+    large, small = recorder.records
+    assert large.peak_rss_mb >= small.peak_rss_mb + 150
+
+
+def test_profiler_writes_phase_dumps(tmp_path):
+    profiler = Profiler(str(tmp_path / "profile"))
+    profiler.start()
+    try:
+        with profiler.profile("sum"):
+            sum(range(1000))
+        profiler.begin("first")
+        profiler.begin("second")
+    finally:
+        profiler.stop()
+
+    for phase in ["sum", "first", "second"]:
+        assert pstats.Stats(str(tmp_path / "profile" / f"{phase}.prof"))
+        tracemalloc.Snapshot.load(
+            str(tmp_path / "profile" / f"{phase}.tracemalloc"))
+        assert (tmp_path / "profile" / f"{phase}.txt").exists()
+    assert not tracemalloc.is_tracing()
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    profiler = Profiler()
+    profiler.start()
+    with profiler.profile("sum"):
+        sum(range(1000))
+    profiler.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,197 @@
+import logging
+import os
+import sys
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.export import datetime_csv_unit, write_csv_windowed  # noqa
+from processing.merge import (  # noqa
+    MergedFrame, align_asof, merge_outer_on_index
+)
+
+
+def fast_and_slow_instruments():
+    fast = pd.DataFrame(
+        {'fast_a': range(10), 'fast_b': range(10, 20)},
+        index=pd.date_range("2022-09-29 10:00:00", periods=10, freq='1S'))
+    slow = pd.DataFrame(
+        {'slow_a': [1.5, 2.5, 3.5]},
+        index=pd.to_datetime(["2022-09-29 10:00:00", "2022-09-29 10:00:04.5",
+                              "2022-09-29 10:00:20"]))
+
+    return fast, slow
+
+
+def test_dense_matches_outer_merge():
+    fast, slow = fast_and_slow_instruments()
+
+    merged = MergedFrame()
+    merged.add('fast', fast)
+    merged.add('slow', slow)
+
+    expected = merge_outer_on_index([fast, slow])
+
+    pd.testing.assert_frame_equal(merged.to_dense(), expected)
+
+
+def test_column_subset_keeps_union_index():
+    ''' Densifying some columns keeps the rows of the full merge '''
+
+    fast, slow = fast_and_slow_instruments()
+
+    merged = MergedFrame()
+    merged.add('fast', fast)
+    merged.add('slow', slow)
+
+    expected = merge_outer_on_index([fast, slow])[['fast_b']]
+
+    pd.testing.assert_frame_equal(
+        merged.to_dense(columns=['fast_b']), expected)
+
+    # Without the union index, only the rows of the slow instrument remain
+    assert len(merged.to_dense(instruments=['slow'],
+                               union_index=False)) == len(slow)
+
+
+@pytest.mark.parametrize("window_rows", [1, 2, 7, 100])
+def test_windows_match_dense(tmp_path, window_rows):
+    ''' Merging in windows writes the same CSV as the full merge '''
+
+    fast, slow = fast_and_slow_instruments()
+    fast['fast_flag'] = fast['fast_a'] > 4
+
+    # Duplicate times and rows without a time, as found in instrument files
+    other = pd.DataFrame(
+        {'other_a': [1, 2, 3, 4]},
+        index=pd.to_datetime(["2022-09-29 10:00:03", "2022-09-29 10:00:03",
+                              None, "2022-09-29 10:00:08"]))
+
+    merged = MergedFrame()
+    merged.add('fast', fast)
+    merged.add('slow', slow)
+    merged.add('other', other)
+
+    for columns in [None, ['slow_a', 'fast_flag'], ['fast_b']]:
+        expected = tmp_path / "expected.csv"
+        windowed = tmp_path / "windowed.csv"
+        merged.to_dense(columns).to_csv(expected)
+        rows = write_csv_windowed(
+            merged.iter_windows(window_rows, columns), str(windowed),
+            chunk_rows=3, date_unit=datetime_csv_unit(merged.union_index()))
+
+        assert windowed.read_text() == expected.read_text()
+        assert rows == len(merged.to_dense(columns))
+
+
+def test_window_rows_within_budget():
+    fast, slow = fast_and_slow_instruments()
+
+    merged = MergedFrame()
+    merged.add('fast', fast)
+    merged.add('slow', slow)
+
+    # 3 float columns and the index. slow_a and the integers of fast are
+    # floats once the merge fills their missing rows with NaN
+    assert merged.row_bytes() == 4 * 8
+    assert merged.dense_rows() == len(merged.to_dense())
+    assert merged.window_rows(1e9, overhead=1) > 12
+    assert merged.window_rows(4 * 8 * 3, overhead=1) == 3
+    assert merged.window_rows(1, overhead=1) == 1
+
+
+def test_windows_stay_in_budget_with_bursts():
+    ''' A burst of fast rows does not make a window larger than the budget '''
+
+    start = pd.Timestamp("2022-09-29 10:00:00")
+    slow = pd.DataFrame(
+        {'slow_a': range(600),
+         'slow_text': [f"row {i}" * (1 + i % 5) for i in range(600)]},
+        index=pd.date_range(start, periods=600, freq='1S'))
+    # Ten seconds at 100 Hz in the middle of the flight
+    burst = pd.DataFrame(
+        {'burst_a': range(1000)},
+        index=pd.date_range(start + pd.Timedelta(minutes=5), periods=1000,
+                            freq='10ms'))
+
+    merged = MergedFrame()
+    merged.add('slow', slow)
+    merged.add('burst', burst)
+
+    budget = 20000
+    windows = list(merged.iter_windows(merged.window_rows(budget, overhead=1)))
+
+    assert len(windows) > 1
+    for window in windows:
+        assert window.memory_usage(deep=True).sum() <= budget
+    assert sum(len(window) for window in windows) == len(merged.to_dense())
+
+
+def test_align_asof_directions_and_tolerance():
+    fast, slow = fast_and_slow_instruments()
+    reference = fast.index.insert(3, pd.NaT)
+
+    nearest = align_asof(reference, slow, tolerance=0.5, direction='nearest')
+    assert nearest.index.equals(reference)
+    # 10:00:04.5 is half a second from both 10:00:04 and 10:00:05, it is
+    # only placed at the first
+    assert list(nearest['slow_a'].fillna(0)) == [
+        1.5, 0, 0, 0, 0, 2.5, 0, 0, 0, 0, 0]
+
+    backward = align_asof(reference, slow, tolerance=1, direction='backward')
+    assert backward['slow_a'].notna().sum() == 2
+    assert backward['slow_a'].iloc[6] == 2.5
+
+    forward = align_asof(reference, slow, tolerance=0.4, direction='forward')
+    assert forward['slow_a'].notna().sum() == 1
+
+    with pytest.raises(ValueError):
+        align_asof(reference, slow, direction='sideways')
+
+
+def test_align_sparse_onto_dense_reference(caplog):
+    ''' Each row of an instrument is placed at one reference time at most '''
+
+    reference = pd.date_range("2022-09-29 10:00:00", periods=60, freq='1S')
+    sparse = pd.DataFrame(
+        {'sparse_a': range(6)},
+        index=reference[::10] + pd.Timedelta(milliseconds=200))
+
+    aligned = align_asof(reference, sparse, tolerance=5, name='sparse')
+    assert aligned['sparse_a'].notna().sum() == len(sparse)
+    assert list(aligned['sparse_a'].dropna()) == list(range(6))
+    assert list(aligned.index[aligned['sparse_a'].notna()]) == list(
+        reference[::10])
+
+    # Onto a sparse reference, only the closest of the dense rows is kept
+    dense = pd.DataFrame({'dense_a': range(60)}, index=reference)
+    with caplog.at_level(logging.INFO):
+        aligned = align_asof(sparse.index, dense, tolerance=5, name='dense')
+    assert list(aligned['dense_a']) == list(range(0, 60, 10))
+    assert "dense: 54 of 60 rows not aligned" in caplog.text
+
+
+def test_align_to_reference_keeps_its_rows():
+    fast, slow = fast_and_slow_instruments()
+    # Fractional seconds a few ms off the fast instrument's clock
+    offset = pd.DataFrame(
+        {'offset_a': range(10)},
+        index=fast.index + pd.Timedelta(milliseconds=3))
+
+    merged = MergedFrame()
+    merged.add('fast', fast)
+    merged.add('slow', slow)
+    merged.add('offset', offset)
+    assert len(merged.to_dense()) == 22
+
+    aligned = merged.align_to('fast', tolerances={'slow': 0.25})
+    master_df = aligned.to_dense()
+
+    assert len(master_df) == len(fast)
+    assert list(master_df['offset_a']) == list(range(10))
+    assert master_df['slow_a'].notna().sum() == 1
+    pd.testing.assert_frame_equal(master_df[list(fast.columns)], fast)
+
+    with pytest.raises(ValueError):
+        merged.align_to('missing')
@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instruments import msems_inverted  # noqa
+
+
+def test_bin_limits_stored_as_metadata(campaign_file_paths_and_instruments):
+    ''' Bin limits are stored once on the instrument, not as columns '''
+
+    df = msems_inverted.read_data()
+    df = msems_inverted.set_time_as_index(df)
+    df = msems_inverted.data_corrections(df)
+
+    bins = 60
+    assert not any(col.startswith("Bin_Lim") for col in df.columns)
+    assert msems_inverted.bin_limits.shape == (bins + 1,)
+
+    # Each mean bin diameter lies between its lower and upper limit
+    diameters = df[[f"Bin_Dia{i}" for i in range(1, bins + 1)]].mean()
+    assert np.all(msems_inverted.bin_limits[:-1] < diameters.to_numpy())
+    assert np.all(msems_inverted.bin_limits[1:] > diameters.to_numpy())
+
+
+def test_scan_index_of_inverted_scans(campaign_file_paths_and_instruments):
+    ''' Each inverted scan lasts until the next starts, the last a minute '''
+
+    df = msems_inverted.read_data()
+    df = msems_inverted.set_time_as_index(df)
+    df = msems_inverted.data_corrections(df)
+
+    scans = msems_inverted.build_scan_index(df)
+    assert len(scans) == len(df)
+    assert list(scans.starts) == list(df.index)
+    assert list(scans.ends[:-1]) == list(df.index[1:])
+    assert scans.ends[-1] - scans.starts[-1] == pd.Timedelta(minutes=1)
+
+    # A scan is found for every time it covers
+    assert list(scans.scan_at(df.index)) == list(range(len(df)))
+    means = scans.aggregate(df[["Bin_Conc1"]])
+    assert list(means.index) == list(df.index)
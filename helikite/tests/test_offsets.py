@@ -0,0 +1,67 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.offsets import (  # noqa
+    apply_offsets, estimate_lag, estimate_offsets, split_seconds,
+    time_offset_seconds
+)
+from synthetic import SyntheticCampaign, write_campaign  # noqa
+
+
+def test_split_seconds():
+    assert split_seconds(-3725) == {'hour': -1, 'minute': -2, 'second': -5}
+    assert split_seconds(59.6) == {'hour': 0, 'minute': 1, 'second': 0}
+    for seconds in [-3725, 0, 125, 7322]:
+        assert time_offset_seconds(split_seconds(seconds)) == seconds
+
+
+def test_estimate_lag_with_gaps():
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2022-09-29 10:00:00", periods=3000, freq="1S")
+    seconds = np.arange(3000)
+    pressure = 950 - 60 * np.sin(seconds / 700) + rng.normal(0, 0.2, 3000)
+    reference = pd.Series(pressure, index=index)
+
+    # The instrument's clock is 42 s ahead, it reads 1.5 hPa low and it
+    # has a gap in its data
+    other = pd.Series(pressure - 1.5, index=index + pd.Timedelta(seconds=42))
+    other = other.drop(other.index[1000:1400])
+
+    lag, pressure_offset, correlation = estimate_lag(reference, other)
+
+    assert round(lag) == -42
+    assert np.isclose(pressure_offset, 1.5, atol=0.05)
+    assert correlation > 0.99
+
+    # Only the lags up to the maximum are considered
+    assert abs(estimate_lag(reference, other, max_lag_seconds=30)[0]) <= 30
+
+
+def test_estimate_offsets_of_synthetic_campaign(tmp_path):
+    campaign = SyntheticCampaign(
+        duration_seconds=1800, clock_offsets={'smart_tether': -125})
+    config = write_campaign(str(tmp_path), campaign,
+                            ['flight_computer', 'smart_tether'])
+    config['instruments']['smart_tether']['time_offset']['second'] = 5
+
+    estimates = estimate_offsets(config)
+
+    assert list(estimates) == ['smart_tether']
+    assert estimates['smart_tether']['time_offset'] == {
+        'hour': 0, 'minute': 2, 'second': 5}
+    assert round(estimates['smart_tether']['lag']) == 120
+
+    apply_offsets(config, estimates)
+    assert config['instruments']['smart_tether']['time_offset'] == {
+        'hour': 0, 'minute': 2, 'second': 5}
+
+    # A poor correlation is not written
+    estimates['smart_tether']['correlation'] = 0.1
+    estimates['smart_tether']['time_offset'] = {
+        'hour': 1, 'minute': 0, 'second': 0}
+    apply_offsets(config, estimates)
+    assert config['instruments']['smart_tether']['time_offset']['hour'] == 0
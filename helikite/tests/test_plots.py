@@ -5,7 +5,13 @@ import numpy
 
 # Append the root directory of your project to the system path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from plots import generate_normalised_colours  # noqa
+from plots import (  # noqa
+    FigureCache, budget_resample_seconds, budget_timeseries,
+    generate_normalised_colours, variable_instruments
+)
+from processing.instrumentation import StageRecorder  # noqa
+from processing.merge import MergedFrame  # noqa
+import instruments  # noqa
 
 
 def test_nan_for_colourmap(fc_data: pd.DataFrame):
@@ -26,3 +32,49 @@ def test_nan_for_colourmap(fc_data: pd.DataFrame):
 
     # Execute function to ensure it does not raise ValueError
     generate_normalised_colours(fc_data)
+
+
+def test_plotted_data_within_budget():
+    ''' Plotted columns too large for the budget are plotted as bin means '''
+
+    index = pd.date_range("2022-09-29 10:00:00", periods=3600, freq='1S')
+    merged = MergedFrame()
+    merged.add('fast', pd.DataFrame({'fast_a': range(3600),
+                                     'fast_b': 1.0}, index=index))
+    merged.add('slow', pd.DataFrame({'slow_a': range(360)},
+                                    index=index[::10]))
+    columns = ['fast_a', 'slow_a']
+
+    assert budget_resample_seconds(merged, columns, 1e9) is None
+
+    budget = 10000
+    seconds = budget_resample_seconds(merged, columns, budget, overhead=1)
+    assert seconds > 1
+
+    df = budget_timeseries(merged, columns, seconds, circular={})
+    assert list(df.columns) == columns
+    assert df.memory_usage(deep=True).sum() <= budget
+    assert df['fast_a'].iloc[0] == (seconds - 1) / 2
+
+
+def test_figure_cache_depends_on_instruments():
+    all_instruments = [instruments.flight_computer, instruments.stap,
+                       instruments.stap_raw]
+    assert variable_instruments(
+        ["stap_raw_invmm_b", "flight_computer_TEMP1", "stap_sigmab_smth"],
+        all_instruments) == {"stap_raw", "flight_computer", "stap"}
+
+    cache = FigureCache()
+    recorder = StageRecorder()
+    figure = cache.build(recorder, "stap", {"stap"}, object)
+
+    cache.invalidate({"flight_computer"})
+    assert cache.build(recorder, "stap", {"stap"}, object) is figure
+
+    # More instruments in the figure than when it was built
+    assert cache.get("stap", {"stap", "stap_raw"}) is None
+    rebuilt = cache.build(recorder, "stap", {"stap", "stap_raw"}, object)
+    assert rebuilt is not figure
+
+    cache.invalidate({"stap_raw"})
+    assert cache.get("stap") is None
@@ -0,0 +1,153 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.merge import MergedFrame  # noqa
+from processing.profiles import profile_directions, vertical_profile  # noqa
+from processing.segments import altitude_at, flight_segments, phase_at  # noqa
+from plots import generate_vertical_profile_plot  # noqa
+
+
+@pytest.fixture
+def flight():
+    ''' A climb to 800 m and back down, with two instruments '''
+
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2022-09-29 10:00:00", periods=4000, freq="1S")
+    seconds = np.arange(4000)
+    altitude = 800 * np.sin(seconds / 4000 * np.pi) + rng.normal(0, 1, 4000)
+    fc = pd.DataFrame({
+        "fc_Altitude": altitude,
+        "fc_TEMP1": 15 - altitude / 100 + rng.normal(0, 0.1, 4000),
+    }, index=index)
+
+    # An instrument at its own, faster rate, with gaps
+    pops_index = pd.date_range("2022-09-29 10:00:00.3", periods=12000,
+                               freq="330ms")
+    pops = pd.DataFrame({
+        "pops_conc": rng.lognormal(3, 0.5, 12000),
+        "pops_count": rng.integers(0, 10, 12000),
+    }, index=pops_index)
+    pops.iloc[::9, 0] = np.nan
+
+    return fc, pops
+
+
+def test_vertical_profile_matches_groupby(flight):
+    fc, pops = flight
+    statistics = ["count", "mean", "std", "min", "median", "p10", "p97.5"]
+
+    dense = pops.combine_first(fc[["fc_Altitude"]])
+    profile = vertical_profile(dense, "fc_Altitude", 50, statistics,
+                               columns=["pops_conc", "pops_count"])
+
+    # The bins with only rows of the flight computer have no values
+    assert (profile["pops_count_count"] == 0).any()
+    profile = profile[profile["pops_count_count"] > 0]
+
+    # The same bins by a groupby of every row
+    directions = profile_directions(
+        phase_at(flight_segments(fc["fc_Altitude"]), pops.index))
+    altitude = altitude_at(fc["fc_Altitude"], pops.index)
+    rows = directions >= 0
+    groups = pops[rows].groupby([
+        np.array(["ascent", "descent"])[directions[rows]],
+        (np.floor(altitude[rows] / 50) + 0.5) * 50])
+
+    assert list(profile.index.names) == ["direction", "altitude"]
+    assert set(profile.index.unique("direction")) == {"ascent", "descent"}
+    for col in ["pops_conc", "pops_count"]:
+        expected = groups[col]
+        np.testing.assert_array_equal(profile[f"{col}_count"],
+                                      expected.count())
+        np.testing.assert_allclose(profile[f"{col}_mean"], expected.mean())
+        np.testing.assert_allclose(profile[f"{col}_std"], expected.std())
+        np.testing.assert_allclose(profile[f"{col}_min"], expected.min())
+        np.testing.assert_allclose(profile[f"{col}_median"],
+                                   expected.median())
+        np.testing.assert_allclose(profile[f"{col}_p10"],
+                                   expected.quantile(0.1))
+        np.testing.assert_allclose(profile[f"{col}_p97.5"],
+                                   expected.quantile(0.975))
+
+
+def test_vertical_profile_of_blocks_and_plot(flight):
+    fc, pops = flight
+    merged = MergedFrame()
+    merged.add("fc", fc)
+    merged.add("pops", pops)
+
+    profile = vertical_profile(merged, "fc_Altitude", 100)
+    dense = vertical_profile(merged.to_dense(), "fc_Altitude", 100)
+    pd.testing.assert_frame_equal(profile, dense[profile.columns])
+
+    # The temperature falls with altitude on the way up and down
+    for direction in ["ascent", "descent"]:
+        temperature = profile.xs(direction)["fc_TEMP1_median"]
+        assert temperature.is_monotonic_decreasing
+
+    fig = generate_vertical_profile_plot(
+        profile, ["fc_TEMP1", "pops_conc", "missing"], at_ground_level=True)
+    # A band and a median line for each direction of each variable
+    assert len(fig.data) == 2 * 2 * 2
+
+    with pytest.raises(ValueError, match="Options are"):
+        vertical_profile(merged, "fc_Altitude", 100, ["mean", "p101"])
+    with pytest.raises(ValueError, match="No altitude column"):
+        vertical_profile(merged, "Altitude", 100)
+
+
+def test_vertical_profile_of_angles():
+    index = pd.date_range("2022-09-29 10:00:00", periods=600, freq="1S")
+    df = pd.DataFrame({
+        "Altitude": np.arange(600, dtype=float),
+        "Wind (degrees)": np.where(np.arange(600) % 2, 350.0, 20.0),
+        "Wind (m/s)": 2.0,
+    }, index=index)
+
+    profile = vertical_profile(
+        df, "Altitude", 100, ["count", "mean", "median"],
+        circular={"Wind (degrees)": "Wind (m/s)"})
+
+    assert list(profile.index.unique("direction")) == ["ascent"]
+    np.testing.assert_allclose(profile["Wind (degrees)_mean"], 5.0)
+    assert profile["Wind (degrees)_median"].isna().all()
+    assert (profile["Wind (degrees)_count"] > 0).all()
+
+
+def test_vertical_profile_quantiles_of_heavy_tails(flight):
+    ''' Quantiles are exact for values spanning many orders of magnitude '''
+
+    fc, pops = flight
+    rng = np.random.default_rng(1)
+    pops["pops_conc"] = rng.lognormal(0, 5, len(pops))
+    pops["pops_count"] = rng.uniform(1, 10, len(pops))
+    pops.iloc[5000, 1] = 1e12
+    statistics = ["min", "median", "p10", "max"]
+
+    dense = pops.combine_first(fc[["fc_Altitude"]])
+    profile = vertical_profile(dense, "fc_Altitude", 3, statistics,
+                               columns=["pops_conc", "pops_count"])
+    profile = profile[profile["pops_count_min"].notna()]
+    assert len(profile) > 250
+
+    directions = profile_directions(
+        phase_at(flight_segments(fc["fc_Altitude"]), pops.index))
+    altitude = altitude_at(fc["fc_Altitude"], pops.index)
+    rows = directions >= 0
+    groups = pops[rows].groupby([
+        np.array(["ascent", "descent"])[directions[rows]],
+        (np.floor(altitude[rows] / 3) + 0.5) * 3])
+
+    for col in ["pops_conc", "pops_count"]:
+        expected = groups[col]
+        np.testing.assert_array_equal(profile[f"{col}_min"], expected.min())
+        np.testing.assert_array_equal(profile[f"{col}_max"], expected.max())
+        np.testing.assert_allclose(profile[f"{col}_median"],
+                                   expected.median(), rtol=1e-12)
+        np.testing.assert_allclose(profile[f"{col}_p10"],
+                                   expected.quantile(0.1), rtol=1e-12)
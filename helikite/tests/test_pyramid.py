@@ -0,0 +1,114 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.merge import MergedFrame  # noqa
+from processing.pyramid import Pyramid, STATISTICS  # noqa
+from server import load_campaign  # noqa
+from synthetic import SyntheticCampaign, write_campaign  # noqa
+import plots  # noqa
+
+
+@pytest.fixture
+def merged():
+    ''' A 1 Hz and a 0.5 Hz instrument with gaps, across midnight '''
+
+    rng = np.random.default_rng(0)
+    fast_index = pd.date_range("2022-09-29 23:50", periods=3000, freq="1S")
+    fast = pd.DataFrame({
+        "fc_a": rng.normal(size=3000),
+        "fc_text": "x",
+        "fc_int": pd.array(rng.integers(0, 9, 3000), dtype="Int64"),
+    }, index=fast_index)
+    fast.iloc[5:50, 0] = np.nan
+
+    slow_index = pd.date_range("2022-09-29 23:55:00.5", periods=600,
+                               freq="2S")
+    slow = pd.DataFrame({
+        "pops_b": pd.array(rng.normal(size=600), dtype="Float64"),
+    }, index=slow_index)
+
+    merged = MergedFrame()
+    merged.add("fc", fast)
+    merged.add("pops", slow)
+
+    return merged
+
+
+def test_levels_match_resampling_merged_data(merged):
+    pyramid = Pyramid.build(merged, [1, 10, 60, 600])
+    dense = merged.to_dense()
+
+    assert list(pyramid.levels) == [1, 10, 60, 600]
+    for seconds in pyramid.levels:
+        resampler = dense.resample(f"{seconds}S")
+        for statistic in STATISTICS:
+            result = pyramid.aggregate(seconds, statistic)
+            assert list(result.columns) == ["fc_a", "fc_int", "pops_b"]
+            if statistic == 'count':
+                expected = resampler.count()
+            else:
+                expected = getattr(resampler, statistic)(numeric_only=True)
+            pd.testing.assert_frame_equal(
+                result, expected[result.columns].astype(result.dtypes),
+                check_freq=False, check_names=False)
+
+
+def test_aggregate_from_dividing_level(merged):
+    pyramid = Pyramid.build(merged, [10, 600], columns=["pops_b"])
+
+    assert pyramid.level_for(30) == 10
+    assert pyramid.level_for(1200) == 600
+    assert pyramid.level_for(5) is None
+    with pytest.raises(ValueError):
+        pyramid.aggregate(5)
+
+    expected = merged.to_dense().resample("30S").max(numeric_only=True)
+    pd.testing.assert_frame_equal(
+        pyramid.aggregate(30, 'max'), expected[["pops_b"]].astype(float),
+        check_freq=False, check_names=False)
+
+
+def test_write_and_read(merged, tmp_path):
+    pyramid = Pyramid.build(merged, [10, 60])
+    pyramid.write(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "helikite-data_10s.csv", "helikite-data_60s.csv"]
+
+    read = Pyramid.read(str(tmp_path))
+    assert list(read.levels) == [10, 60]
+    for seconds, level in pyramid.levels.items():
+        pd.testing.assert_frame_equal(read.levels[seconds], level,
+                                      check_freq=False, check_names=False)
+
+
+def test_grid_plot_from_pyramid(tmp_path):
+    config = write_campaign(
+        str(tmp_path), SyntheticCampaign(duration_seconds=1200, msems_bins=30))
+    merged, all_instruments = load_campaign(config)
+    df = merged.to_dense()
+    pyramid = Pyramid.build(merged, [10])
+
+    # The mean of each instrument's own rows (the POPS has repeated times,
+    # which repeat the rows of the other instruments in the merged data)
+    resampled_df = pd.concat([
+        block.resample("60S").mean(numeric_only=True)
+        for block in merged.blocks.values()
+    ], axis=1)
+    resampled = plots.generate_grid_plot(
+        df, all_instruments, resample_seconds=60, resampled_df=resampled_df)
+    from_pyramid = plots.generate_grid_plot(
+        df, all_instruments, resample_seconds=60,
+        resampled_df=pyramid.aggregate(60))
+
+    assert len(resampled.data) == len(from_pyramid.data)
+    for trace, pyramid_trace in zip(resampled.data, from_pyramid.data):
+        assert trace.name == pyramid_trace.name
+        np.testing.assert_allclose(
+            pd.to_numeric(pd.Series(trace.x)).astype(float),
+            pd.to_numeric(pd.Series(pyramid_trace.x)).astype(float))
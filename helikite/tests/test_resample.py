@@ -0,0 +1,111 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.merge import MergedFrame  # noqa
+from processing.pyramid import Pyramid  # noqa
+from processing.resample import (  # noqa
+    grid_origin, resample_block, resample_merged
+)
+
+
+def test_resample_block():
+    index = pd.DatetimeIndex([
+        "2022-09-29 10:00:01", "2022-09-29 10:00:04", "2022-09-29 10:00:12",
+        "2022-09-29 10:00:31", None,
+    ])
+    df = pd.DataFrame({
+        "value": [1.0, 3.0, 5.0, 7.0, 9.0],
+        "comment": ["a", "b", "c", "d", "e"],
+        "count": pd.array([1, 2, 3, None, 5], dtype="Int64"),
+    }, index=index)
+
+    resampled = resample_block(df, 10, grid_origin(df.index))
+
+    # Bins without rows are dropped, and rows without a time are ignored
+    assert list(resampled.index) == list(pd.DatetimeIndex([
+        "2022-09-29 10:00:00", "2022-09-29 10:00:10", "2022-09-29 10:00:30"]))
+    assert list(resampled.columns) == ["value", "comment", "count"]
+    assert list(resampled["value"]) == [2.0, 5.0, 7.0]
+    assert list(resampled["comment"]) == ["a", "c", "d"]
+    assert resampled["count"].iloc[0] == 1.5
+    assert pd.isna(resampled["count"].iloc[2])
+
+
+def test_resample_before_merge_matches_resampling_merged_data():
+    ''' Sub-second timestamps of one instrument do not grow the index '''
+
+    rng = np.random.default_rng(0)
+    fast_index = pd.date_range("2022-09-29 23:59", periods=600, freq="1S")
+    fast = pd.DataFrame({"fc_a": rng.normal(size=600)}, index=fast_index)
+    pops_index = fast_index[::2] + pd.to_timedelta(
+        rng.uniform(0, 1, 300), unit="S")
+    pops = pd.DataFrame({"pops_b": rng.normal(size=300)}, index=pops_index)
+
+    merged = MergedFrame()
+    merged.add("fc", fast)
+    merged.add("pops", pops)
+
+    resampled = resample_merged(merged, 10).to_dense()
+
+    assert len(merged.union_index()) == 900
+    assert len(resampled) == 60
+    expected = merged.to_dense().resample("10S").mean()
+    pd.testing.assert_frame_equal(resampled, expected, check_freq=False)
+
+    # Only the blocks with the requested columns are resampled
+    assert list(resample_merged(merged, 10, ["pops_b"]).blocks) == ["pops"]
+
+
+def test_circular_mean_weighted_by_speed():
+    index = pd.date_range("2022-09-29 10:00:00", periods=6, freq="5S")
+    df = pd.DataFrame({
+        "st_Wind (degrees)": [350.0, 10.0, 90.0, 180.0, 0.0, 45.0],
+        "st_Wind (m/s)": [2.0, 2.0, 3.0, 1.0, 0.0, np.nan],
+    }, index=index)
+    circular = {"st_Wind (degrees)": "st_Wind (m/s)"}
+
+    resampled = resample_block(df, 10, grid_origin(df.index), circular)
+
+    direction = resampled["st_Wind (degrees)"]
+    # Across north, not the arithmetic mean of 180
+    assert min(direction.iloc[0], 360 - direction.iloc[0]) < 1e-9
+    # The stronger wind weighs more: atan2(3, -1)
+    assert np.isclose(direction.iloc[1], np.degrees(np.arctan2(3, -1)))
+    # Calm or without speed, the direction is undefined
+    assert pd.isna(direction.iloc[2])
+    # The speed is still the arithmetic mean
+    assert list(resampled["st_Wind (m/s)"].iloc[:2]) == [2.0, 2.0]
+
+    # The weight columns are used even if only the angles are resampled
+    merged = MergedFrame()
+    merged.add("st", df)
+    resampled_merged = resample_merged(
+        merged, 10, ["st_Wind (degrees)"], circular).to_dense()
+    assert list(resampled_merged.columns) == ["st_Wind (degrees)"]
+    pd.testing.assert_series_equal(
+        resampled_merged["st_Wind (degrees)"], direction)
+
+
+def test_pyramid_circular_mean_matches_resampling():
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2022-09-29 10:00:00", periods=1200, freq="1S")
+    df = pd.DataFrame({
+        "st_Wind (degrees)": rng.uniform(300, 420, 1200) % 360,
+        "st_Wind (m/s)": rng.uniform(0.5, 5, 1200),
+    }, index=index)
+    circular = {"st_Wind (degrees)": "st_Wind (m/s)"}
+    merged = MergedFrame()
+    merged.add("st", df)
+
+    pyramid = Pyramid.build(merged, [10, 60], circular=circular)
+
+    for seconds in [60, 120]:
+        expected = resample_block(
+            df, seconds, grid_origin(df.index), circular)["st_Wind (degrees)"]
+        aggregated = pyramid.aggregate(
+            seconds, columns=["st_Wind (degrees)"])["st_Wind (degrees)"]
+        np.testing.assert_allclose(aggregated, expected)
@@ -0,0 +1,80 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.scans import ScanIndex  # noqa
+
+
+@pytest.fixture
+def scans():
+    # Three scans of a minute, with a gap of 30 s before the last one
+    starts = pd.DatetimeIndex([
+        "2022-09-29 10:00:00", "2022-09-29 10:01:00", "2022-09-29 10:02:30"])
+    ends = pd.DatetimeIndex([
+        "2022-09-29 10:01:00", "2022-09-29 10:02:00", "2022-09-29 10:03:30"])
+
+    return ScanIndex(starts, ends, name="msems_inverted")
+
+
+def test_scan_at_matches_interval_index(scans):
+    rng = np.random.default_rng(0)
+    times = pd.Timestamp("2022-09-29 09:59:00") + pd.to_timedelta(
+        rng.integers(0, 300, 500), unit="s")
+    times = pd.DatetimeIndex(list(times) + [pd.NaT])
+
+    expected = scans.intervals.get_indexer(times)
+    assert list(scans.scan_at(times)) == list(expected)
+
+    # Starts are in the scan, ends and gaps are not
+    assert list(scans.scan_at(pd.DatetimeIndex([
+        "2022-09-29 10:01:00", "2022-09-29 10:02:00", "2022-09-29 10:02:15",
+        "2022-09-29 10:03:30"]))) == [1, -1, -1, -1]
+
+
+def test_overlapping(scans):
+    assert scans.overlapping(
+        "2022-09-29 10:00:30", "2022-09-29 10:01:10") == slice(0, 2)
+    assert scans.overlapping(
+        "2022-09-29 10:02:05", "2022-09-29 10:02:20") == slice(2, 2)
+    assert scans.overlapping(
+        "2022-09-29 10:01:00", "2022-09-29 10:04:00") == slice(1, 3)
+    assert scans.overlapping(
+        "2022-09-29 11:00:00", "2022-09-29 12:00:00") == slice(3, 3)
+
+
+def test_attach_and_aggregate(scans):
+    index = pd.date_range("2022-09-29 09:59:50", periods=25, freq="10S")
+    df = pd.DataFrame({
+        "a": np.arange(25, dtype=float),
+        "b": ["x"] * 25,
+    }, index=index)
+
+    attached = scans.attach(df)
+    assert "scan" not in df.columns
+    assert attached["scan"].dtype == "Int64"
+    assert attached["scan"].isna().sum() == 1 + 3 + 3
+    assert list(attached["scan"].dropna().unique()) == [0, 1, 2]
+
+    means = scans.aggregate(df)
+    assert list(means.index) == list(scans.starts)
+    assert list(means.columns) == ["a"]
+    assert list(means["a"]) == [3.5, 9.5, 18.5]
+
+
+def test_from_starts():
+    starts = pd.DatetimeIndex([
+        "2022-09-29 10:00:00", "2022-09-29 10:01:00", None,
+        "2022-09-29 10:02:00", "2022-09-29 10:04:00"])
+
+    scans = ScanIndex.from_starts(starts)
+    assert len(scans) == 4
+    assert list(scans.ends) == list(pd.DatetimeIndex([
+        "2022-09-29 10:01:00", "2022-09-29 10:02:00", "2022-09-29 10:04:00",
+        "2022-09-29 10:05:00"]))
+
+    with pytest.raises(ValueError, match="must not overlap"):
+        ScanIndex(starts[[1, 0]], starts[[1, 0]])
@@ -0,0 +1,96 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.merge import MergedFrame  # noqa
+from processing.segments import (  # noqa
+    FLIGHT_PHASES, flight_segments, merge_short_runs, phase_at, select_phases
+)
+
+
+@pytest.fixture
+def altitude():
+    ''' On the ground, up to 400 m, a hover, down and on the ground again '''
+
+    rng = np.random.default_rng(0)
+    heights = np.concatenate([
+        np.zeros(300),
+        np.linspace(0, 400, 400),
+        np.full(300, 400.0),
+        np.linspace(400, 0, 400),
+        np.zeros(300),
+    ])
+    # A gust lifts the kite by 10 m for 20 s during the hover
+    heights[850:870] += np.linspace(0, 10, 20)
+    index = pd.date_range("2022-09-29 10:00:00", periods=len(heights),
+                          freq="1S")
+
+    return pd.Series(250 + heights + rng.normal(0, 0.5, len(heights)),
+                     index=index)
+
+
+def test_flight_segments(altitude):
+    segments = flight_segments(altitude)
+
+    assert list(segments.columns) == ["start", "end", "phase"]
+    assert list(segments["phase"]) == [
+        "ground", "ascent", "hover", "descent", "ground"]
+
+    # The boundaries are within the smoothing of the true changes
+    expected = pd.to_datetime([
+        "2022-09-29 10:05:00", "2022-09-29 10:11:40", "2022-09-29 10:16:40",
+        "2022-09-29 10:23:20"])
+    errors = (segments["start"][1:].to_numpy() - expected.to_numpy())
+    assert np.all(np.abs(errors) <= np.timedelta64(30, "s"))
+
+    # The segments follow each other and cover the whole flight
+    assert (segments["start"][1:].to_numpy()
+            == segments["end"][:-1].to_numpy()).all()
+    assert segments["start"].iloc[0] == altitude.index[0]
+    assert segments["end"].iloc[-1] > altitude.index[-1]
+
+
+def test_merge_short_runs():
+    codes = np.array([0, 0, 0, 1, 0, 0, 2, 2, 2, 2], dtype=np.int8)
+    times = np.arange(10) * 10 ** 9
+
+    merged = merge_short_runs(codes, times, min_seconds=2)
+    assert list(merged) == [0, 0, 0, 0, 0, 0, 2, 2, 2, 2]
+
+    # A short run at the start takes the phase of the first long run
+    codes = np.array([3, 1, 1, 1], dtype=np.int8)
+    assert list(merge_short_runs(codes, np.arange(4) * 10 ** 9, 2)) == [
+        1, 1, 1, 1]
+
+
+def test_select_phases(altitude):
+    segments = flight_segments(altitude)
+
+    # Another instrument at its own rate
+    index = pd.date_range("2022-09-29 10:00:00.5", periods=1000, freq="1700ms")
+    df = pd.DataFrame({"conc": np.arange(1000)}, index=index)
+
+    phases = phase_at(segments, df.index)
+    ascent = select_phases(df, segments, ["ascent"])
+    assert list(ascent["conc"]) == list(
+        df["conc"][phases == FLIGHT_PHASES.index("ascent")])
+
+    merged = MergedFrame()
+    merged.add("fc", altitude.to_frame("fc_Altitude"))
+    merged.add("pops", df)
+    selected = select_phases(merged, segments, ["ascent", "descent"])
+    assert list(selected.blocks) == ["fc", "pops"]
+    assert len(selected.blocks["pops"]) == np.isin(
+        phases, [FLIGHT_PHASES.index("ascent"),
+                 FLIGHT_PHASES.index("descent")]).sum()
+    assert selected.blocks["fc"].index.is_monotonic_increasing
+
+    # The rows outside the flight are in no phase
+    assert phase_at(segments, pd.DatetimeIndex(["2022-09-29 09:00"]))[0] == -1
+
+    with pytest.raises(ValueError, match="Options are"):
+        select_phases(df, segments, ["cruise"])
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.merge import MergedFrame  # noqa
+from server import QuicklookServer, downsample  # noqa
+import instruments  # noqa
+
+
+@pytest.fixture
+def quicklook():
+    ''' A 10 hour flight computer record at 1 Hz, and a slower instrument '''
+
+    index = pd.date_range("2022-09-29 10:00", periods=36000, freq="1S")
+    fc = pd.DataFrame({
+        "flight_computer_Altitude": np.arange(len(index), dtype=float),
+        "flight_computer_P_baro": np.linspace(1000, 900, len(index)),
+        "flight_computer_housekeeping_pressure": 1000.0,
+    }, index=index)
+    pops = pd.DataFrame({
+        "pops_P": np.linspace(1001, 901, len(index) // 10),
+        "pops_housekeeping_pressure": 1001.0,
+    }, index=index[::10] + pd.Timedelta(milliseconds=500))
+
+    merged = MergedFrame()
+    merged.add(instruments.flight_computer.name, fc)
+    merged.add(instruments.pops.name, pops)
+
+    return QuicklookServer(
+        merged, [instruments.flight_computer, instruments.pops],
+        {'altitude_ground_level': False}, max_points=1000)
+
+
+def test_downsample():
+    index = pd.date_range("2022-09-29", periods=100, freq="1S")
+    df = pd.DataFrame({"a": np.arange(100.0)}, index=index)
+
+    same, bin_width = downsample(df, max_points=100)
+    assert bin_width is None
+    pd.testing.assert_frame_equal(same, df)
+
+    resampled, bin_width = downsample(df, max_points=10)
+    assert len(resampled) <= 11
+    assert bin_width == pd.Timedelta(seconds=9.9)
+    assert resampled["a"].iloc[0] == df["a"].iloc[:10].mean()
+
+
+def test_data_resolution_depends_on_range(quicklook):
+    assert list(quicklook.figures) == [
+        'altitude', 'pressure', 'housekeeping-pressure']
+    assert quicklook.figures['pressure'][1] == [
+        "flight_computer_P_baro", "pops_P"]
+
+    # The whole flight is averaged to at most max_points
+    data = quicklook.data('pressure')
+    assert data['bin_seconds'] is not None
+    assert 900 < len(data['x']) <= 1001
+    assert len(data['y']) == 2 and len(data['y'][0]) == len(data['x'])
+
+    # A range of a few minutes is sent at full resolution, with the missing
+    # values of the slower instrument as None
+    data = quicklook.data('pressure', pd.Timestamp("2022-09-29 11:00"),
+                          pd.Timestamp("2022-09-29 11:05"))
+    assert data['bin_seconds'] is None
+    assert len(data['x']) == 300 + 30
+    assert data['x'][0] == "2022-09-29 11:00:00.000"
+    assert data['y'][1][0] is None and data['y'][1][1] is not None
+
+    with pytest.raises(KeyError):
+        quicklook.data('missing')
+
+
+def test_server_requests(quicklook):
+    server = quicklook.make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/") as response:
+            page = response.read().decode()
+        for name in quicklook.figures:
+            assert f'id="{name}"' in page
+
+        with urllib.request.urlopen(
+            f"{url}/data?figure=altitude&start=2022-09-29+10:00:00"
+            "&end=2022-09-29+10:00:10"
+        ) as response:
+            data = json.loads(response.read())
+        assert data['y'] == [[float(i) for i in range(10)]]
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/data?figure=altitude&start=x")
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
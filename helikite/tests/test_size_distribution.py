@@ -0,0 +1,107 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.size_distribution import (  # noqa
+    MOMENT_COLUMNS, SizeDistribution
+)
+from instruments import msems_scan, pops  # noqa
+
+
+def example_distribution() -> SizeDistribution:
+    df = pd.DataFrame(
+        {'bin1': [1.0, 2.0, np.nan, 4.0],
+         'bin2': [10.0, 20.0, 30.0, 40.0]},
+        index=pd.date_range("2022-09-29 10:00:00", periods=4, freq='1min'))
+
+    return SizeDistribution.from_columns(
+        df, ['bin1', 'bin2'], bin_limits=np.array([10.0, 40.0, 160.0]))
+
+
+def test_size_distribution_reductions():
+    sd = example_distribution()
+
+    assert sd.data.shape == (4, 2)
+    np.testing.assert_allclose(sd.bin_centres, [20.0, 80.0])
+
+    # A missing bin makes the total of that row missing
+    np.testing.assert_allclose(sd.total(), [11.0, 22.0, np.nan, 44.0])
+
+    # Windows include both ends, means ignore missing values
+    window = sd.window("2022-09-29 10:01:00", "2022-09-29 10:02:00")
+    assert len(window) == 2
+    np.testing.assert_allclose(
+        sd.mean("2022-09-29 10:01:00", "2022-09-29 10:02:00"), [2.0, 25.0])
+
+
+def test_size_distribution_validates_limits():
+    with pytest.raises(ValueError):
+        SizeDistribution(np.zeros((2, 3)), pd.date_range("2022", periods=2),
+                         bin_limits=np.array([1.0, 2.0, 3.0]))
+
+
+def test_msems_scan_size_distribution(campaign_file_paths_and_instruments):
+    ''' Scan bins are log-spaced between the limits given in the header '''
+
+    df = msems_scan.set_time_as_index(msems_scan.read_data())
+    sd = msems_scan.build_size_distribution(df)
+
+    assert sd.bins == 60
+    assert len(sd) == len(df)
+    assert sd.bin_limits[0] == pytest.approx(8)
+    assert sd.bin_limits[-1] == pytest.approx(270)
+
+
+def test_size_distribution_moments():
+    ''' One particle per cm3 of 1 um has a known surface and volume '''
+
+    sd = SizeDistribution(
+        np.array([[1.0], [2.0], [np.nan]]),
+        pd.date_range("2022-09-29", periods=3, freq='1S'),
+        bin_limits=np.array([100.0, 10000.0]),
+    )
+    moments = sd.moments()
+
+    np.testing.assert_allclose(moments['N_total'], [1.0, 2.0, np.nan])
+    np.testing.assert_allclose(moments['S_total'], [np.pi, 2 * np.pi, np.nan])
+    np.testing.assert_allclose(moments['V_total'],
+                               [np.pi / 6, np.pi / 3, np.nan])
+
+    # The bin spans two decades of diameter
+    np.testing.assert_allclose(sd.dndlogdp()[:, 0], [0.5, 1.0, np.nan])
+
+
+def test_pops_products_keep_bins_out_of_the_data(
+    campaign_file_paths_and_instruments, monkeypatch
+):
+    ''' Only the totals are added as columns, dN/dlogDp is kept apart '''
+
+    monkeypatch.setattr(pops, 'bin_limits', np.geomspace(140, 3000, 17))
+    monkeypatch.setattr(pops, 'cols_export', pops.cols_export)
+    monkeypatch.setattr(pops, 'size_distribution', None)
+
+    df = pops.set_time_as_index(pops.read_data())
+    df = pops.data_corrections(df)
+
+    # The bins b3 -> b15 divided by the mean flow, up to the order of the sum
+    expected = (df['b3'] + df['b4'] + df['b5'] + df['b6'] + df['b7']
+                + df['b8'] + df['b9'] + df['b10'] + df['b11'] + df['b12']
+                + df['b13'] + df['b14'] + df['b15']) / df['POPS_Flow'].mean()
+    pd.testing.assert_series_equal(df['PartCon_186'], expected,
+                                   check_names=False, check_exact=False,
+                                   rtol=1e-12)
+
+    columns = list(df.columns)
+    pops.size_distribution = pops.build_size_distribution(df)
+    df = pops.add_size_distribution_products(df)
+
+    assert list(df.columns) == columns + MOMENT_COLUMNS
+    dndlogdp = pops.dndlogdp_dataframe()
+    assert list(dndlogdp.columns) == [f"dNdlogDp{i}" for i in range(1, 17)]
+    np.testing.assert_allclose(dndlogdp.to_numpy(),
+                               pops.size_distribution.dndlogdp())
+    assert msems_scan.dndlogdp_dataframe() is None
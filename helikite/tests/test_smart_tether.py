@@ -1,3 +1,4 @@
+import datetime
 import pandas as pd
 import os
 import sys
@@ -19,3 +20,25 @@ def test_set_time_as_index(st_data_fake_midnight):
     assert df.iloc[1].name == pd.to_datetime("2022-09-29 23:59:59")
     assert df.iloc[2].name == pd.to_datetime("2022-09-30 00:00:01")
     assert df.iloc[3].name == pd.to_datetime("2022-09-30 00:00:02")
+
+
+def test_small_step_back_is_not_midnight(monkeypatch):
+    ''' A time a second earlier than the last is clock jitter, not a day '''
+
+    monkeypatch.setattr(smart_tether, 'date',
+                        datetime.datetime(2022, 9, 29), raising=False)
+    times = ["23:59:57", "23:59:59", "23:59:58", "00:00:01", "00:00:00"]
+    expected = pd.to_datetime([
+        "2022-09-29 23:59:57", "2022-09-29 23:59:59", "2022-09-29 23:59:58",
+        "2022-09-30 00:00:01", "2022-09-30 00:00:00"])
+
+    df = smart_tether.set_time_as_index(pd.DataFrame({'Time': times}))
+    assert list(df.index) == list(expected)
+
+    # The same when the step back is at the start of a chunk of a file
+    state = {}
+    first = smart_tether.set_time_as_index_chunk(
+        pd.DataFrame({'Time': times[:2]}), state)
+    second = smart_tether.set_time_as_index_chunk(
+        pd.DataFrame({'Time': times[2:]}), state)
+    assert list(first.index) + list(second.index) == list(expected)
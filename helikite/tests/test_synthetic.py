@@ -0,0 +1,120 @@
+import datetime
+import os
+import sys
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from synthetic import SyntheticCampaign, write_campaign  # noqa
+import instruments  # noqa
+
+
+def all_instruments():
+    return [obj for obj in instruments.__dict__.values()
+            if isinstance(obj, instruments.Instrument)]
+
+
+def test_files_identified_and_read(tmp_path):
+    ''' Each file is identified by only its own instrument and can be read '''
+
+    campaign = SyntheticCampaign(duration_seconds=1200, msems_bins=30)
+    config = write_campaign(str(tmp_path), campaign)
+
+    assert len(config['instruments']) == len(campaign.writers)
+
+    for props in config['instruments'].values():
+        instrument = getattr(instruments, props['config'])
+
+        with open(props['file']) as in_file:
+            header_lines = [line for _, line in zip(range(50), in_file)]
+
+        matches = []
+        for other in all_instruments():
+            try:
+                if other.file_identifier(header_lines):
+                    matches.append(other.name)
+            except IndexError:
+                # Files shorter than the lines the identifier looks at
+                pass
+        assert matches == [instrument.name]
+
+        instrument.filename = props['file']
+        instrument.date = props['date']
+        df = instrument.set_time_as_index(instrument.read_data())
+
+        assert isinstance(df.index, pd.DatetimeIndex), instrument.name
+        assert df.index.is_monotonic_increasing, instrument.name
+        assert df.index[0] >= campaign.start, instrument.name
+        assert df.index[-1] < (
+            campaign.start + pd.Timedelta(seconds=1201)), instrument.name
+
+
+def test_smart_tether_passes_midnights(tmp_path):
+    campaign = SyntheticCampaign(
+        start=datetime.datetime(2022, 9, 29, 22),
+        duration_seconds=28 * 3600,
+        sampling_seconds=30,
+    )
+    files = campaign.write_all(
+        str(tmp_path), [instruments.smart_tether.name])
+
+    instruments.smart_tether.filename = files[instruments.smart_tether.name]
+    instruments.smart_tether.date = datetime.datetime(2022, 9, 29)
+    df = instruments.smart_tether.set_time_as_index(
+        instruments.smart_tether.read_data())
+
+    assert df.index.is_monotonic_increasing
+    assert df.index[0] == pd.Timestamp("2022-09-29 22:00:00")
+    assert df.index[-1] == pd.Timestamp("2022-10-01 01:59:00")
+
+
+def test_same_seed_same_files(tmp_path):
+    for folder in ["a", "b"]:
+        SyntheticCampaign(duration_seconds=300, seed=1).write_all(
+            str(tmp_path / folder), [instruments.pops.name])
+
+    filename = SyntheticCampaign().filename(instruments.pops.name)
+    assert ((tmp_path / "a" / filename).read_text()
+            == (tmp_path / "b" / filename).read_text())
+
+
+def test_sub_second_sampling(tmp_path):
+    ''' Instruments with fractional times sample faster than once a second,
+    the others at whole seconds '''
+
+    campaign = SyntheticCampaign(duration_seconds=60, sampling_seconds=0.25)
+    config = write_campaign(
+        str(tmp_path), campaign,
+        [instruments.pops.name, instruments.pico.name,
+         instruments.msems_readings.name])
+
+    rows = {}
+    for props in config['instruments'].values():
+        instrument = getattr(instruments, props['config'])
+        instrument.filename = props['file']
+        df = instrument.set_time_as_index(instrument.read_data())
+        assert df.index.is_monotonic_increasing, instrument.name
+        rows[instrument.name] = len(df)
+
+    assert rows[instruments.pops.name] == 240
+    assert rows[instruments.pico.name] == 240
+    assert rows[instruments.msems_readings.name] == 60
+
+
+def test_flight_computer_header_repeats(tmp_path):
+    from instruments.flight_computer import CSV_HEADER  # noqa
+
+    campaign = SyntheticCampaign(duration_seconds=1200,
+                                 header_repeat_seconds=300, chunk_seconds=500)
+    files = campaign.write_all(
+        str(tmp_path), [instruments.flight_computer.name])
+    filename = files[instruments.flight_computer.name]
+
+    with open(filename) as in_file:
+        assert in_file.read().count(CSV_HEADER) == 4
+
+    instruments.flight_computer.filename = filename
+    df = instruments.flight_computer.set_time_as_index(
+        instruments.flight_computer.read_data())
+    assert len(df) == 1200
+    assert df.index.is_monotonic_increasing
@@ -0,0 +1,98 @@
+import datetime
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.tail import TailReader  # noqa
+from synthetic import SyntheticCampaign, write_campaign  # noqa
+import instruments  # noqa
+
+
+def write_in_parts(filename, data, reader, parts=7, seed=0):
+    ''' Write data to the file in parts split at arbitrary bytes, reading
+    the new rows after each part '''
+
+    splits = np.sort(np.random.default_rng(seed).choice(
+        np.arange(1, len(data)), parts - 1, replace=False))
+    with open(filename, 'wb') as out_file:
+        for start, end in zip([0, *splits], [*splits, len(data)]):
+            out_file.write(data[start:end])
+            out_file.flush()
+            reader.read_new()
+
+
+def assert_same_as_read_data(instrument, filename):
+    with open(filename, 'rb') as in_file:
+        data = in_file.read()
+
+    reader = TailReader(instrument)
+    write_in_parts(filename, data, reader)
+    assert reader.read_new() is None
+
+    expected = instrument.set_time_as_index(instrument.read_data())
+    pd.testing.assert_frame_equal(reader.df, expected)
+
+
+def test_tail_reader_matches_read_data(tmp_path):
+    config = write_campaign(
+        str(tmp_path), SyntheticCampaign(duration_seconds=1200, msems_bins=30))
+
+    for props in config['instruments'].values():
+        instrument = getattr(instruments, props['config'])
+        instrument.add_config(props)
+        assert_same_as_read_data(instrument, props['file'])
+
+
+def test_tail_reader_smart_tether_passes_midnights(tmp_path):
+    campaign = SyntheticCampaign(
+        start=datetime.datetime(2022, 9, 29, 22),
+        duration_seconds=28 * 3600,
+        sampling_seconds=30,
+    )
+    files = campaign.write_all(
+        str(tmp_path), [instruments.smart_tether.name])
+
+    instruments.smart_tether.filename = files[instruments.smart_tether.name]
+    instruments.smart_tether.date = datetime.datetime(2022, 9, 29)
+    assert_same_as_read_data(
+        instruments.smart_tether, instruments.smart_tether.filename)
+
+
+def test_tail_reader_flight_computer_repeated_header(tmp_path):
+    files = SyntheticCampaign(duration_seconds=600).write_all(
+        str(tmp_path), [instruments.flight_computer.name])
+    filename = files[instruments.flight_computer.name]
+
+    # The flight computer restarts and writes its header again
+    with open(filename) as in_file:
+        lines = in_file.readlines()
+    lines.insert(len(lines) // 2, lines[0])
+    with open(filename, 'w') as out_file:
+        out_file.writelines(lines)
+
+    instruments.flight_computer.filename = filename
+    assert_same_as_read_data(instruments.flight_computer, filename)
+
+
+def test_tail_reader_restarts_on_replaced_file(tmp_path):
+    files = SyntheticCampaign(duration_seconds=600).write_all(
+        str(tmp_path), [instruments.pops.name])
+    filename = files[instruments.pops.name]
+    instruments.pops.filename = filename
+
+    reader = TailReader(instruments.pops)
+    assert len(reader.read_new()) > 0
+    assert reader.read_new() is None
+
+    # A shorter file is read again from the start
+    with open(filename) as in_file:
+        lines = in_file.readlines()
+    with open(filename, 'w') as out_file:
+        out_file.writelines(lines[:len(lines) // 2])
+
+    df = reader.read_new()
+    pd.testing.assert_frame_equal(
+        df, instruments.pops.set_time_as_index(instruments.pops.read_data()))
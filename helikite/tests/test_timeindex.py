@@ -0,0 +1,88 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from processing.timeindex import (  # noqa
+    is_sorted, time_range_positions, validate_time_index
+)
+
+
+def test_validate_time_index_sorts_once(caplog):
+    index = pd.DatetimeIndex([
+        "2022-09-29 10:00:02", None, "2022-09-29 10:00:00",
+        "2022-09-29 10:00:01", "2022-09-29 10:00:01"])
+    df = pd.DataFrame({"a": range(5)}, index=index)
+
+    validated = validate_time_index(df, "test")
+
+    assert list(validated["a"]) == [2, 3, 4, 0]
+    assert is_sorted(validated.index)
+    assert not validated.index.hasnans
+    assert "1 duplicate timestamps" in caplog.text
+    assert "Dropping 1 rows without a time" in caplog.text
+    assert "1 timestamps out of order" in caplog.text
+
+    # A sorted index is returned as it is
+    assert validate_time_index(validated, "test") is validated
+
+
+@pytest.mark.parametrize("inclusive", ["both", "neither", "left", "right"])
+def test_time_range_positions_match_masks(inclusive):
+    rng = np.random.default_rng(0)
+    times = pd.Timestamp("2022-09-29 10:00:00") + pd.to_timedelta(
+        np.sort(rng.integers(0, 100, 200)), unit="s")
+    index = pd.DatetimeIndex(list(times) + [pd.NaT, pd.NaT])
+    start = pd.Timestamp("2022-09-29 10:00:20")
+    end = pd.Timestamp("2022-09-29 10:01:10")
+
+    rows = time_range_positions(index, start, end, inclusive)
+    assert isinstance(rows, slice)
+
+    expected = np.flatnonzero(index.to_series().between(start, end, inclusive))
+    assert list(range(len(index))[rows]) == list(expected)
+
+    # The same rows when the times are not sorted
+    shuffled = index[rng.permutation(len(index))]
+    rows = time_range_positions(shuffled, start, end, inclusive)
+    expected = np.flatnonzero(
+        shuffled.to_series().between(start, end, inclusive))
+    assert list(rows) == list(expected)
+
+    # Open ends select to the first or last time
+    rows = time_range_positions(index, None, None, inclusive)
+    assert rows == slice(0, 200)
+
+
+def test_duplicate_policies():
+    index = pd.DatetimeIndex([
+        "2022-09-29 10:00:00", "2022-09-29 10:00:01", "2022-09-29 10:00:01",
+        "2022-09-29 10:00:02", None])
+    df = pd.DataFrame({
+        "a": pd.array([1, 2, 4, 5, 6], dtype="Int64"),
+        "b": ["x", "y", "z", "w", "v"],
+    }, index=index)
+
+    assert list(validate_time_index(df, "test", "keep")["b"]) == [
+        "x", "y", "z", "w"]
+    timed = df.iloc[:4]
+    assert validate_time_index(timed, "test", "keep") is timed
+
+    first = validate_time_index(df, "test", "first")
+    assert list(first["b"]) == ["x", "y", "w"]
+    last = validate_time_index(df, "test", "last")
+    assert list(last["b"]) == ["x", "z", "w"]
+
+    mean = validate_time_index(df, "test", "mean")
+    assert list(mean.columns) == ["a", "b"]
+    assert list(mean["a"]) == [1, 3, 5]
+    assert list(mean["b"]) == ["x", "y", "w"]
+    assert mean.index.is_unique
+
+    with pytest.raises(ValueError, match="1 duplicate timestamps"):
+        validate_time_index(df, "test", "error")
+    with pytest.raises(ValueError, match="Options are"):
+        validate_time_index(df.iloc[:2], "test", "median")
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import shutil
+import sys
+import pandas as pd
+
+# Append the root directory of your project to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from constants import constants  # noqa
+from synthetic import SyntheticCampaign, write_campaign  # noqa
+from processing.pipeline import process_instrument  # noqa
+from watch import Watcher  # noqa
+import watch  # noqa
+import instruments  # noqa
+
+
+def test_watch_processes_new_and_grown_files(tmp_path):
+    names = [instruments.flight_computer.name, instruments.pops.name,
+             instruments.msems_inverted.name, instruments.msems_scan.name]
+    config = write_campaign(str(tmp_path / "campaign"),
+                            SyntheticCampaign(duration_seconds=1200,
+                                              msems_bins=30),
+                            names)
+
+    # The files are found and identified by the watcher
+    files = {props['config']: props['file']
+             for props in config['instruments'].values()}
+    for props in config['instruments'].values():
+        props['file'] = None
+        props['date'] = None
+
+    # Start with the first half of the flight computer file
+    input_folder = tmp_path / "inputs"
+    input_folder.mkdir()
+    with open(files['flight_computer']) as in_file:
+        lines = in_file.readlines()
+    fc_filename = input_folder / os.path.basename(files['flight_computer'])
+    fc_filename.write_text("".join(lines[:len(lines) // 2]))
+
+    watcher = Watcher(config, output_path=str(tmp_path / "outputs"),
+                      input_folder=str(input_folder), interval=0)
+
+    assert watcher.step() == {instruments.flight_computer.name}
+    rows = len(watcher.frames[instruments.flight_computer.name][0])
+    quicklook = os.path.join(watcher.output_path_with_time,
+                             constants.QUICKLOOK_PLOT_FILENAME)
+    assert os.path.exists(quicklook)
+
+    # The flight computer file grows and the other instruments start
+    fc_filename.write_text("".join(lines[:3 * len(lines) // 4]))
+    for name in ['pops', 'msems_inverted', 'msems_scan']:
+        shutil.copy(files[name], input_folder)
+
+    assert watcher.step() == set(names)
+    assert len(watcher.frames[instruments.flight_computer.name][0]) > rows
+    assert watcher.step() == set()
+
+    # Only the figures of the changed instruments are rebuilt
+    grid = watcher.figure_cache.get("grid")
+    heatmaps = watcher.figure_cache.get("heatmaps")
+    with open(fc_filename, 'a') as out_file:
+        out_file.write("".join(lines[3 * len(lines) // 4:]))
+    asyncio.run(watcher.run(max_steps=1))
+
+    assert grid is not None and heatmaps is not None
+    assert watcher.figure_cache.get("grid") is not grid
+    assert watcher.figure_cache.get("heatmaps") is heatmaps
+
+    # Touching a file without new rows does not process it again
+    os.utime(fc_filename, ns=(0, 0))
+    assert watcher.step() == set()
+
+
+def test_watch_corrects_only_new_rows(tmp_path, monkeypatch):
+    ''' Rows appended to the file are corrected alone and appended '''
+
+    names = [instruments.flight_computer.name, instruments.smart_tether.name]
+    config = write_campaign(str(tmp_path / "campaign"),
+                            SyntheticCampaign(duration_seconds=1200), names)
+    # With the ground station given, the flight computer rows are corrected
+    # without the mean of the first seconds
+    config['ground_station'].update({'pressure': 1000, 'temperature': 12})
+
+    files = {}
+    input_folder = tmp_path / "inputs"
+    input_folder.mkdir()
+    for key, props in config['instruments'].items():
+        with open(props['file']) as in_file:
+            files[key] = in_file.readlines()
+        props['file'] = str(input_folder / os.path.basename(props['file']))
+        with open(props['file'], 'w') as out_file:
+            out_file.write("".join(files[key][:len(files[key]) // 2]))
+
+    processed = []
+
+    def recording_process_instrument(instrument, *args, df=None, **kwargs):
+        processed.append((instrument.name, len(df)))
+        return process_instrument(instrument, *args, df=df, **kwargs)
+
+    monkeypatch.setattr(watch, 'process_instrument',
+                        recording_process_instrument)
+
+    watcher = Watcher(config, output_path=str(tmp_path / "outputs"),
+                      input_folder=str(input_folder), interval=0)
+    assert watcher.step() == set(names)
+
+    for key, props in config['instruments'].items():
+        with open(props['file'], 'a') as out_file:
+            out_file.write("".join(files[key][len(files[key]) // 2:]))
+    processed.clear()
+    assert watcher.step() == set(names)
+
+    for key, props in config['instruments'].items():
+        instrument = getattr(instruments, props['config'])
+        expected = instrument.add_device_name_to_columns(process_instrument(
+            instrument, config['ground_station'],
+            watcher.time_trim_start, watcher.time_trim_end))
+        df = watcher.frames[instrument.name][0]
+
+        # Only the second half of the rows was corrected
+        assert dict(processed)[instrument.name] < len(expected) * 0.6
+        pd.testing.assert_frame_equal(df, expected, check_freq=False)
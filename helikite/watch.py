@@ -0,0 +1,326 @@
+''' Live processing of the input folder during a flight
+
+The watch command scans the input folder every few seconds while the
+instrument files are still being written. New files are assigned to the
+instruments that have no file yet with their file_identifier(), and the
+instruments whose files have grown are processed again, parsing only the
+lines appended since the last scan (see processing.tail.TailReader). Only
+those new rows are corrected and appended to the rows corrected before,
+unless the instrument's corrections depend on all of its rows (see
+Instrument.corrects_rows_alone()). The figures are then refreshed into a
+timestamped folder in the outputs, rebuilding and rewriting only the figures
+that depend on the changed instruments (see plots.FigureCache).
+'''
+
+import asyncio
+import datetime
+import logging
+import os
+import time
+import pandas as pd
+from typing import Any, Dict, List, Set, Tuple
+from constants import constants
+from processing import sorting
+from processing.instrumentation import StageRecorder
+from processing.merge import MergedFrame
+from processing.pipeline import process_instrument
+from processing.tail import TailReader
+import instruments
+import plots
+
+logger = logging.getLogger(__name__)
+logger.setLevel(constants.LOGLEVEL_CONSOLE)
+
+
+class Watcher:
+    ''' Processes the instrument files of a folder as they are written
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration as read from config.yaml. Instruments without a file
+        are assigned the first new file in the folder that they identify
+    output_path : str
+        Folder in which the timestamped output folder is created
+    input_folder : str
+        Folder to watch for new and changed files
+    interval : float
+        Seconds between two scans of the folder
+    '''
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        output_path: str = constants.OUTPUTS_FOLDER,
+        input_folder: str = constants.INPUTS_FOLDER,
+        interval: float = constants.WATCH_INTERVAL_SECONDS,
+    ) -> None:
+        self.config = config
+        self.input_folder = str(input_folder)
+        self.interval = interval
+        self.output_path_with_time = os.path.join(
+            output_path, datetime.datetime.utcnow().isoformat()
+        )
+
+        self.time_trim_start = pd.to_datetime(
+            config['global']['time_trim']['start'])
+        self.time_trim_end = pd.to_datetime(
+            config['global']['time_trim']['end'])
+
+        # Instruments by their key in the config, and the key of each file
+        self.instruments: Dict[str, instruments.Instrument] = {}
+        self.files: Dict[str, str] = {}
+        for key, props in config['instruments'].items():
+            instrument = getattr(instruments, props['config'])
+            instrument.add_config(props)
+            self.instruments[key] = instrument
+            if props['file'] is not None:
+                self.files[os.path.abspath(props['file'])] = key
+
+        # Reader of the growing file of each instrument, by its key
+        self.readers: Dict[str, TailReader] = {}
+
+        # Corrected dataframe of each instrument with its prefixed columns,
+        # by instrument name. New rows are appended to it
+        self.frames: Dict[
+            str, Tuple[pd.DataFrame, instruments.Instrument]] = {}
+        self.figure_cache = plots.FigureCache()
+
+        # Size and modification time of each file at the last scan
+        self._file_stats: Dict[str, Tuple[int, int]] = {}
+        self._stop = asyncio.Event()
+
+    def scan(self) -> List[str]:
+        ''' Paths of the files that are new or changed since the last scan '''
+
+        paths = set(self.files)
+        for filename in os.listdir(self.input_folder):
+            # Ignore any yaml or keep files
+            if filename.endswith('yaml') or filename.endswith('.keep'):
+                continue
+            paths.add(os.path.abspath(
+                os.path.join(self.input_folder, filename)))
+
+        changed = []
+        for path in sorted(paths):
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            file_stat = (stat.st_size, stat.st_mtime_ns)
+            if self._file_stats.get(path) != file_stat:
+                self._file_stats[path] = file_stat
+                changed.append(path)
+
+        return changed
+
+    def identify(
+        self,
+        path: str,
+    ) -> str | None:
+        ''' Assign a file to the instrument that identifies it
+
+        Only instruments without a file are considered. Returns the key of
+        the instrument in the config, or None if no single instrument
+        identifies the file (yet, as it may still be too short)
+        '''
+
+        try:
+            with open(path) as in_file:
+                header_lines = [
+                    line for _, line in zip(
+                        range(constants.QTY_LINES_TO_IDENTIFY_INSTRUMENT),
+                        in_file)
+                ]
+        except UnicodeDecodeError:
+            return None
+
+        assigned = set(self.files.values())
+        matches = []
+        for key, instrument in self.instruments.items():
+            if key in assigned:
+                continue
+            try:
+                if instrument.file_identifier(header_lines):
+                    matches.append(key)
+            except IndexError:
+                # Fewer lines than the identifier needs, retry once it grows
+                pass
+
+        if len(matches) > 1:
+            logger.warning(f"{path} matched too many instruments: "
+                           f"{', '.join(matches)}. Set its file in the config")
+        if len(matches) != 1:
+            return None
+
+        key = matches[0]
+        instrument = self.instruments[key]
+        props = self.config['instruments'][key]
+        props['file'] = path
+        props['date'] = instrument.date_extractor(header_lines)
+        instrument.add_config(props)
+        self.files[path] = key
+        logger.info(f"Watching {path} as {key}")
+
+        return key
+
+    def update(
+        self,
+        paths: List[str],
+        recorder: StageRecorder | None = None,
+    ) -> Set[str]:
+        ''' Process the instruments of the changed files
+
+        Returns the names of the instruments with new data
+        '''
+
+        ground_station = self.config['ground_station']
+        changed = set()
+        for path in paths:
+            key = self.files.get(path) or self.identify(path)
+            if key is None:
+                continue
+
+            instrument = self.instruments[key]
+            reader = self.readers.setdefault(key, TailReader(instrument))
+            previous = self.frames.get(instrument.name)
+            try:
+                new_rows = reader.read_new()
+                if new_rows is None:
+                    # No new complete rows yet
+                    continue
+
+                df = None
+                if (
+                    previous is not None
+                    and instrument.corrects_rows_alone(ground_station)
+                ):
+                    df = self.append_new_rows(
+                        instrument, previous[0], new_rows, recorder)
+                if df is None:
+                    # The corrections modify the dataframe, keep the read
+                    # rows
+                    df = process_instrument(
+                        instrument, ground_station,
+                        self.time_trim_start, self.time_trim_end,
+                        recorder=recorder, df=reader.df.copy(),
+                    )
+                    if df is not None:
+                        df = instrument.add_device_name_to_columns(df)
+            except Exception as e:
+                # Forget the state of the file to process it again at the
+                # next scan
+                logger.warning(f"Could not process {key} yet: {e}")
+                self._file_stats.pop(path, None)
+                continue
+
+            if df is None or (previous is not None and previous[0] is df):
+                continue
+
+            self.frames[instrument.name] = (df, instrument)
+            changed.add(instrument.name)
+
+        return changed
+
+    def append_new_rows(
+        self,
+        instrument: instruments.Instrument,
+        previous: pd.DataFrame,
+        new_rows: pd.DataFrame,
+        recorder: StageRecorder | None = None,
+    ) -> pd.DataFrame | None:
+        ''' Correct only the new rows and append them to the previous rows
+
+        Returns previous if none of the new rows are in the time range, and
+        None if the new rows start before the last previous row, as they
+        need to be sorted and checked for duplicates with all of the rows
+        '''
+
+        df = process_instrument(
+            instrument, self.config['ground_station'],
+            self.time_trim_start, self.time_trim_end,
+            recorder=recorder, df=new_rows.copy(),
+        )
+        if df is None:
+            return previous
+
+        if df.index.min() <= previous.index.max():
+            logger.info(f"{instrument.name}: New rows are not after the "
+                        "previous rows, processing all rows again")
+            return None
+
+        return pd.concat([previous, instrument.add_device_name_to_columns(df)])
+
+    def refresh(
+        self,
+        changed: Set[str],
+        recorder: StageRecorder | None = None,
+    ) -> None:
+        ''' Merge the instruments and refresh the changed figures '''
+
+        if instruments.flight_computer.name not in self.frames:
+            logger.info("Waiting for flight computer data to plot")
+            return
+
+        all_export_dfs = sorted(self.frames.values(),
+                                key=sorting.df_column_sort_key)
+        merged = MergedFrame()
+        for df, instrument in all_export_dfs:
+            merged.add(instrument.name, df)
+
+        self.figure_cache.invalidate(changed)
+        os.makedirs(self.output_path_with_time, exist_ok=True)
+        plots.campaign_2023(
+            merged, self.config['plots'],
+            [instrument for df, instrument in all_export_dfs],
+            self.output_path_with_time,
+            recorder=recorder, figure_cache=self.figure_cache,
+        )
+
+    def step(self) -> Set[str]:
+        ''' Process the changed files and refresh their figures, once
+
+        Returns the names of the instruments with new data
+        '''
+
+        start = time.perf_counter()
+        recorder = StageRecorder()
+        changed = self.update(self.scan(), recorder)
+        if changed:
+            self.refresh(changed, recorder)
+            logger.info(f"Refreshed {', '.join(sorted(changed))} in "
+                        f"{time.perf_counter() - start:.1f} s")
+
+        return changed
+
+    async def run(
+        self,
+        max_steps: int | None = None,
+    ) -> None:
+        ''' Scan the folder every interval until stop() is called
+
+        Parameters
+        ----------
+        max_steps : int | None
+            Stop after this number of scans. Never if None
+        '''
+
+        logger.info(f"Watching {self.input_folder} every {self.interval} s, "
+                    f"writing to {self.output_path_with_time}")
+        steps = 0
+        while not self._stop.is_set():
+            # Process in a thread so that the event loop can be stopped
+            await asyncio.to_thread(self.step)
+
+            steps += 1
+            if max_steps is not None and steps >= max_steps:
+                break
+
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        ''' Stop watching after the current scan '''
+
+        self._stop.set()